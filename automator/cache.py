@@ -0,0 +1,66 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache():
+    """
+    Bounded LRU cache where entries also expire after ttl_seconds.
+    Keeps hit/miss counters so warm containers can report them.
+    """
+
+    def __init__(self, max_size, ttl_seconds, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > self.clock():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl_seconds=None):
+        if ttl_seconds is None:
+            ttl_seconds = self.ttl_seconds
+
+        with self.lock:
+            self.entries[key] = (self.clock() + ttl_seconds, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
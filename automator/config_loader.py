@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Loading and validating the automator configuration.
+
+package.sh validates config.yaml and writes it as a JSON snapshot with
+the reaction dispatch table already built, so the Lambda doesn't need
+to import PyYAML or parse YAML on cold start.
+
+Usage:
+    python config_loader.py config.yaml config.json
+"""
+
+import os
+import sys
+import json
+import hashlib
+
+from logs import logger
+
+
+SNAPSHOT_VERSION = 1
+
+# keys every reaction of the type needs
+REQUIRED_KEYS = {
+    'SLACK_POST': ['message'],
+    'DELETE_MESSAGE': ['message'],
+    'DELETE_WITH_THREADS': ['message'],
+    'ASK_AI': ['prompt_template', 'answer_template'],
+}
+
+
+class ConfigError(Exception):
+    pass
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f_in:
+        return hashlib.sha256(f_in.read()).hexdigest()
+
+
+def validate_config(config):
+    """Raise ConfigError listing everything that is wrong with the config"""
+    errors = []
+
+    if not isinstance(config, dict):
+        raise ConfigError('config must be a mapping')
+
+    for key in ['admins', 'channels', 'reactions']:
+        if key not in config:
+            errors.append(f'missing top-level key: {key}')
+
+    seen = set()
+    for i, c in enumerate(config.get('reactions') or []):
+        reaction = c.get('reaction')
+        if not reaction:
+            errors.append(f'reaction #{i} has no name')
+            continue
+        if reaction in seen:
+            errors.append(f'{reaction}: defined more than once')
+        seen.add(reaction)
+
+        reaction_type = c.get('type')
+        if reaction_type not in REQUIRED_KEYS:
+            errors.append(f'{reaction}: unknown type {reaction_type}')
+            continue
+
+        for key in REQUIRED_KEYS[reaction_type]:
+            if key not in c:
+                errors.append(f'{reaction}: {reaction_type} needs {key}')
+
+        if reaction_type == 'ASK_AI' and not (c.get('model') or c.get('models')):
+            errors.append(f'{reaction}: ASK_AI needs model or models')
+
+    if errors:
+        raise ConfigError('invalid config: ' + '; '.join(errors))
+
+
+def build_reaction_configs(config):
+    """Dispatch table: reaction name -> reaction config"""
+    return {c['reaction']: c for c in config['reactions']}
+
+
+def load_yaml(path):
+    # only needed when there's no snapshot, so not imported at the top
+    import yaml
+
+    with open(path, 'r') as f_in:
+        return yaml.safe_load(f_in)
+
+
+def parse_config(text, name):
+    """(config, reaction_configs) from YAML or, for .json names, JSON text"""
+    if name.endswith('.json'):
+        config = json.loads(text)
+    else:
+        import yaml
+        config = yaml.safe_load(text)
+
+    validate_config(config)
+    return config, build_reaction_configs(config)
+
+
+def build_snapshot(config_file):
+    config = load_yaml(config_file)
+    validate_config(config)
+
+    return {
+        'version': SNAPSHOT_VERSION,
+        'source_sha256': file_sha256(config_file),
+        'config': config,
+        # positions in config['reactions'], so the configs aren't stored twice
+        'reaction_index': {c['reaction']: i for i, c in enumerate(config['reactions'])},
+    }
+
+
+def write_snapshot(config_file, snapshot_file):
+    snapshot = build_snapshot(config_file)
+    with open(snapshot_file, 'w') as f_out:
+        json.dump(snapshot, f_out, separators=(',', ':'))
+    return snapshot
+
+
+def read_snapshot(snapshot_file, config_file):
+    """
+    The snapshot, or None if there's none or it was built from another
+    version of config_file
+    """
+    if not os.path.exists(snapshot_file):
+        return None
+
+    with open(snapshot_file, 'r') as f_in:
+        snapshot = json.load(f_in)
+
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        logger.info('ignoring %s: snapshot version %s', snapshot_file, snapshot.get('version'))
+        return None
+
+    if os.path.exists(config_file) and file_sha256(config_file) != snapshot['source_sha256']:
+        logger.info('ignoring %s: %s changed after it was built', snapshot_file, config_file)
+        return None
+
+    return snapshot
+
+
+def load_config(config_file, snapshot_file):
+    """(config, reaction_configs), from the snapshot if there's a valid one"""
+    snapshot = read_snapshot(snapshot_file, config_file)
+    if snapshot is not None:
+        config = snapshot['config']
+        reactions = config['reactions']
+        reaction_configs = {name: reactions[i] for name, i in snapshot['reaction_index'].items()}
+        return config, reaction_configs
+
+    config = load_yaml(config_file)
+    validate_config(config)
+    return config, build_reaction_configs(config)
+
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        return 1
+
+    config_file, snapshot_file = sys.argv[1], sys.argv[2]
+
+    try:
+        snapshot = write_snapshot(config_file, snapshot_file)
+    except ConfigError as e:
+        print(e)
+        return 1
+
+    print(f"Wrote {snapshot_file} with {len(snapshot['reaction_index'])} reactions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import os
+import time
+import threading
+
+import util
+import config_loader
+from logs import logger
+
+
+# How often to check the source for a new config, in seconds. 0 disables reloading.
+CONFIG_RELOAD_SECONDS = float(os.getenv('CONFIG_RELOAD_SECONDS', '60'))
+# s3://bucket/key of the config; when not set, CONFIG_FILE is watched
+CONFIG_S3_URI = os.getenv('CONFIG_S3_URI')
+# S3-compatible endpoint, e.g. LocalStack or MinIO
+CONFIG_S3_ENDPOINT = os.getenv('CONFIG_S3_ENDPOINT')
+
+
+def compile_templates(reaction_configs):
+    """Parse the message templates of all reactions once"""
+    templates = {}
+    for reaction, c in reaction_configs.items():
+        for key in ['message', 'thread_message']:
+            if key in c:
+                templates[(reaction, key)] = util.MessageTemplate(c[key], c.get('placeholders'))
+    return templates
+
+
+class CompiledConfig():
+    """Everything derived from one version of the config, swapped as a whole"""
+
+    def __init__(self, config, reaction_configs, version):
+        self.config = config
+        self.reaction_configs = reaction_configs
+        self.version = version
+        self.message_templates = compile_templates(reaction_configs)
+
+
+class FileSource():
+    """The config file (or its snapshot), checked by mtime"""
+
+    def __init__(self, config_file, snapshot_file):
+        self.config_file = config_file
+        self.snapshot_file = snapshot_file
+
+    def check(self):
+        stat = os.stat(self.config_file)
+        return f'{stat.st_mtime_ns}-{stat.st_size}'
+
+    def load(self):
+        config, reaction_configs = config_loader.load_config(self.config_file, self.snapshot_file)
+        version = config_loader.file_sha256(self.config_file)[:12]
+        return config, reaction_configs, version
+
+
+class S3Source():
+    """An object in S3 (or an S3-compatible store), checked by ETag"""
+
+    def __init__(self, bucket, key, client=None):
+        self.bucket = bucket
+        self.key = key
+        self.client = client
+
+    @classmethod
+    def from_uri(cls, uri, client=None):
+        bucket, _, key = uri[len('s3://'):].partition('/')
+        return cls(bucket, key, client)
+
+    def get_client(self):
+        if self.client is None:
+            import boto3
+            if CONFIG_S3_ENDPOINT:
+                self.client = boto3.client('s3', endpoint_url=CONFIG_S3_ENDPOINT)
+            else:
+                self.client = boto3.client('s3')
+        return self.client
+
+    def check(self):
+        response = self.get_client().head_object(Bucket=self.bucket, Key=self.key)
+        return response['ETag'].strip('"')
+
+    def load(self):
+        response = self.get_client().get_object(Bucket=self.bucket, Key=self.key)
+        text = response['Body'].read().decode('utf-8')
+        config, reaction_configs = config_loader.parse_config(text, self.key)
+        return config, reaction_configs, response['ETag'].strip('"')
+
+
+class ConfigProvider():
+    """
+    Holds the current CompiledConfig and replaces it when the source
+    changes. get() never waits: at most once per check_seconds it starts
+    a background check, and the new config is swapped in with a single
+    assignment once it's loaded and compiled. If loading fails, the
+    current config stays.
+
+    If the first load from the source fails, the config starts from the
+    fallback source (the bundled file) and the source is tried again on
+    every check.
+    """
+
+    def __init__(self, source, check_seconds=CONFIG_RELOAD_SECONDS, clock=time.monotonic, fallback=None):
+        self.source = source
+        self.check_seconds = check_seconds
+        self.clock = clock
+
+        self.lock = threading.Lock()
+        self.checking = False
+        self.last_check = clock()
+
+        try:
+            source_version = source.check()
+            config, reaction_configs, version = source.load()
+        except Exception as e:
+            if fallback is None:
+                raise
+            logger.error('config load failed, starting from the bundled config: %s', e)
+            source_version = None
+            config, reaction_configs, version = fallback.load()
+
+        self.source_version = source_version
+        self.current = CompiledConfig(config, reaction_configs, version)
+        logger.info('config version %s', version)
+
+    def get(self):
+        if self.check_seconds > 0 and self.clock() - self.last_check >= self.check_seconds:
+            self.start_check()
+        return self.current
+
+    def start_check(self):
+        with self.lock:
+            if self.checking:
+                return
+            self.checking = True
+            self.last_check = self.clock()
+
+        threading.Thread(target=self.check, daemon=True).start()
+
+    def check(self):
+        """Reload the config if the source changed"""
+        try:
+            source_version = self.source.check()
+            if source_version == self.source_version:
+                return
+
+            config, reaction_configs, version = self.source.load()
+            compiled = CompiledConfig(config, reaction_configs, version)
+
+            previous = self.current
+            self.current = compiled
+            self.source_version = source_version
+            logger.info('config version %s -> %s', previous.version, version)
+        except Exception as e:
+            logger.error('config reload failed, keeping version %s: %s', self.current.version, e)
+        finally:
+            with self.lock:
+                self.checking = False
+
+
+def create_provider(config_file, snapshot_file):
+    file_source = FileSource(config_file, snapshot_file)
+    if CONFIG_S3_URI:
+        # the bundled file keeps the function working while S3 can't be read
+        return ConfigProvider(S3Source.from_uri(CONFIG_S3_URI), fallback=file_source)
+    return ConfigProvider(file_source)
@@ -1,12 +1,61 @@
 import os
+import json
+import time
+import random
+import hashlib
+from collections import deque
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 import requests
+from botocore.exceptions import BotoCoreError, ClientError
+
+from cache import TTLCache
+from logs import logger
+from metrics import metrics, instrument_boto3
 
 
 GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+# OpenAI-compatible API, e.g. integration_tests/fake_api.py
+GROQ_API_URL = os.getenv('GROQ_API_URL', 'https://api.groq.com/openai/v1').rstrip('/')
+
+# Deadline of a single request to Groq, in seconds
+AI_TIMEOUT = float(os.getenv('AI_TIMEOUT', '20'))
+# Retries of 429, 5xx and connection errors per model; timeouts go to the next model
+AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', '2'))
+# Total time for one answer over all models and retries, in seconds
+AI_DEADLINE = float(os.getenv('AI_DEADLINE', '30'))
+# Hedge delay until there's enough latency history for the percentile
+AI_HEDGE_DEFAULT_SECONDS = float(os.getenv('AI_HEDGE_DEFAULT_SECONDS', '3'))
+AI_HEDGE_MIN_SAMPLES = 5
+
+# Recent successful latencies per model, for the hedge percentile
+latency_history = {}
+
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', '256'))
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', '86400'))  # 1 day
+# Optional DynamoDB table (partition key: cache_key, TTL attribute: ttl)
+# shared by all containers
+AI_CACHE_TABLE = os.getenv('AI_CACHE_TABLE')
+
+response_cache = TTLCache(AI_CACHE_SIZE, AI_CACHE_TTL)
+
+cache_stats = {
+    'memory_hits': 0,
+    'dynamodb_hits': 0,
+    'misses': 0,
+    'saved_seconds': 0.0,
+}
+
+cache_table = None
+
+
+class AiRequestError(Exception):
+    pass
 
 
-def ai_request(prompt, model):
-    url = "https://api.groq.com/openai/v1/chat/completions"
+def ai_request(prompt, model, timeout=AI_TIMEOUT):
+    url = f'{GROQ_API_URL}/chat/completions'
 
     headers = {
         'Authorization': f'Bearer {GROQ_API_KEY}'
@@ -19,11 +68,305 @@ def ai_request(prompt, model):
         "model": model,
     }
 
-    response = requests.post(url, json=ai_request, headers=headers)
-    response.raise_for_status()
+    with metrics.timer('groq'):
+        response = requests.post(url, json=ai_request, headers=headers, timeout=timeout)
+        response.raise_for_status()
 
     chat_completion = response.json()
     ai_response = chat_completion['choices'][0]['message']['content']
     
     return ai_response
 
+
+def ai_request_stream(prompt, model, timeout=AI_TIMEOUT):
+    """
+    Stream the completion: yields pieces of the answer as they arrive
+    in the OpenAI-compatible server-sent events stream. The timeout is
+    for connecting and for every wait for the next bytes.
+    """
+    url = f'{GROQ_API_URL}/chat/completions'
+
+    headers = {
+        'Authorization': f'Bearer {GROQ_API_KEY}'
+    }
+
+    ai_request = {
+        "messages": [
+            {"role": "user", "content": prompt},
+        ],
+        "model": model,
+        "stream": True,
+    }
+
+    # until the response headers: reading the stream overlaps with posting updates
+    with metrics.timer('groq.stream'):
+        request = requests.post(url, json=ai_request, headers=headers, stream=True, timeout=timeout)
+
+    with request as response:
+        response.raise_for_status()
+
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith('data:'):
+                continue
+
+            data = line[len('data:'):].strip()
+            if data == '[DONE]':
+                break
+
+            chunk = json.loads(data)
+            content = chunk['choices'][0].get('delta', {}).get('content')
+            if content:
+                yield content
+
+
+def remaining_time(deadline_at):
+    if deadline_at is None:
+        return None
+    return deadline_at - time.perf_counter()
+
+
+def resilient_ai_request_stream(prompt, models, timeout=AI_TIMEOUT, deadline=AI_DEADLINE):
+    """
+    ai_request_stream over the fallback chain: the next model is asked
+    when the connection or the first chunk fails, until deadline seconds
+    have passed. Once the first chunk is out, errors are raised to the
+    caller.
+    """
+    if isinstance(models, str):
+        models = [models]
+
+    deadline_at = time.perf_counter() + deadline
+    errors = []
+    for model in models:
+        remaining = remaining_time(deadline_at)
+        if remaining <= 0:
+            errors.append(f'{model}: deadline exceeded')
+            break
+        try:
+            stream = ai_request_stream(prompt, model, min(timeout, remaining))
+            first_chunk = next(stream, None)
+        except Exception as e:
+            logger.warning('stream from %s failed: %s', model, e)
+            errors.append(f'{model}: {e}')
+            continue
+
+        if first_chunk is not None:
+            yield first_chunk
+        yield from stream
+        return
+
+    raise AiRequestError(f"all models failed: {'; '.join(errors)}")
+
+
+def is_retryable(error):
+    # a model that timed out is likely to time out again, the next one is asked instead
+    if isinstance(error, requests.Timeout):
+        return False
+    if isinstance(error, requests.ConnectionError):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+def ai_request_with_retries(prompt, model, timeout=AI_TIMEOUT, max_retries=AI_MAX_RETRIES, deadline_at=None):
+    """
+    ai_request that retries 429, 5xx and connection errors with jittered
+    backoff. With deadline_at (time.perf_counter()) no request or backoff
+    goes past it.
+    """
+    for attempt in range(max_retries + 1):
+        remaining = remaining_time(deadline_at)
+        if remaining is not None and remaining <= 0:
+            raise AiRequestError('deadline exceeded')
+
+        try:
+            t0 = time.perf_counter()
+            ai_response = ai_request(prompt, model, timeout if remaining is None else min(timeout, remaining))
+            latency_history.setdefault(model, deque(maxlen=100)).append(time.perf_counter() - t0)
+            return ai_response
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+
+            delay = random.uniform(0, 0.5 * 2 ** attempt)
+            response = getattr(e, 'response', None)
+            if response is not None and 'Retry-After' in response.headers:
+                delay = max(delay, float(response.headers['Retry-After']))
+
+            remaining = remaining_time(deadline_at)
+            if remaining is not None and delay >= remaining:
+                raise
+            time.sleep(delay)
+
+
+def hedge_delay(model, percentile):
+    """How long to wait for the model before also asking the next one"""
+    history = sorted(latency_history.get(model, ()))
+    if len(history) < AI_HEDGE_MIN_SAMPLES:
+        return AI_HEDGE_DEFAULT_SECONDS
+
+    index = min(len(history) - 1, int(len(history) * percentile / 100))
+    return history[index]
+
+
+def resilient_ai_request(prompt, models, timeout=AI_TIMEOUT, max_retries=AI_MAX_RETRIES,
+                         hedge_percentile=None, deadline=AI_DEADLINE):
+    """
+    Ask the models in order until one answers, within deadline seconds
+    in total. With hedge_percentile, the next model is asked in parallel
+    once the first one is slower than that percentile of its recent
+    latencies, and the first answer wins.
+
+    Returns the answer and a dict with the model that answered, the time
+    it took, and whether the request was hedged.
+    """
+    if isinstance(models, str):
+        models = [models]
+
+    started_at = time.perf_counter()
+    deadline_at = started_at + deadline
+    errors = []
+    remaining = list(models)
+
+    def info(model, hedged):
+        return {
+            'model': model,
+            'seconds': time.perf_counter() - started_at,
+            'hedged': hedged,
+            'errors': errors,
+        }
+
+    if hedge_percentile is not None and len(remaining) > 1:
+        primary = remaining.pop(0)
+        fallback = remaining.pop(0)
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        futures = {executor.submit(ai_request_with_retries, prompt, primary, timeout, max_retries, deadline_at): primary}
+
+        try:
+            done, _ = wait(futures, timeout=hedge_delay(primary, hedge_percentile))
+            if not done:
+                future = executor.submit(ai_request_with_retries, prompt, fallback, timeout, max_retries, deadline_at)
+                futures[future] = fallback
+            else:
+                remaining.insert(0, fallback)
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result(), info(futures[future], len(futures) > 1)
+                    errors.append(f'{futures[future]}: {future.exception()}')
+        finally:
+            # don't wait for the slower request
+            executor.shutdown(wait=False)
+
+    for model in remaining:
+        if remaining_time(deadline_at) <= 0:
+            errors.append(f'{model}: deadline exceeded')
+            break
+        try:
+            ai_response = ai_request_with_retries(prompt, model, timeout, max_retries, deadline_at)
+            return ai_response, info(model, False)
+        except Exception as e:
+            errors.append(f'{model}: {e}')
+
+    raise AiRequestError(f"all models failed: {'; '.join(errors)}")
+
+
+def normalize_prompt(prompt):
+    # the same question typed with different case or spacing is the same question
+    return ' '.join(prompt.casefold().split())
+
+
+def cache_key(prompt, model):
+    if not isinstance(model, str):
+        model = ','.join(model)
+    key = f'{model}\n{normalize_prompt(prompt)}'
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def get_cache_table():
+    global cache_table
+
+    if cache_table is None:
+        import boto3
+        dynamodb = boto3.resource('dynamodb')
+        instrument_boto3(dynamodb.meta.client)
+        cache_table = dynamodb.Table(AI_CACHE_TABLE)
+
+    return cache_table
+
+
+def cached_ai_request(prompt, model, ttl=AI_CACHE_TTL, request=None):
+    """
+    ai_request with a two-level cache: an in-process LRU and, when
+    AI_CACHE_TABLE is set, a DynamoDB table shared by all containers.
+    On a miss, request() is called if given instead of ai_request.
+    """
+    key = cache_key(prompt, model)
+
+    entry = response_cache.get(key)
+    if entry is not None:
+        cache_stats['memory_hits'] += 1
+        cache_stats['saved_seconds'] += entry['latency']
+        metrics.count('ai_cache.hits')
+        return entry['response']
+
+    if AI_CACHE_TABLE:
+        # the shared cache is an optimization: if DynamoDB fails, ask the model
+        try:
+            item = get_cache_table().get_item(Key={'cache_key': key}).get('Item')
+        except (BotoCoreError, ClientError) as e:
+            logger.error('AI cache lookup failed: %s', e)
+            item = None
+
+        # TTL deletion is lazy, so check the expiration ourselves.
+        # boto3 returns numbers as Decimal, which doesn't mix with float
+        now = int(time.time())
+        if item and int(item['ttl']) > now:
+            entry = {'response': item['response'], 'latency': float(item['latency'])}
+            response_cache.set(key, entry, min(ttl, int(item['ttl']) - now))
+            cache_stats['dynamodb_hits'] += 1
+            cache_stats['saved_seconds'] += entry['latency']
+            metrics.count('ai_cache.hits')
+            return entry['response']
+
+    cache_stats['misses'] += 1
+    metrics.count('ai_cache.misses')
+
+    t0 = time.perf_counter()
+    if request is None:
+        ai_response = ai_request(prompt, model)
+    else:
+        ai_response = request()
+    latency = time.perf_counter() - t0
+
+    response_cache.set(key, {'response': ai_response, 'latency': latency}, ttl)
+
+    if AI_CACHE_TABLE:
+        try:
+            get_cache_table().put_item(
+                Item={
+                    'cache_key': key,
+                    'model': model if isinstance(model, str) else ','.join(model),
+                    'response': ai_response,
+                    'latency': Decimal(str(round(latency, 3))),
+                    'ttl': int(time.time()) + ttl
+                }
+            )
+        except (BotoCoreError, ClientError) as e:
+            logger.error('AI cache write failed: %s', e)
+
+    return ai_response
+
+
+def get_cache_stats():
+    stats = dict(cache_stats)
+    hits = stats['memory_hits'] + stats['dynamodb_hits']
+    total = hits + stats['misses']
+    stats['hit_rate'] = hits / total if total else 0.0
+    return stats
@@ -1,32 +1,55 @@
 import os
-import json
-
-import yaml
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import util
-import groqu
-import slack
+import tracing
+import config_provider
+import logs
 from logs import logger
+from metrics import metrics
+
+# Imported on first use: an invocation for a reaction without a config
+# doesn't need requests, boto3 or the Slack client
+slack = util.LazyModule('slack')
+groqu = util.LazyModule('groqu')
+retrieval = util.LazyModule('retrieval')
+thread_context = util.LazyModule('thread_context')
 
 
 FAKE_DELETE = os.getenv('FAKE_DELETE', '0') == '1'
 CONFIG_FILE = os.getenv('CONFIG_FILE', 'config.yaml')
+# Built by package.sh from CONFIG_FILE, see config_loader.py
+CONFIG_SNAPSHOT = os.getenv('CONFIG_SNAPSHOT', os.path.splitext(CONFIG_FILE)[0] + '.json')
+DELETE_CONCURRENCY = int(os.getenv('DELETE_CONCURRENCY', '8'))
+# chat.update is tier 3 (50 per minute), so don't update more often
+STREAM_UPDATE_SECONDS = float(os.getenv('STREAM_UPDATE_SECONDS', '1.5'))
+# Kept free at the end of the invocation to post the answer or the error
+AI_DEADLINE_MARGIN_SECONDS = 3
+STREAM_ERROR_MESSAGE = "_Sorry, I couldn't get an answer this time. Please try again later._"
 
 
+# Lambda context of the current invocation, for the time it has left
+invocation_context = None
 
-with open(CONFIG_FILE, 'r') as f_in:
-    config = yaml.safe_load(f_in)
+# config.yaml (or CONFIG_S3_URI), reloaded when it changes
+provider = config_provider.create_provider(CONFIG_FILE, CONFIG_SNAPSHOT)
 
 
-reaction_configs = {}
+def render_message(reaction_config, key, channel_name, values=None):
+    """Render the reaction's template, same as util.format_message"""
+    template = provider.current.message_templates.get((reaction_config.get('reaction'), key))
 
-for c in config['reactions']:
-    reaction = c['reaction']
-    reaction_configs[reaction] = c
+    if template is None \
+            or template.template is not reaction_config[key] \
+            or template.placeholders is not reaction_config.get('placeholders', template.placeholders):
+        template = util.MessageTemplate(reaction_config[key], reaction_config.get('placeholders'))
+
+    return template.render(channel_name, values)
 
 
 def get_channel_name(channel_id):
-    return config['channels'].get(channel_id, None)
+    return provider.current.config['channels'].get(channel_id, None)
     
 
 def handle_slack_post(event, reaction_config):
@@ -34,11 +57,7 @@ def handle_slack_post(event, reaction_config):
     channel_name = get_channel_name(channel_id)
 
     if 'placeholders' in reaction_config:
-        message = util.format_message(
-            reaction_config['message'],
-            reaction_config['placeholders'],
-            channel_name
-        )
+        message = render_message(reaction_config, 'message', channel_name)
         if message is None:
             return
     else:
@@ -48,8 +67,6 @@ def handle_slack_post(event, reaction_config):
 
 
 def handle_delete_message(event, reaction_config):
-    message_pattern = reaction_config['message']
-
     item = event['item']
     channel = item['channel']
     ts = item['ts']
@@ -64,45 +81,227 @@ def handle_delete_message(event, reaction_config):
         'channel': channel,
     }
 
-    if 'placeholders' in reaction_config:
-        values.update(reaction_config['placeholders'])
-
-    message_dm = util.format_message(message_pattern, values, channel)
+    message_dm = render_message(reaction_config, 'message', channel, values)
 
     slack.send_dm(user, message_dm)
 
     if FAKE_DELETE:
-        logger.info(f"FAKE_DELETE for {channel} {ts}")
+        logger.info('FAKE_DELETE for %s %s', channel, ts)
     else:
         slack.remove_message(channel, ts)
 
 
+def get_models(reaction_config):
+    """Models to try in order: 'models' (fallback chain) or a single 'model'"""
+    if 'models' in reaction_config:
+        return reaction_config['models']
+    return [reaction_config['model']]
+
+
+def retrieve_context(reaction_config, original_message):
+    """Top passages from the reaction's BM25 index for {context}"""
+    if 'index' not in reaction_config:
+        return ''
+
+    started_at = time.perf_counter()
+    context = retrieval.retrieve_context(
+        reaction_config['index'],
+        original_message,
+        reaction_config.get('top_k', 3)
+    )
+    logger.info('retrieved context', seconds=round(time.perf_counter() - started_at, 3))
+    return context
+
+
+def build_ai_prompt(event, reaction_config, original_message, models):
+    """
+    Fill in prompt_template. {context} gets the FAQ passages retrieved
+    from the reaction's index. With 'context: thread' the thread the message
+    belongs to is added as {thread_context} (or in front of the prompt),
+    keeping the whole prompt within context_token_budget.
+    """
+    template = reaction_config['prompt_template']
+    values = {
+        'user_message': original_message,
+        'context': retrieve_context(reaction_config, original_message),
+        'thread_context': '',
+    }
+    prompt = template.format(**values)
+
+    if reaction_config.get('context') != 'thread':
+        return prompt
+
+    item = event['item']
+    budget = reaction_config.get('context_token_budget', thread_context.DEFAULT_TOKEN_BUDGET)
+    context = thread_context.build_thread_context(
+        item['channel'],
+        item['ts'],
+        models,
+        max(budget - thread_context.estimate_tokens(prompt), 0)
+    )
+
+    if '{thread_context}' in template:
+        values['thread_context'] = context
+        return template.format(**values)
+    if context:
+        return f"Conversation so far:\n{context}\n\n{prompt}"
+    return prompt
+
+
+def ai_deadline(reaction_config):
+    """Seconds one answer may take: the reaction's deadline, within the time left in the invocation"""
+    deadline = reaction_config.get('deadline', groqu.AI_DEADLINE)
+    if invocation_context is not None:
+        remaining = invocation_context.get_remaining_time_in_millis() / 1000 - AI_DEADLINE_MARGIN_SECONDS
+        deadline = min(deadline, remaining)
+    return deadline
+
+
 def handle_ask_ai(event, reaction_config):
+    if reaction_config.get('stream'):
+        return handle_ask_ai_stream(event, reaction_config)
+
     user, original_message = slack.get_message(event)
 
-    prompt = reaction_config['prompt_template'].format(user_message=original_message)
-    model = reaction_config['model']
+    models = get_models(reaction_config)
+    prompt = build_ai_prompt(event, reaction_config, original_message, models)
+
+    def request():
+        ai_response, info = groqu.resilient_ai_request(
+            prompt,
+            models,
+            timeout=reaction_config.get('timeout', groqu.AI_TIMEOUT),
+            hedge_percentile=reaction_config.get('hedge_percentile'),
+            deadline=ai_deadline(reaction_config)
+        )
+        logger.info(
+            'AI answer from %s', info['model'],
+            seconds=round(info['seconds'], 3), hedged=info['hedged'], errors=info['errors']
+        )
+        return ai_response
 
-    ai_response = groqu.ai_request(prompt, model)
+    if reaction_config.get('cache'):
+        ttl = reaction_config.get('cache_ttl', groqu.AI_CACHE_TTL)
+        ai_response = groqu.cached_ai_request(prompt, models, ttl, request=request)
+        if logger.is_enabled(logs.INFO):
+            logger.info('AI cache', stats=groqu.get_cache_stats())
+    else:
+        ai_response = request()
     ai_response = slack.github_to_slack_markdown(ai_response)
 
-    logger.info("response from GROQ: " + ai_response)
+    logger.info('response from GROQ', chars=len(ai_response))
+    logger.debug('response from GROQ: %s', ai_response)
 
     message = reaction_config['answer_template'].format(user=user, ai_response=ai_response)
 
     slack.post_message_thread(event, message)
 
 
+def delete_thread_reply(reply, channel, reaction_config):
+    """DM the author of a thread reply and delete the reply"""
+    reply_user = reply.get('user')
+    reply_ts = reply['ts']
+
+    outcome = {'ts': reply_ts, 'user': reply_user, 'ok': False, 'error': None}
+
+    try:
+        # Send DM to thread reply author
+        thread_values = {
+            'user': reply_user,
+            'channel': channel,
+        }
+
+        thread_dm = render_message(reaction_config, 'thread_message', channel, thread_values)
+
+        if thread_dm:
+            slack.send_dm(reply_user, thread_dm)
+
+        # Delete the thread reply
+        if FAKE_DELETE:
+            logger.info('FAKE_DELETE thread reply for %s %s', channel, reply_ts)
+            outcome['ok'] = True
+        else:
+            response = slack.remove_message(channel, reply_ts)
+            outcome['ok'] = response.get('ok', False)
+            outcome['error'] = response.get('error')
+    except Exception as e:
+        outcome['error'] = str(e)
+
+    return outcome
+
+
+def handle_ask_ai_stream(event, reaction_config):
+    """
+    Post a placeholder right away and fill it in with chat.update while
+    the answer is streamed from Groq, at most once per STREAM_UPDATE_SECONDS.
+    If the answer fails, the placeholder is replaced with stream_error_message.
+    """
+    started_at = time.perf_counter()
+
+    thinking_message = reaction_config.get('thinking_message', '_Thinking…_')
+    placeholder = slack.post_message_thread(event, thinking_message)
+    channel = placeholder['channel']
+    ts = placeholder['ts']
+
+    try:
+        stream_answer(event, reaction_config, channel, ts, started_at)
+    except Exception:
+        logger.exception('streamed answer failed')
+        metrics.count('ask_ai.stream_errors')
+        error_message = reaction_config.get('stream_error_message', STREAM_ERROR_MESSAGE)
+        slack.update_message(channel, ts, error_message)
+
+
+def stream_answer(event, reaction_config, channel, ts, started_at):
+    user, original_message = slack.get_message(event)
+
+    models = get_models(reaction_config)
+    prompt = build_ai_prompt(event, reaction_config, original_message, models)
+    timeout = reaction_config.get('timeout', groqu.AI_TIMEOUT)
+
+    answer = slack.StreamingSlackMarkdown()
+    first_text_at = None
+    last_update_at = 0
+
+    for chunk in groqu.resilient_ai_request_stream(prompt, models, timeout, ai_deadline(reaction_config)):
+        answer.feed(chunk)
+
+        now = time.perf_counter()
+        if now - last_update_at < STREAM_UPDATE_SECONDS:
+            continue
+
+        message = reaction_config['answer_template'].format(user=user, ai_response=answer.text())
+        slack.update_message(channel, ts, message)
+        last_update_at = now
+
+        if first_text_at is None:
+            first_text_at = now
+            metrics.set_value('ask_ai.first_text', round(1000 * (first_text_at - started_at), 3), 'Milliseconds')
+            logger.info('time to first visible text', seconds=round(first_text_at - started_at, 3))
+
+    ai_response = answer.text()
+    logger.info('response from GROQ', chars=len(ai_response))
+    logger.debug('response from GROQ: %s', ai_response)
+
+    message = reaction_config['answer_template'].format(user=user, ai_response=ai_response)
+    slack.update_message(channel, ts, message)
+
+    seconds = time.perf_counter() - started_at
+    metrics.set_value('ask_ai.full_answer', round(1000 * seconds, 3), 'Milliseconds')
+    logger.info('time to full answer', seconds=round(seconds, 3))
+
+
 def handle_delete_with_threads(event, reaction_config):
     """Delete a message and all its thread replies, sending DMs to all affected users"""
     item = event['item']
     channel = item['channel']
     ts = item['ts']
     
-    # Get parent message details
-    parent_message = slack.get_message_content(channel, ts)
+    # Get the parent message and all replies in one go
+    thread = slack.get_thread_snapshot(channel, ts)
+    parent_message = thread.parent
     if not parent_message:
-        logger.info(f"Parent message not found for {channel} {ts}")
+        logger.info('Parent message not found for %s %s', channel, ts)
         return
     
     parent_user = parent_message.get('user')
@@ -110,63 +309,58 @@ def handle_delete_with_threads(event, reaction_config):
     
     # Skip if there's no user (e.g., bot message or deleted message)
     if not parent_user:
-        logger.info(f"Parent message has no user for {channel} {ts}")
+        logger.info('Parent message has no user for %s %s', channel, ts)
         return
     
-    # Get thread replies
-    thread_replies = slack.get_thread_replies(channel, ts)
+    thread_replies = thread.replies
     
-    # Delete all thread replies first
-    thread_message_pattern = reaction_config.get('thread_message')
-    if thread_message_pattern:
-        for reply in thread_replies:
-            reply_user = reply.get('user')
-            reply_ts = reply['ts']
-            
-            if reply_user:  # Only process messages with a user (not bot messages)
-                # Send DM to thread reply author
-                thread_values = {
-                    'user': reply_user,
-                    'channel': channel,
-                }
-                
-                if 'placeholders' in reaction_config:
-                    thread_values.update(reaction_config['placeholders'])
-                
-                thread_dm = util.format_message(thread_message_pattern, thread_values, channel)
-                
-                if thread_dm:
-                    slack.send_dm(reply_user, thread_dm)
-                
-                # Delete the thread reply
-                if FAKE_DELETE:
-                    logger.info(f"FAKE_DELETE thread reply for {channel} {reply_ts}")
+    summary = {'success': [], 'failed': []}
+
+    # Delete all thread replies first, in parallel. The Slack client
+    # keeps the calls within the rate limits.
+    if reaction_config.get('thread_message'):
+        # Only process messages with a user (not bot messages)
+        user_replies = [reply for reply in thread_replies if reply.get('user')]
+
+        with ThreadPoolExecutor(max_workers=DELETE_CONCURRENCY) as executor:
+            outcomes = executor.map(
+                lambda reply: delete_thread_reply(reply, channel, reaction_config),
+                user_replies
+            )
+
+            for outcome in outcomes:
+                if outcome['ok']:
+                    summary['success'].append(outcome)
                 else:
-                    slack.remove_message(channel, reply_ts)
+                    summary['failed'].append(outcome)
     
     # Now handle the parent message
-    parent_message_pattern = reaction_config['message']
-    
     parent_values = {
         'user': parent_user,
         'user_message': parent_text,
         'channel': channel,
     }
     
-    if 'placeholders' in reaction_config:
-        parent_values.update(reaction_config['placeholders'])
-    
-    parent_dm = util.format_message(parent_message_pattern, parent_values, channel)
+    parent_dm = render_message(reaction_config, 'message', channel, parent_values)
     
     if parent_dm:
         slack.send_dm(parent_user, parent_dm)
     
     # Delete the parent message
     if FAKE_DELETE:
-        logger.info(f"FAKE_DELETE parent message for {channel} {ts}")
+        logger.info('FAKE_DELETE parent message for %s %s', channel, ts)
     else:
         slack.remove_message(channel, ts)
 
+    logger.info(
+        'deleted thread %s %s', channel, ts,
+        deleted=len(summary['success']), failed=len(summary['failed'])
+    )
+    for outcome in summary['failed']:
+        logger.error('failed to delete reply %s: %s', outcome['ts'], outcome['error'])
+
+    return summary
+
 
 action_handlers = {
     'SLACK_POST': handle_slack_post,
@@ -178,31 +372,45 @@ action_handlers = {
 
 def process_reaction(body, event):
     reaction = event['reaction']
+    reaction_configs = provider.get().reaction_configs
 
     if reaction not in reaction_configs:
-        logger.info(f"no reaction config for {reaction}")
+        logger.info('no reaction config for %s', reaction)
         return
 
     reaction_config = reaction_configs[reaction]
 
     action_type = reaction_config['type']
     action_handler = action_handlers.get(action_type)
+    metrics.set_handler(action_type)
     
     if action_handler:
         action_handler(event, reaction_config)
     else:
-        logger.info(f"no handler for {action_type}")
+        logger.info('no handler for %s', action_type)
 
 
 def run(body):
-    print(json.dumps(body))
+    # delays from Slack through the router, on every log record and in the metrics
+    tracing.start_worker(body)
+    logger.payload(body)
     event = body['event']
-    logger.info(f'reaction: {event["reaction"]}')
+    logger.info('reaction %s', event['reaction'], config_version=provider.current.version)
     process_reaction(body, event)
+    if slack.module is not None and logger.is_enabled(logs.INFO):
+        logger.info('message cache', stats=slack.message_cache.get_stats())
+        slack.slack_client.log_latency_stats()
 
 
 def lambda_handler(event, context):
-    run(event)
+    global invocation_context
+    invocation_context = context
+
+    started_at = time.perf_counter()
+    try:
+        run(event)
+    finally:
+        metrics.flush(time.perf_counter() - started_at)
     return {
         'statusCode': 200,
         'body': "done"
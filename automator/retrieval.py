@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+BM25 index over Markdown documents (FAQ, course docs) for grounding
+ASK_AI answers.
+
+The index is built offline into a single file of flat uint32 arrays.
+At runtime the file is memory-mapped and the arrays are used in place,
+so loading it only parses the header.
+
+Usage:
+    python retrieval.py build <docs_dir> <index_file>
+    python retrieval.py search <index_file> "how do I install docker"
+"""
+
+import os
+import re
+import sys
+import math
+import mmap
+import heapq
+import struct
+import argparse
+from array import array
+
+
+MAGIC = b'BM25IDX1'
+# n_docs, n_terms, avgdl
+HEADER = struct.Struct('<IId')
+
+# all sections are uint32 arrays or utf-8 blobs, in this order
+SECTIONS = [
+    'term_offsets',
+    'terms',
+    'posting_offsets',
+    'posting_docs',
+    'posting_tfs',
+    'doc_lengths',
+    'source_offsets',
+    'sources',
+    'text_offsets',
+    'texts',
+]
+SECTION = struct.Struct('<II')
+BLOBS = {'terms', 'sources', 'texts'}
+
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = set("""
+a an and are as at be but by can do does for from how i if in is it my of on or
+so that the this to was what when where which who why will with you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r'\w+')
+HEADING_PATTERN = re.compile(r'^#{1,3}\s+', re.MULTILINE)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def split_passages(text):
+    """Split a Markdown document into passages, one per heading"""
+    starts = [m.start() for m in HEADING_PATTERN.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+
+    passages = []
+    for start, end in zip(starts, starts[1:] + [len(text)]):
+        passage = text[start:end].strip()
+        if passage:
+            passages.append(passage)
+    return passages
+
+
+def read_passages(docs_dir):
+    """(source, passage) for every Markdown file under docs_dir"""
+    for root, _, files in sorted(os.walk(docs_dir)):
+        for name in sorted(files):
+            if not name.endswith('.md'):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'r', encoding='utf-8') as f_in:
+                text = f_in.read()
+            source = os.path.relpath(path, docs_dir)
+            for passage in split_passages(text):
+                yield source, passage
+
+
+def pack_strings(strings):
+    offsets = array('I', [0])
+    blob = bytearray()
+    for s in strings:
+        blob += s.encode('utf-8')
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def build_index(passages, path):
+    """Write the index of (source, text) passages to path"""
+    postings = {}
+    doc_lengths = array('I')
+    sources = []
+    texts = []
+
+    for doc_id, (source, text) in enumerate(passages):
+        tokens = tokenize(text)
+        doc_lengths.append(len(tokens))
+        sources.append(source)
+        texts.append(text)
+
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, tf in counts.items():
+            postings.setdefault(token, []).append((doc_id, tf))
+
+    # sorted by utf-8 bytes so lookups can binary search the blob
+    terms = sorted(postings, key=lambda t: t.encode('utf-8'))
+    term_offsets, terms_blob = pack_strings(terms)
+
+    posting_offsets = array('I', [0])
+    posting_docs = array('I')
+    posting_tfs = array('I')
+    for term in terms:
+        for doc_id, tf in postings[term]:
+            posting_docs.append(doc_id)
+            posting_tfs.append(tf)
+        posting_offsets.append(len(posting_docs))
+
+    source_offsets, sources_blob = pack_strings(sources)
+    text_offsets, texts_blob = pack_strings(texts)
+
+    data = {
+        'term_offsets': term_offsets,
+        'terms': terms_blob,
+        'posting_offsets': posting_offsets,
+        'posting_docs': posting_docs,
+        'posting_tfs': posting_tfs,
+        'doc_lengths': doc_lengths,
+        'source_offsets': source_offsets,
+        'sources': sources_blob,
+        'text_offsets': text_offsets,
+        'texts': texts_blob,
+    }
+
+    n_docs = len(doc_lengths)
+    avgdl = sum(doc_lengths) / n_docs if n_docs else 0.0
+
+    header_size = len(MAGIC) + HEADER.size + SECTION.size * len(SECTIONS)
+    table = []
+    body = bytearray()
+    for name in SECTIONS:
+        chunk = data[name] if name in BLOBS else data[name].tobytes()
+        # keep the uint32 arrays aligned
+        body += b'\0' * (-(header_size + len(body)) % 4)
+        table.append((header_size + len(body), len(chunk)))
+        body += chunk
+
+    with open(path, 'wb') as f_out:
+        f_out.write(MAGIC)
+        f_out.write(HEADER.pack(n_docs, len(terms), avgdl))
+        for offset, length in table:
+            f_out.write(SECTION.pack(offset, length))
+        f_out.write(body)
+
+    return n_docs, len(terms)
+
+
+class Bm25Index():
+    """Read-only BM25 index backed by a memory-mapped file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f_in:
+            self.mmap = mmap.mmap(f_in.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            self.mmap.close()
+            raise ValueError(f'{path} is not a BM25 index')
+
+        self.view = view = memoryview(self.mmap)
+        position = len(MAGIC)
+        self.n_docs, self.n_terms, self.avgdl = HEADER.unpack_from(view, position)
+        position += HEADER.size
+
+        for name in SECTIONS:
+            offset, length = SECTION.unpack_from(view, position)
+            position += SECTION.size
+            section = view[offset:offset + length]
+            setattr(self, name, section if name in BLOBS else section.cast('I'))
+
+    def close(self):
+        for name in SECTIONS:
+            getattr(self, name).release()
+        self.view.release()
+        self.mmap.close()
+
+    def get_term(self, term_id):
+        return bytes(self.terms[self.term_offsets[term_id]:self.term_offsets[term_id + 1]])
+
+    def find_term(self, term):
+        """Position of the term in the vocabulary or -1"""
+        key = term.encode('utf-8')
+        lo, hi = 0, self.n_terms
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.get_term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < self.n_terms and self.get_term(lo) == key:
+            return lo
+        return -1
+
+    def search(self, query, k=3):
+        """Top k (score, doc_id) for the query"""
+        scores = {}
+        doc_lengths = self.doc_lengths
+        length_norm = K1 * B / self.avgdl if self.avgdl else 0.0
+
+        for term in set(tokenize(query)):
+            term_id = self.find_term(term)
+            if term_id < 0:
+                continue
+
+            start = self.posting_offsets[term_id]
+            end = self.posting_offsets[term_id + 1]
+            df = end - start
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+
+            for doc_id, tf in zip(self.posting_docs[start:end], self.posting_tfs[start:end]):
+                norm = K1 * (1 - B) + length_norm * doc_lengths[doc_id]
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, ((score, doc_id) for doc_id, score in scores.items()))
+
+    def get_source(self, doc_id):
+        start, end = self.source_offsets[doc_id], self.source_offsets[doc_id + 1]
+        return bytes(self.sources[start:end]).decode('utf-8')
+
+    def get_text(self, doc_id):
+        start, end = self.text_offsets[doc_id], self.text_offsets[doc_id + 1]
+        return bytes(self.texts[start:end]).decode('utf-8')
+
+
+# path -> Bm25Index, loaded once per container
+indexes = {}
+
+
+def get_index(path):
+    if path not in indexes:
+        indexes[path] = Bm25Index(path)
+    return indexes[path]
+
+
+def retrieve_context(path, query, k=3):
+    """The top k passages for the query, formatted for the prompt"""
+    index = get_index(path)
+    passages = []
+    for _, doc_id in index.search(query, k):
+        passages.append(f"[{index.get_source(doc_id)}]\n{index.get_text(doc_id)}")
+    return '\n\n'.join(passages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build')
+    build_parser.add_argument('docs_dir')
+    build_parser.add_argument('index_file')
+
+    search_parser = subparsers.add_parser('search')
+    search_parser.add_argument('index_file')
+    search_parser.add_argument('query')
+    search_parser.add_argument('-k', type=int, default=3)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        n_docs, n_terms = build_index(read_passages(args.docs_dir), args.index_file)
+        size = os.path.getsize(args.index_file)
+        print(f"Indexed {n_docs} passages, {n_terms} terms, {size} bytes")
+    else:
+        index = get_index(args.index_file)
+        for score, doc_id in index.search(args.query, args.k):
+            print(f"{score:.3f} {index.get_source(doc_id)}: {index.get_text(doc_id)[:100]!r}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
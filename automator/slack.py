@@ -1,40 +1,51 @@
 import os
-import re
-import requests
-
 
+import slack_client
+import slack_markdown
+from cache import TTLCache
 from logs import logger
 
 SLACK_TOKEN = os.getenv('SLACK_TOKEN')
 USER_SLACK_TOKEN = os.getenv('USER_SLACK_TOKEN')
 
+MESSAGE_CACHE_SIZE = int(os.getenv('MESSAGE_CACHE_SIZE', '256'))
+MESSAGE_CACHE_TTL = int(os.getenv('MESSAGE_CACHE_TTL', '60'))
+
+# Message content by (channel, ts), so several reactions on the same
+# message within a short time fetch it only once
+message_cache = TTLCache(MESSAGE_CACHE_SIZE, MESSAGE_CACHE_TTL)
+
+
+def bot_client():
+    return slack_client.get_client(SLACK_TOKEN)
+
+
+def user_client():
+    return slack_client.get_client(USER_SLACK_TOKEN)
+
+
+def section_blocks(message):
+    """mrkdwn section blocks, split to stay within Slack's size limit"""
+    return [
+        {"type": "section", "text": {"type": "mrkdwn", "text": text}}
+        for text in slack_markdown.split_sections(message)
+    ]
+
 
 def post_message_thread(event, message):
     item = event['item']
     channel = item['channel']
     thread_ts = item['ts']
 
-    url = 'https://slack.com/api/chat.postMessage'
-
     message_request = {
         "channel": channel,
         "thread_ts": thread_ts,
-        "blocks": [{
-            "type": "section",
-            "text": {"type": "mrkdwn", "text": message}
-        }]
-    }
-
-    headers = {
-        'Authorization': f'Bearer {SLACK_TOKEN}'
+        "blocks": section_blocks(message)
     }
 
-    logger.info(f'posting {message} to {channel}...')
-    response = requests.post(url, json=message_request, headers=headers)
-    response.raise_for_status()
-
-    response_json = response.json()
-    return response_json
+    logger.info('posting to %s', channel, chars=len(message))
+    logger.debug('posting %s to %s', message, channel)
+    return bot_client().post('chat.postMessage', message_request)
 
 
 def find_message_by_ts(messages, ts):
@@ -44,87 +55,112 @@ def find_message_by_ts(messages, ts):
     return None
 
 
+def cache_messages(channel, messages):
+    for msg in messages:
+        message_cache.set((channel, msg['ts']), msg)
+
+
 def get_message_content(channel, ts):
+    message = message_cache.get((channel, ts))
+    if message is not None:
+        return message
+
     params = {
         'channel': channel,
         'ts': ts
     }
 
-    headers = {
-        'Authorization': f'Bearer {SLACK_TOKEN}'
-    }
-
-    url = 'https://slack.com/api/conversations.replies'
-    response = requests.get(url, params=params, headers=headers)
-    response.raise_for_status()
-
-    response_json = response.json()
+    response_json = bot_client().get('conversations.replies', params)
     all_messages = response_json['messages']
+    cache_messages(channel, all_messages)
     message = find_message_by_ts(all_messages, ts)
     return message
 
 
-def get_thread_replies(channel, ts):
-    """Get all replies in a thread (excluding the parent message)"""
+class ThreadSnapshot():
+    """The parent message and all replies of a thread, fetched once"""
+
+    def __init__(self, channel, ts, messages):
+        self.channel = channel
+        self.ts = ts
+        self.messages = messages
+        self.parent = find_message_by_ts(messages, ts)
+        self.replies = [msg for msg in messages if msg['ts'] != ts]
+
+    @property
+    def authors(self):
+        """Users who wrote the parent or a reply, in order of appearance"""
+        authors = []
+        for msg in self.messages:
+            user = msg.get('user')
+            if user and user not in authors:
+                authors.append(user)
+        return authors
+
+
+def iter_thread_pages(channel, ts, limit=200):
+    """Yield the messages of a thread page by page, following next_cursor"""
     params = {
         'channel': channel,
-        'ts': ts
+        'ts': ts,
+        'limit': limit
     }
 
-    headers = {
-        'Authorization': f'Bearer {SLACK_TOKEN}'
-    }
+    while True:
+        response_json = bot_client().get('conversations.replies', dict(params))
+        messages = response_json.get('messages', [])
+        cache_messages(channel, messages)
+        yield messages
+
+        cursor = response_json.get('response_metadata', {}).get('next_cursor')
+        if not cursor:
+            break
+        params['cursor'] = cursor
 
-    url = 'https://slack.com/api/conversations.replies'
-    response = requests.get(url, params=params, headers=headers)
-    response.raise_for_status()
 
-    response_json = response.json()
-    all_messages = response_json.get('messages', [])
-    
-    # Filter out the parent message (first message with ts == thread_ts)
-    thread_replies = [msg for msg in all_messages if msg['ts'] != ts]
-    
-    return thread_replies
+def get_thread_snapshot(channel, ts):
+    """Fetch the parent and all replies of a thread in one paginated pass"""
+    messages = []
+    for page in iter_thread_pages(channel, ts):
+        messages.extend(page)
+    return ThreadSnapshot(channel, ts, messages)
 
 
-def send_dm(user, message):    
-    url = 'https://slack.com/api/chat.postMessage'
+def get_thread_replies(channel, ts):
+    """Get all replies in a thread (excluding the parent message)"""
+    return get_thread_snapshot(channel, ts).replies
+
 
+def send_dm(user, message):
     message_request = {
         "channel": user,
-        "blocks": [{
-            "type": "section",
-            "text": {"type": "mrkdwn", "text": message}
-        }]
+        "blocks": section_blocks(message)
     }
 
-    headers = {
-        'Authorization': f'Bearer {SLACK_TOKEN}'
-    }
-    
-    logger.info(f'posting {message} to {user}...')
-    response = requests.post(url, json=message_request, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    logger.info('posting to %s', user, chars=len(message))
+    logger.debug('posting %s to %s', message, user)
+    return bot_client().post('chat.postMessage', message_request)
 
 
 def remove_message(channel, ts):
-    url = 'https://slack.com/api/chat.delete'
-
     message_request = {
         "channel": channel,
         "ts": ts
     }
-    
-    headers = {
-        'Authorization': f'Bearer {USER_SLACK_TOKEN}'
+
+    logger.info('removing message from %s at %s', channel, ts)
+    message_cache.invalidate((channel, ts))
+    return user_client().post('chat.delete', message_request)
+
+
+def update_message(channel, ts, message):
+    message_request = {
+        "channel": channel,
+        "ts": ts,
+        "blocks": section_blocks(message)
     }
 
-    logger.info(f'removing message from {channel} at {ts}...')
-    response = requests.post(url, json=message_request, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return bot_client().post('chat.update', message_request)
 
 
 def get_user_and_message(event):
@@ -154,32 +190,31 @@ def get_message(event):
 
 
 def github_to_slack_markdown(github_markdown: str) -> str:
-    slack_markdown = github_markdown
-
-    # Convert headers
-    # slack_markdown = re.sub(r'(^|\n)###### (.*)', r'\1*_\2_*', slack_markdown)
-    # slack_markdown = re.sub(r'(^|\n)##### (.*)', r'\1*_\2_*', slack_markdown)
-    slack_markdown = re.sub(r'(^|\n)#### (.*)', r'\1*_\2_*', slack_markdown)
-    slack_markdown = re.sub(r'(^|\n)### (.*)', r'\1*_\2_*', slack_markdown)
-    slack_markdown = re.sub(r'(^|\n)## (.*)', r'\1*_\2_*', slack_markdown)
-    slack_markdown = re.sub(r'(^|\n)# (.*)', r'\1*_\2_*', slack_markdown)
-
-    # Convert bold text
-    slack_markdown = re.sub(r'\*\*(.*?)\*\*', r'*\1*', slack_markdown)
-    slack_markdown = re.sub(r'__(.*?)__', r'*\1*', slack_markdown)
-
-    # Convert italic text
-    # slack_markdown = re.sub(r'\*(.*?)\*', r'_\1_', slack_markdown)
-    # slack_markdown = re.sub(r'_(.*?)_', r'_\1_', slack_markdown)
-
-    # Convert strikethrough text
-    # slack_markdown = re.sub(r'~~(.*?)~~', r'~\1~', slack_markdown)
-
-    # Convert links
-    slack_markdown = re.sub(r'\[(.*?)\]\((.*?)\)', r'<\2|\1>', slack_markdown)
-
-    # Convert lists
-    # slack_markdown = re.sub(r'^\s*[-*]\s+', r'• ', slack_markdown, flags=re.MULTILINE)
-    # slack_markdown = re.sub(r'^\s*\d+\.\s+', r'1. ', slack_markdown, flags=re.MULTILINE)
-
-    return slack_markdown
+    return slack_markdown.to_slack_markdown(github_markdown)
+
+
+class StreamingSlackMarkdown():
+    """
+    Converts a streamed answer to Slack markdown as it arrives. Complete
+    lines are converted once; only the unfinished last line is converted
+    again on every call to text().
+    """
+
+    def __init__(self):
+        self.converter = slack_markdown.SlackMarkdownConverter()
+        self.converted = ''
+        self.pending = ''
+
+    def feed(self, chunk):
+        self.pending += chunk
+
+        if '\n' in self.pending:
+            complete, _, self.pending = self.pending.rpartition('\n')
+            self.converted += self.converter.convert(complete) + '\n'
+
+    def text(self):
+        # the last line may still turn out to be different, so convert it
+        # without changing the state of the converter
+        converter = slack_markdown.SlackMarkdownConverter()
+        converter.fence = self.converter.fence
+        return self.converted + converter.convert(self.pending)
@@ -0,0 +1,159 @@
+import re
+
+
+# Slack rejects section blocks with more than 3000 characters of text
+SECTION_TEXT_LIMIT = 3000
+
+FENCE_PATTERN = re.compile(r'^([ \t]*)(```|~~~).*$', re.MULTILINE)
+
+# code spans come first so nothing inside them is converted; like in
+# GitHub markdown, markers next to a space don't open or close anything
+INLINE = (
+    r'(?P<code>`+)(?P<code_text>.+?)(?P=code)'
+    r'|\*\*(?=\S)(?P<bold>.+?)(?<=\S)\*\*'
+    r'|(?<!\w)__(?=\S)(?P<underscore_bold>.+?)(?<=\S)__(?!\w)'
+    r'|~~(?=\S)(?P<strike>.+?)(?<=\S)~~'
+    r'|\[(?P<link_text>[^\]\n]*)\]\((?P<url>[^)\s]+)\)'
+)
+INLINE_PATTERN = re.compile(INLINE)
+
+# headers and list items at the start of a line, inline markup anywhere:
+# one scan over the text outside code blocks. The lookahead lets the scan
+# skip characters that can't start any of them.
+TEXT_PATTERN = re.compile(
+    r'(?=[`*_~\[#+-]|^[ \t])(?:'
+    r'^#{1,6}[ \t]+(?P<header>.*?)[ \t]*#*[ \t]*$'
+    r'|^(?P<list_indent>[ \t]*)[-*+][ \t]+'
+    r'|' + INLINE + ')',
+    re.MULTILINE
+)
+
+
+def replace_inline(match, bold='*'):
+    kind = match.lastgroup
+
+    if kind == 'code_text':
+        return match.group(0)
+    if kind == 'bold' or kind == 'underscore_bold':
+        return bold + convert_inline(match.group(kind), bold) + bold
+    if kind == 'strike':
+        return '~' + convert_inline(match.group(kind), bold) + '~'
+    if kind == 'header':
+        return '*_' + convert_inline(match.group(kind), bold='') + '_*'
+    if kind == 'list_indent':
+        return match.group(kind) + '• '
+
+    link_text = match.group('link_text')
+    if not link_text:
+        return f"<{match.group('url')}>"
+    return f"<{match.group('url')}|{link_text}>"
+
+
+def replace_inline_no_bold(match):
+    return replace_inline(match, bold='')
+
+
+def convert_inline(text, bold='*'):
+    """Bold, strikethrough and links, leaving code spans as they are"""
+    if bold:
+        return INLINE_PATTERN.sub(replace_inline, text)
+    return INLINE_PATTERN.sub(replace_inline_no_bold, text)
+
+
+class SlackMarkdownConverter():
+    """
+    Converts GitHub markdown to Slack mrkdwn in one pass. Fenced code
+    blocks are passed through; the converter remembers whether it is
+    inside one, so the text can be fed in pieces of whole lines.
+    """
+
+    def __init__(self):
+        self.fence = None
+
+    def convert_text(self, text):
+        if self.fence is not None:
+            return text
+        return TEXT_PATTERN.sub(replace_inline, text)
+
+    def convert(self, text):
+        parts = []
+        position = 0
+
+        for match in FENCE_PATTERN.finditer(text):
+            parts.append(self.convert_text(text[position:match.start()]))
+            position = match.end()
+
+            indent, fence = match.group(1), match.group(2)
+            if self.fence is None:
+                # Slack shows the language name as code, so drop it
+                self.fence = fence
+                parts.append(indent + '```')
+            elif fence == self.fence:
+                self.fence = None
+                parts.append(indent + '```')
+            else:
+                parts.append(match.group(0))
+
+        parts.append(self.convert_text(text[position:]))
+        return ''.join(parts)
+
+
+def to_slack_markdown(text):
+    return SlackMarkdownConverter().convert(text)
+
+
+def split_sections(text, limit=SECTION_TEXT_LIMIT):
+    """
+    Split text into pieces of at most limit characters, at a paragraph
+    break in the second half of a piece if there is one, otherwise at a
+    line break. A code block that is split is closed and reopened so
+    each piece renders on its own.
+    """
+    if len(text) <= limit:
+        return [text]
+
+    # room for closing and reopening a code block
+    max_line = limit - 8
+    lines = []
+    for line in text.split('\n'):
+        while len(line) > max_line:
+            lines.append(line[:max_line])
+            line = line[max_line:]
+        lines.append(line)
+
+    sections = []
+    current = []
+    size = 0
+    in_code = False
+    # index of the last blank line outside code in current
+    last_break = None
+
+    def add_section(section_lines):
+        section = '\n'.join(section_lines)
+        if section.strip():
+            sections.append(section)
+
+    for line in lines:
+        # +4 leaves room for closing a code block
+        if size + len(line) + 4 > limit:
+            if last_break is not None and 2 * last_break > len(current):
+                add_section(current[:last_break])
+                current = current[last_break + 1:]
+                size = sum(len(c) + 1 for c in current)
+            last_break = None
+
+        if size + len(line) + 4 > limit:
+            add_section(current + ['```'] if in_code else current)
+            current = ['```'] if in_code else []
+            size = 4 if in_code else 0
+
+        if line.lstrip().startswith('```'):
+            in_code = not in_code
+        elif not line and not in_code:
+            last_break = len(current)
+
+        current.append(line)
+        size += len(line) + 1
+
+    add_section(current)
+    return sections
@@ -0,0 +1,127 @@
+import os
+
+import slack
+import groqu
+from cache import TTLCache
+from logs import logger
+
+
+THREAD_SUMMARY_CACHE_SIZE = int(os.getenv('THREAD_SUMMARY_CACHE_SIZE', '128'))
+THREAD_SUMMARY_TTL = int(os.getenv('THREAD_SUMMARY_TTL', '86400'))  # 1 day
+DEFAULT_TOKEN_BUDGET = 3000
+
+SUMMARY_PROMPT = """Summarize the Slack conversation below for someone who needs to answer a question in it.
+Keep names (<@U...>), error messages, versions and what was already tried. At most 200 words.
+
+Summary so far:
+{summary}
+
+New messages:
+{messages}"""
+
+# (channel, thread_ts) -> {'summary': ..., 'last_ts': ts of the last summarized message}
+summary_cache = TTLCache(THREAD_SUMMARY_CACHE_SIZE, THREAD_SUMMARY_TTL)
+
+
+def estimate_tokens(text):
+    # about 4 characters per token for English text
+    return (len(text) + 3) // 4
+
+
+def format_thread_message(msg):
+    user = msg.get('user', 'bot')
+    return f"<@{user}>: {msg.get('text', '')}"
+
+
+def take_recent(lines, budget):
+    """The most recent lines that fit into the token budget, in order"""
+    result = []
+    used = 0
+
+    for line in reversed(lines):
+        tokens = estimate_tokens(line) + 1
+        if used + tokens > budget:
+            break
+        result.append(line)
+        used += tokens
+
+    result.reverse()
+    return result
+
+
+def truncate_to_budget(text, budget):
+    # text[-0:] would be the whole text
+    if budget <= 0:
+        return ''
+    max_chars = budget * 4
+    if len(text) <= max_chars:
+        return text
+    return text[-max_chars:]
+
+
+def update_summary(channel, thread_ts, older, models, budget):
+    """
+    Fold the older messages into the cached rolling summary of the thread.
+    Only messages after the last summarized one are sent to the model.
+    """
+    key = (channel, thread_ts)
+    cached = summary_cache.get(key) or {'summary': '', 'last_ts': None}
+
+    last_ts = cached['last_ts']
+    new_messages = [
+        msg for msg in older
+        if last_ts is None or float(msg['ts']) > float(last_ts)
+    ]
+
+    if not new_messages:
+        return cached['summary']
+
+    messages_text = '\n'.join(format_thread_message(msg) for msg in new_messages)
+    prompt_budget = budget - estimate_tokens(SUMMARY_PROMPT) - estimate_tokens(cached['summary'])
+
+    prompt = SUMMARY_PROMPT.format(
+        summary=cached['summary'] or '(none)',
+        messages=truncate_to_budget(messages_text, max(prompt_budget, 0))
+    )
+
+    summary, info = groqu.resilient_ai_request(prompt, models)
+    logger.info(
+        'summarized %d new messages of thread %s with %s', len(new_messages), thread_ts, info['model'],
+        seconds=round(info['seconds'], 3)
+    )
+
+    summary_cache.set(key, {'summary': summary, 'last_ts': new_messages[-1]['ts']})
+    return summary
+
+
+def build_thread_context(channel, ts, models, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Context of the thread the message at ts belongs to, within token_budget:
+    a cached summary of the older messages plus the recent ones verbatim.
+    The message at ts itself (the question) is not included.
+    """
+    if token_budget <= 0:
+        return ''
+
+    message = slack.get_message_content(channel, ts) or {}
+    thread_ts = message.get('thread_ts', ts)
+
+    thread = slack.get_thread_snapshot(channel, thread_ts)
+    messages = [msg for msg in thread.messages if msg['ts'] != ts]
+
+    if not messages:
+        return ''
+
+    # half of the budget for recent messages as they are, the rest for the summary
+    lines = [format_thread_message(msg) for msg in messages]
+    recent = take_recent(lines, token_budget // 2)
+    older = messages[:len(messages) - len(recent)]
+
+    parts = []
+    if older:
+        summary = update_summary(channel, thread_ts, older, models, token_budget // 2)
+        parts.append(f"Summary of earlier messages:\n{truncate_to_budget(summary, token_budget // 2)}")
+    if recent:
+        parts.append("Recent messages:\n" + '\n'.join(recent))
+
+    return '\n\n'.join(parts)
@@ -1,4 +1,6 @@
 import re
+import string
+import importlib
 
 
 def handle_qoutes(template, placeholder_values):
@@ -58,4 +60,155 @@ def format_message(message_template, placeholders, channel_name):
     message = handle_qoutes(message_template, placeholder_values)
     message = message.format(**placeholder_values)
 
-    return message
\ No newline at end of file
+    return message
+
+
+QUOTE_PATTERN = re.compile(r'^>\s*\{([^}]+)\}\s*$', re.MULTILINE)
+formatter = string.Formatter()
+
+
+def compile_fields(text):
+    """
+    Parse text the way str.format does into literal strings and
+    (name, conversion, format_spec) fields. None if it needs str.format
+    itself (attribute/index lookups, nested specs, positional fields).
+    """
+    segments = []
+
+    for literal, field_name, format_spec, conversion in formatter.parse(text):
+        if literal:
+            segments.append(literal)
+        if field_name is None:
+            continue
+        if not field_name.isidentifier() or '{' in format_spec:
+            return None
+        segments.append((field_name, conversion, format_spec))
+
+    return segments
+
+
+def compile_template(template):
+    """
+    Render plan for a template: static segments, fields and quote blocks
+    (the lines handle_qoutes looks at). None if the template can only be
+    rendered by format_message.
+    """
+    plan = []
+    position = 0
+
+    try:
+        for match in QUOTE_PATTERN.finditer(template):
+            fields = compile_fields(template[position:match.start()])
+            quote_fields = compile_fields(match.group(0))
+            if fields is None or quote_fields is None:
+                return None
+
+            plan.extend(fields)
+            plan.append(('quote', match.group(1).strip(), quote_fields))
+            position = match.end()
+
+        fields = compile_fields(template[position:])
+    except ValueError:
+        # unbalanced braces: keep whatever str.format does with them
+        return None
+
+    if fields is None:
+        return None
+
+    plan.extend(fields)
+    return plan
+
+
+def render_field(field, values):
+    name, conversion, format_spec = field
+    value = values[name]
+
+    if conversion == 'r':
+        value = repr(value)
+    elif conversion == 's':
+        value = str(value)
+    elif conversion == 'a':
+        value = ascii(value)
+
+    if not format_spec and type(value) is str:
+        return value
+    return format(value, format_spec)
+
+
+def render_plan(plan, values):
+    """
+    Output of the plan, or None when a quoted value contains braces:
+    format_message passes quoted values through str.format, so that case
+    is left to it.
+    """
+    parts = []
+
+    for segment in plan:
+        if type(segment) is str:
+            parts.append(segment)
+        elif segment[0] != 'quote':
+            parts.append(render_field(segment, values))
+        else:
+            _, name, quote_fields = segment
+            value = values[name].strip() if name in values else ''
+
+            if '\n' not in value:
+                for field in quote_fields:
+                    parts.append(field if type(field) is str else render_field(field, values))
+                continue
+
+            if '{' in value or '}' in value:
+                return None
+            parts.extend(f'>{line}\n' for line in value.split('\n'))
+
+    return ''.join(parts)
+
+
+class MessageTemplate():
+    """
+    A message template parsed once, with the placeholders of each channel
+    resolved on first use. render gives the same output as format_message.
+    """
+
+    def __init__(self, template, placeholders=None):
+        self.template = template
+        self.placeholders = placeholders or {}
+        self.plan = compile_template(template)
+        self.channel_values = {}
+
+    def resolve(self, channel_name):
+        if channel_name not in self.channel_values:
+            self.channel_values[channel_name] = prepare_values(self.placeholders, channel_name)
+        return self.channel_values[channel_name]
+
+    def render(self, channel_name, values=None):
+        """values are per-event placeholders; the configured ones take precedence"""
+        channel_values = self.resolve(channel_name)
+        if channel_values is None:
+            return None
+
+        if values:
+            placeholder_values = dict(values)
+            placeholder_values.update(channel_values)
+        else:
+            placeholder_values = channel_values
+
+        if self.plan is not None:
+            message = render_plan(self.plan, placeholder_values)
+            if message is not None:
+                return message
+
+        return format_message(self.template, placeholder_values, channel_name)
+
+
+class LazyModule():
+    """Imports the module on first attribute access"""
+
+    def __init__(self, name):
+        self.name = name
+        self.module = None
+
+    def __getattr__(self, attribute):
+        if self.module is None:
+            self.module = importlib.import_module(self.name)
+        return getattr(self.module, attribute)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Cold start of the automator Lambda: time to import lambda_function and
+handle an event for a reaction without a config, in a fresh interpreter.
+
+    eager + yaml:      the previous behavior, every handler dependency
+                       imported up front and config.yaml parsed
+    lazy + yaml:       lazy imports, no snapshot
+    lazy + snapshot:   lazy imports, JSON snapshot built by package.sh
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 15]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+AUTOMATOR_DIR = os.path.join(ROOT, 'automator')
+COMMON_DIR = os.path.join(ROOT, 'common')
+
+CHILD = """
+import sys, time, json
+t0 = time.perf_counter()
+for name in {eager}:
+    __import__(name)
+import lambda_function
+t1 = time.perf_counter()
+lambda_function.logger.set_level('ERROR')
+lambda_function.run({{'event': {{'reaction': 'no-such-reaction'}}}})
+t2 = time.perf_counter()
+print(json.dumps({{'import_ms': 1000 * (t1 - t0), 'event_ms': 1000 * (t2 - t1)}}))
+"""
+
+EAGER_MODULES = ['yaml', 'requests', 'groqu', 'slack', 'retrieval', 'thread_context']
+
+
+def run_once(eager, snapshot_file):
+    env = dict(
+        os.environ,
+        CONFIG_FILE=os.path.join(AUTOMATOR_DIR, 'config.yaml'),
+        CONFIG_SNAPSHOT=snapshot_file,
+        PYTHONPATH=os.pathsep.join([AUTOMATOR_DIR, COMMON_DIR]),
+    )
+    code = CHILD.format(eager=eager)
+
+    t0 = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=AUTOMATOR_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    total_ms = 1000 * (time.perf_counter() - t0)
+
+    timings = json.loads(result.stdout.strip().split('\n')[-1])
+    timings['total_ms'] = total_ms
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=15)
+    args = parser.parse_args()
+
+    sys.path.insert(0, AUTOMATOR_DIR)
+    sys.path.insert(0, COMMON_DIR)
+    import config_loader
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_file = os.path.join(tmp_dir, 'config.json')
+        missing_file = os.path.join(tmp_dir, 'missing.json')
+        config_loader.write_snapshot(os.path.join(AUTOMATOR_DIR, 'config.yaml'), snapshot_file)
+
+        variants = [
+            ('eager + yaml', EAGER_MODULES, missing_file),
+            ('lazy + yaml', [], missing_file),
+            ('lazy + snapshot', [], snapshot_file),
+        ]
+
+        print(f"{'variant':<18} {'import ms':>10} {'event ms':>9} {'process ms':>11}")
+
+        for name, eager, snapshot in variants:
+            runs = [run_once(eager, snapshot) for _ in range(args.runs)]
+            print(
+                f"{name:<18} "
+                f"{statistics.median(r['import_ms'] for r in runs):>10.1f} "
+                f"{statistics.median(r['event_ms'] for r in runs):>9.2f} "
+                f"{statistics.median(r['total_ms'] for r in runs):>11.1f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
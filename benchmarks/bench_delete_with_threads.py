@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Wall-clock time of DELETE_WITH_THREADS as the thread grows, sequential
+vs concurrent, against the fake Slack API in integration_tests/fake_api.py.
+
+Usage:
+    python benchmarks/bench_delete_with_threads.py [--latency-ms 50]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'automator'))
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+sys.path.insert(0, os.path.join(ROOT, 'integration_tests'))
+
+from fake_api import start_fake_api
+
+THREAD_SIZES = [5, 10, 20, 40, 80]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    server = start_fake_api(latency=args.latency_ms / 1000)
+
+    os.environ['SLACK_API_URL'] = server.slack_url
+    os.environ['CONFIG_FILE'] = os.path.join(ROOT, 'automator', 'config.yaml')
+
+    import slack_client
+    import lambda_function
+    from logs import logger
+
+    logger.set_level('ERROR')
+
+    # measure concurrency, not Slack's rate limits
+    for tier in slack_client.RATE_LIMIT_TIERS:
+        slack_client.RATE_LIMIT_TIERS[tier] = 10 ** 6
+
+    reaction_config = lambda_function.provider.current.reaction_configs['delete']
+    lambda_function.FAKE_DELETE = False
+
+    print(f"{'replies':>8} {'sequential s':>13} {'concurrent s':>13} {'speedup':>8}")
+
+    for size in THREAD_SIZES:
+        timings = []
+
+        for concurrency in [1, lambda_function.DELETE_CONCURRENCY]:
+            # the fake API really deletes, so every run gets a new thread
+            ts = server.state.add_thread('C01FABYF2RG', replies=size)
+            event = {'item': {'channel': 'C01FABYF2RG', 'ts': ts}}
+            lambda_function.DELETE_CONCURRENCY = concurrency
+            t0 = time.perf_counter()
+            summary = lambda_function.handle_delete_with_threads(event, reaction_config)
+            timings.append(time.perf_counter() - t0)
+            assert len(summary['success']) == size
+
+        print(f"{size:>8} {timings[0]:>13.2f} {timings[1]:>13.2f} {timings[0] / timings[1]:>7.1f}x")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
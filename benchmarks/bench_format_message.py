@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+util.format_message vs precompiled util.MessageTemplate on the templates
+from config.yaml. Also checks that both give the same output.
+
+Usage:
+    python benchmarks/bench_format_message.py [--iterations 20000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import yaml
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'automator'))
+
+import util
+
+
+USER_MESSAGES = {
+    'one line': 'How do I install docker on windows?',
+    'multi-line': 'I get this error:\nTraceback (most recent call last)\n  File "train.py"\nValueError: bad input',
+}
+
+
+def timeit(fn, iterations):
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return 1e6 * (time.perf_counter() - t0) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'automator', 'config.yaml')) as f_in:
+        config = yaml.safe_load(f_in)
+
+    print(f"{'reaction':<28} {'message':<11} {'format us':>10} {'compiled us':>12} {'speedup':>8}")
+
+    for c in config['reactions']:
+        if 'message' not in c:
+            continue
+
+        placeholders = c.get('placeholders', {})
+        template = util.MessageTemplate(c['message'], placeholders)
+
+        for kind, user_message in USER_MESSAGES.items():
+            values = {'user': 'U01AXE0P5M3', 'channel': 'course-ml-zoomcamp', 'user_message': user_message}
+
+            def legacy():
+                merged = dict(values)
+                merged.update(placeholders)
+                return util.format_message(c['message'], merged, 'course-ml-zoomcamp')
+
+            def compiled():
+                return template.render('course-ml-zoomcamp', values)
+
+            assert legacy() == compiled(), c['reaction']
+
+            legacy_us = timeit(legacy, args.iterations)
+            compiled_us = timeit(compiled, args.iterations)
+            print(
+                f"{c['reaction']:<28} {kind:<11} {legacy_us:>10.2f} "
+                f"{compiled_us:>12.2f} {legacy_us / compiled_us:>7.1f}x"
+            )
+
+
+if __name__ == '__main__':
+    main()
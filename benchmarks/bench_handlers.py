@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+End-to-end time of the handlers that talk to Slack and Groq, offline
+against the fake APIs in integration_tests/fake_api.py:
+
+    delete_messages:  the moderator deleting a user's messages, also
+                      with some of the calls rate limited
+    ASK_AI:           reading the message, asking Groq and posting the
+                      answer, with and without streaming
+
+Usage:
+    python benchmarks/bench_handlers.py [--latency-ms 50] [--groq-latency-ms 800]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+# both have a lambda_function module, the automator's is used
+sys.path.insert(0, os.path.join(ROOT, 'moderator'))
+sys.path.insert(0, os.path.join(ROOT, 'automator'))
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+sys.path.insert(0, os.path.join(ROOT, 'integration_tests'))
+
+from fake_api import start_fake_api
+
+CHANNEL = 'C01FABYF2RG'
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--groq-latency-ms', type=float, default=800)
+    parser.add_argument('--messages', type=int, default=30)
+    args = parser.parse_args()
+
+    server = start_fake_api(
+        latency=args.latency_ms / 1000,
+        latencies={'chat.completions': args.groq_latency_ms / 1000},
+        retry_after=1,
+        stream_chunk_delay=0.02,
+        seed=1,
+    )
+
+    os.environ['SLACK_API_URL'] = server.slack_url
+    os.environ['GROQ_API_URL'] = server.groq_url
+    os.environ['CONFIG_FILE'] = os.path.join(ROOT, 'automator', 'config.yaml')
+
+    import slack_client
+    import slack_moderator
+    import lambda_function
+    from logs import logger
+
+    logger.set_level('ERROR')
+    lambda_function.metrics.enabled = False
+    for tier in slack_client.RATE_LIMIT_TIERS:
+        slack_client.RATE_LIMIT_TIERS[tier] = 10 ** 6
+
+    results = []
+
+    for name, probability in [('delete_messages', 0.0), ('delete_messages, 10% 429', 0.1)]:
+        server.rate_limit_probability = probability
+        messages = [
+            {'channel_id': CHANNEL, 'message_ts': server.state.add_message(CHANNEL, f'spam {i}', user='U_SPAM')}
+            for i in range(args.messages)
+        ]
+        t0 = time.perf_counter()
+        result = slack_moderator.delete_messages(messages)
+        results.append((f'{name} ({args.messages})', time.perf_counter() - t0))
+        assert len(result['success']) == args.messages
+
+    server.rate_limit_probability = 0.0
+    reaction_config = dict(lambda_function.provider.current.reaction_configs['ask-ai'], cache=False)
+
+    for name, stream in [('ASK_AI', False), ('ASK_AI, streamed', True)]:
+        ts = server.state.add_message(CHANNEL, 'How do I install docker on windows?', user='U1')
+        event = {'item': {'channel': CHANNEL, 'ts': ts}}
+        t0 = time.perf_counter()
+        lambda_function.handle_ask_ai(event, dict(reaction_config, stream=stream))
+        results.append((name, time.perf_counter() - t0))
+
+    print(f"{'handler':<32} {'seconds':>8}")
+    for name, seconds in results:
+        print(f"{name:<32} {seconds:>8.2f}")
+    print(f"calls: {dict(server.state.calls)}")
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
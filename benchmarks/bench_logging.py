@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Per-call overhead of logging: the previous print-based logger with
+eagerly built f-strings vs the JSON logger in common/logs.py, for a
+record that is written, a debug record that is disabled and the
+Slack payload dump. Output goes to /dev/null.
+
+Usage:
+    python benchmarks/bench_logging.py [--iterations 100000]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+
+from logs import Logger
+
+
+class PrintLogger():
+    """automator/logs.py before the JSON logger"""
+
+    def print(self, message):
+        message = message.replace('\n', ' ')
+        print(message)
+
+    def info(self, message):
+        self.print(message)
+
+
+STATS = {'hits': 120, 'misses': 30, 'evictions': 0, 'size': 150, 'hit_rate': 0.8}
+
+BODY = {
+    'event_id': 'Ev0123456789',
+    'event': {
+        'type': 'message',
+        'user': 'U0123456789',
+        'channel': 'C0123456789',
+        'ts': '1700000000.000100',
+        'text': 'How do I install docker on windows? ' * 5,
+        'blocks': [{'type': 'rich_text', 'elements': [{'type': 'text', 'text': 'How do I install docker'}]}],
+    },
+}
+
+
+def timeit(fn, iterations):
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return 1e6 * (time.perf_counter() - t0) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    previous = PrintLogger()
+    info = Logger(level='INFO', sampling='message=0.01')
+    warning = Logger(level='WARNING')
+
+    cases = [
+        ('info record',
+            lambda: previous.info(f'message cache: {STATS}'),
+            lambda: info.info('message cache', stats=STATS)),
+        ('disabled record',
+            lambda: previous.info(f'posting {BODY["event"]["text"]} to {BODY["event"]["channel"]}...'),
+            lambda: warning.debug('posting %s to %s', BODY['event']['text'], BODY['event']['channel'])),
+        ('payload (1% sampled)',
+            lambda: print(json.dumps(BODY)),
+            lambda: info.payload(BODY)),
+    ]
+
+    stdout = sys.stdout
+    results = []
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            for name, before, after in cases:
+                results.append((name, timeit(before, args.iterations), timeit(after, args.iterations)))
+        finally:
+            sys.stdout = stdout
+
+    print(f"{'call':<22} {'print us':>9} {'json logger us':>15} {'speedup':>8}")
+    for name, before, after in results:
+        print(f"{name:<22} {before:>9.2f} {after:>15.2f} {before / after:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Overhead of the invocation metrics in common/metrics.py: a timed block,
+a counter, and flushing a record with a typical number of metrics.
+Output goes to /dev/null.
+
+Usage:
+    python benchmarks/bench_metrics.py [--iterations 100000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+
+from metrics import Metrics
+
+
+def timeit(fn, iterations):
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return 1e6 * (time.perf_counter() - t0) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    metrics = Metrics()
+
+    def nothing():
+        pass
+
+    def timed():
+        with metrics.timer('slack.chat.delete'):
+            pass
+
+    def counted():
+        metrics.count('ai_cache.hits')
+
+    def invocation():
+        # a DELETE_WITH_THREADS of 10 replies
+        with metrics.timer('slack.conversations.replies'):
+            pass
+        for _ in range(10):
+            with metrics.timer('slack.chat.postMessage'):
+                pass
+            with metrics.timer('slack.chat.delete'):
+                pass
+        metrics.set_handler('DELETE_WITH_THREADS')
+        metrics.flush(0.5)
+
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        sys.stdout = devnull
+        try:
+            results = [
+                ('empty call', timeit(nothing, args.iterations)),
+                ('timed block', timeit(timed, args.iterations)),
+                ('counter', timeit(counted, args.iterations)),
+                ('invocation + flush', timeit(invocation, args.iterations // 10)),
+            ]
+        finally:
+            sys.stdout = stdout
+
+    print(f"{'operation':<20} {'us':>8}")
+    for name, us in results:
+        print(f"{name:<20} {us:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Size, load time and query latency of the BM25 retrieval index for
+synthetic FAQ collections of up to 10k documents.
+
+Usage:
+    python benchmarks/bench_retrieval.py [--queries 200]
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'automator'))
+
+import retrieval
+
+
+DOC_COUNTS = [1000, 10000]
+
+WORDS = """
+docker kafka spark airflow terraform python pandas sklearn model training
+homework deadline certificate leaderboard notebook kernel error install
+windows linux macos conda pip environment variable port container image
+bucket credentials permission denied timeout memory gpu cuda dataset csv
+parquet schema pipeline deployment lambda function api request response
+""".split()
+
+
+def make_passages(count, rng):
+    """Question-and-answer passages with a zipf-like word distribution"""
+    vocabulary = WORDS + [f'term{i}' for i in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+    for i in range(count):
+        question = ' '.join(rng.choices(vocabulary, weights, k=8))
+        answer = ' '.join(rng.choices(vocabulary, weights, k=60))
+        yield f'faq-{i // 100}.md', f'## {question}?\n\n{answer}'
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[int(p / 100 * (len(values) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    queries = [' '.join(rng.choices(WORDS, k=6)) for _ in range(args.queries)]
+
+    print(f"{'docs':>6} {'build s':>8} {'size KB':>8} {'load ms':>8} {'p50 ms':>7} {'p95 ms':>7}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for count in DOC_COUNTS:
+            path = os.path.join(tmp_dir, f'faq-{count}.idx')
+
+            t0 = time.perf_counter()
+            retrieval.build_index(make_passages(count, rng), path)
+            build_seconds = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            index = retrieval.Bm25Index(path)
+            load_ms = 1000 * (time.perf_counter() - t0)
+
+            timings = []
+            for query in queries:
+                t0 = time.perf_counter()
+                for _, doc_id in index.search(query, k=3):
+                    index.get_text(doc_id)
+                timings.append(1000 * (time.perf_counter() - t0))
+
+            index.close()
+
+            size_kb = os.path.getsize(path) / 1024
+            print(
+                f"{count:>6} {build_seconds:>8.2f} {size_kb:>8.0f} {load_ms:>8.3f} "
+                f"{percentile(timings, 50):>7.2f} {percentile(timings, 95):>7.2f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
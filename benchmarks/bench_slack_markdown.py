@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Throughput of the single-pass Slack markdown converter against the
+previous regex-based github_to_slack_markdown, on AI-answer-like text
+of 1 to 64 KB.
+
+Usage:
+    python benchmarks/bench_slack_markdown.py [--iterations 50]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'automator'))
+
+import slack_markdown
+
+
+SIZES_KB = [1, 4, 16, 64]
+
+ANSWER = """## How to fix the Docker error
+
+The error `permission denied` means your user is not in the **docker** group.
+See the [post-install guide](https://docs.docker.com/engine/install/linux-postinstall/) for details.
+
+### Steps
+
+1. Add yourself to the group
+2. Log out and log back in
+- Check with `docker ps`
+- ~~Restarting~~ is not needed
+
+```bash
+sudo usermod -aG docker $USER
+```
+
+"""
+
+
+def previous_github_to_slack_markdown(github_markdown):
+    """github_to_slack_markdown before the single-pass converter"""
+    slack_markdown = github_markdown
+    slack_markdown = re.sub(r'(^|\n)#### (.*)', r'\1*_\2_*', slack_markdown)
+    slack_markdown = re.sub(r'(^|\n)### (.*)', r'\1*_\2_*', slack_markdown)
+    slack_markdown = re.sub(r'(^|\n)## (.*)', r'\1*_\2_*', slack_markdown)
+    slack_markdown = re.sub(r'(^|\n)# (.*)', r'\1*_\2_*', slack_markdown)
+    slack_markdown = re.sub(r'\*\*(.*?)\*\*', r'*\1*', slack_markdown)
+    slack_markdown = re.sub(r'__(.*?)__', r'*\1*', slack_markdown)
+    slack_markdown = re.sub(r'\[(.*?)\]\((.*?)\)', r'<\2|\1>', slack_markdown)
+    return slack_markdown
+
+
+def throughput(fn, text, iterations):
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn(text)
+    seconds = time.perf_counter() - t0
+    return len(text) * iterations / seconds / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'size KB':>8} {'previous MB/s':>14} {'single-pass MB/s':>17} {'split MB/s':>11}")
+
+    for size_kb in SIZES_KB:
+        text = (ANSWER * (size_kb * 1024 // len(ANSWER) + 1))[:size_kb * 1024]
+
+        previous = throughput(previous_github_to_slack_markdown, text, args.iterations)
+        single_pass = throughput(slack_markdown.to_slack_markdown, text, args.iterations)
+        split = throughput(slack_markdown.split_sections, text, args.iterations)
+
+        print(f"{size_kb:>8} {previous:>14.1f} {single_pass:>17.1f} {split:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import random
+import traceback
+
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVELS = {
+    'DEBUG': DEBUG,
+    'INFO': INFO,
+    'WARNING': WARNING,
+    'ERROR': ERROR,
+}
+LEVEL_NAMES = {value: name.lower() for name, value in LEVELS.items()}
+
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Share of full Slack payloads to log per event type, e.g.
+# "reaction_added=1,message=0.01,default=0.1"
+LOG_PAYLOAD_SAMPLING = os.getenv('LOG_PAYLOAD_SAMPLING', 'reaction_added=1,default=0.01')
+# Replace message text in payloads with its length
+LOG_REDACT = os.getenv('LOG_REDACT', '1') == '1'
+
+# Keys whose values can contain what users wrote
+REDACTED_KEYS = {'text', 'blocks', 'attachments', 'files', 'user_message', 'message_text'}
+
+# json.dumps builds a new encoder for every call with default=
+encoder = json.JSONEncoder(default=str)
+
+
+def parse_sampling(spec):
+    rates = {}
+    for part in spec.split(','):
+        if '=' not in part:
+            continue
+        event_type, _, rate = part.partition('=')
+        rates[event_type.strip()] = float(rate)
+    return rates
+
+
+def redact(value):
+    """Copy of a Slack payload without message text"""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in REDACTED_KEYS and item:
+                if isinstance(item, str):
+                    result[key] = f'<redacted {len(item)} chars>'
+                else:
+                    result[key] = '<redacted>'
+            elif key == 'payload' and isinstance(item, str):
+                # interactive payloads are JSON in a form field
+                try:
+                    result[key] = redact(json.loads(item))
+                except ValueError:
+                    result[key] = f'<redacted {len(item)} chars>'
+            else:
+                result[key] = redact(item)
+        return result
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    return value
+
+
+class Logger():
+    """
+    One-line JSON records. The message is %-formatted with args only when
+    the level is enabled; keyword arguments become fields of the record.
+    """
+
+    def __init__(self, level=LOG_LEVEL, sampling=LOG_PAYLOAD_SAMPLING, redact_payloads=LOG_REDACT):
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        self.sampling = parse_sampling(sampling)
+        self.redact_payloads = redact_payloads
+        self.function = os.getenv('AWS_LAMBDA_FUNCTION_NAME')
+        self.random = random.random
+        # fields added to every record, e.g. the trace context of the invocation
+        self.context = {}
+
+    def set_level(self, level):
+        self.level = LEVELS[level.upper()]
+
+    def set_context(self, **fields):
+        """Replace the fields added to every record"""
+        self.context = fields
+
+    def is_enabled(self, level):
+        return level >= self.level
+
+    def emit(self, record):
+        sys.stdout.write(encoder.encode(record) + '\n')
+
+    def log(self, level, message, args, fields):
+        if level < self.level:
+            return
+
+        if args:
+            message = message % args
+
+        record = {'level': LEVEL_NAMES[level], 'message': message}
+        if self.function:
+            record['function'] = self.function
+        if self.context:
+            record.update(self.context)
+        if fields:
+            record.update(fields)
+
+        self.emit(record)
+
+    def debug(self, message, *args, **fields):
+        self.log(DEBUG, message, args, fields)
+
+    def info(self, message, *args, **fields):
+        self.log(INFO, message, args, fields)
+
+    def warning(self, message, *args, **fields):
+        self.log(WARNING, message, args, fields)
+
+    def error(self, message, *args, **fields):
+        self.log(ERROR, message, args, fields)
+
+    def exception(self, message, *args, **fields):
+        fields['traceback'] = traceback.format_exc()
+        self.log(ERROR, message, args, fields)
+
+    def payload(self, body):
+        """
+        Log the Slack request body for a sample of the events of its type
+        (all of them at debug level), with message text redacted
+        """
+        if 'payload' in body:
+            event_type = 'interactive'
+        else:
+            event_type = body.get('event', {}).get('type', 'other')
+
+        if self.level > DEBUG:
+            rate = self.sampling.get(event_type, self.sampling.get('default', 0.0))
+            if rate <= 0 or (rate < 1 and self.random() >= rate):
+                return
+            if self.level > INFO:
+                return
+
+        if self.redact_payloads:
+            body = redact(body)
+
+        record = {
+            'level': 'info' if self.level > DEBUG else 'debug',
+            'message': 'slack payload',
+            'event_type': event_type,
+        }
+        record.update(self.context)
+        record['payload'] = body
+        self.emit(record)
+
+
+logger = Logger()
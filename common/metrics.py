@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import threading
+
+from logs import encoder
+
+
+METRICS_NAMESPACE = os.getenv('METRICS_NAMESPACE', 'AuTomator')
+# Set to 0 to not write the metrics record at the end of invocations
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+
+DIMENSIONS = ['Function', 'Handler']
+
+
+class Timer():
+    """Adds the time spent in the block to a metric; exceptions are counted as errors"""
+
+    __slots__ = ('metrics', 'name', 'started_at')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started_at = self.metrics.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.metrics.add_time(self.name, self.metrics.clock() - self.started_at)
+        if exc_type is not None:
+            self.metrics.count(self.name + '.errors')
+        return False
+
+
+class Metrics():
+    """
+    Timers and counters of one invocation, written by flush() as a single
+    CloudWatch Embedded Metric Format record: CloudWatch turns the line
+    into metrics, no API calls needed.
+
+    Every timed dependency (slack.chat.delete, groq, dynamodb.GetItem, ...)
+    gets <name>.time with the total milliseconds and <name>.calls.
+    """
+
+    def __init__(self, namespace=METRICS_NAMESPACE, enabled=METRICS_ENABLED, clock=time.perf_counter):
+        self.namespace = namespace
+        self.enabled = enabled
+        self.clock = clock
+        self.function = os.getenv('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+        self.lock = threading.Lock()
+        self.cold_start = True
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.timings = {}
+            self.counters = {}
+            self.values = {}
+            self.properties = {}
+            self.handler = None
+
+    def set_handler(self, handler):
+        self.handler = handler
+
+    def set_property(self, name, value):
+        """Extra field of the record, searchable in Logs Insights but not a metric"""
+        self.properties[name] = value
+
+    def set_value(self, name, value, unit):
+        """A metric measured once per invocation, e.g. a queueing delay"""
+        self.values[name] = (value, unit)
+
+    def timer(self, name):
+        return Timer(self, name)
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                self.timings[name] = [1, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def build_record(self, duration=None, timestamp=None):
+        record = dict(self.properties)
+        record['Function'] = self.function
+        record['Handler'] = self.handler or 'none'
+
+        definitions = []
+
+        def add(name, value, unit):
+            definitions.append({'Name': name, 'Unit': unit})
+            record[name] = value
+
+        add('ColdStart', 1 if self.cold_start else 0, 'Count')
+        if duration is not None:
+            add('Duration', round(1000 * duration, 3), 'Milliseconds')
+
+        for name, (value, unit) in sorted(self.values.items()):
+            add(name, value, unit)
+
+        for name, (calls, seconds) in sorted(self.timings.items()):
+            add(name + '.time', round(1000 * seconds, 3), 'Milliseconds')
+            add(name + '.calls', calls, 'Count')
+
+        for name, value in sorted(self.counters.items()):
+            add(name, value, 'Count')
+
+        if timestamp is None:
+            timestamp = time.time()
+
+        record['_aws'] = {
+            'Timestamp': int(1000 * timestamp),
+            'CloudWatchMetrics': [{
+                'Namespace': self.namespace,
+                'Dimensions': [DIMENSIONS],
+                'Metrics': definitions,
+            }],
+        }
+        return record
+
+    def flush(self, duration=None):
+        """Write the record of this invocation and start over for the next one"""
+        record = self.build_record(duration)
+        if self.enabled:
+            sys.stdout.write(encoder.encode(record) + '\n')
+
+        self.reset()
+        self.cold_start = False
+        return record
+
+
+def instrument_boto3(client, prefix='dynamodb'):
+    """Time every API call of a boto3 client (e.g. resource.meta.client) as <prefix>.<Operation>"""
+
+    # emitted for every call, also when a stub answers before-call
+    def start_call(context, **kwargs):
+        context['metrics_started_at'] = metrics.clock()
+
+    # after-call has error responses (ClientError), after-call-error exceptions such as timeouts
+    def after_call(event_name, context, parsed=None, **kwargs):
+        started_at = context.get('metrics_started_at')
+        if started_at is None:
+            return
+        name = prefix + '.' + event_name.rsplit('.', 1)[-1]
+        metrics.add_time(name, metrics.clock() - started_at)
+        if event_name.startswith('after-call-error') or (parsed and 'Error' in parsed):
+            metrics.count(name + '.errors')
+
+    events = client.meta.events
+    events.register('provide-client-params', start_call)
+    events.register('after-call', after_call)
+    events.register('after-call-error', after_call)
+
+
+# Shared by all the modules of a function, flushed by its lambda_handler
+metrics = Metrics()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Rules deciding which Slack events can produce work, shared by the router
+(which drops the rest before invoking a worker Lambda) and the workers.
+
+The admins and reactions come from the automator config and are
+compiled into routing_rules.json when the router and the moderator are
+packaged, so both drop the same messages:
+
+    python routing.py ../automator/config.yaml routing_rules.json
+
+With --all-reactions the rules don't filter reactions, for an automator
+that reloads its config from S3 (CONFIG_S3_URI): reactions added there
+aren't in config.yaml.
+"""
+
+import os
+import sys
+import json
+
+
+AUTOMATOR_FUNCTION = 'automator-process-reaction'
+MODERATOR_FUNCTION = 'automator-message-moderator'
+
+ROUTING_RULES_FILE = os.getenv('ROUTING_RULES_FILE', 'routing_rules.json')
+# Set to 0 to forward admin reactions even if they aren't in the rules file,
+# e.g. when the automator config is reloaded from S3 between deploys
+ROUTING_FILTER_REACTIONS = os.getenv('ROUTING_FILTER_REACTIONS', '1') == '1'
+# Used when there's no rules file
+DEFAULT_ADMINS = os.getenv('ADMIN_USER_IDS', 'U01AXE0P5M3').split(',')
+
+# Message subtypes the moderator doesn't track
+IGNORED_MESSAGE_SUBTYPES = {'bot_message', 'message_changed', 'message_deleted'}
+
+RULES_VERSION = 1
+
+
+def message_drop_rule(event, admins):
+    """
+    Name of the rule that drops the message event, or None if the
+    moderator should track it
+    """
+    if event.get('subtype') in IGNORED_MESSAGE_SUBTYPES:
+        return 'message_ignored_subtype'
+
+    user_id = event.get('user')
+    if not user_id:
+        return 'message_no_user'
+    if user_id in admins:
+        return 'message_from_admin'
+
+    return None
+
+
+class RoutingRules():
+    """
+    route(body) gives (function name or None, rule name) for a Slack
+    request body. reactions=None forwards every admin reaction.
+    """
+
+    def __init__(self, admins, reactions=None):
+        self.admins = frozenset(admins)
+        self.reactions = frozenset(reactions) if reactions is not None else None
+
+    @classmethod
+    def from_file(cls, path=ROUTING_RULES_FILE):
+        if not os.path.exists(path):
+            return cls(DEFAULT_ADMINS)
+
+        with open(path, 'r') as f_in:
+            rules = json.load(f_in)
+
+        if rules.get('version') != RULES_VERSION:
+            raise ValueError(f'{path}: unsupported routing rules version {rules.get("version")}')
+
+        reactions = rules['reactions'] if ROUTING_FILTER_REACTIONS else None
+        return cls(rules['admins'], reactions)
+
+    def route(self, body):
+        # interactive components (button clicks on moderation alerts)
+        if 'payload' in body:
+            return MODERATOR_FUNCTION, 'interactive'
+
+        event = body.get('event', {})
+        event_type = event.get('type')
+
+        if event_type == 'reaction_added':
+            if event.get('user') not in self.admins:
+                return None, 'reaction_not_admin'
+            if self.reactions is not None and event.get('reaction') not in self.reactions:
+                return None, 'reaction_not_configured'
+            return AUTOMATOR_FUNCTION, 'reaction'
+
+        if event_type == 'message':
+            dropped_by = message_drop_rule(event, self.admins)
+            if dropped_by:
+                return None, dropped_by
+            return MODERATOR_FUNCTION, 'message'
+
+        return None, 'other_event'
+
+
+class RoutingStats():
+    """Forwarded and dropped events per rule, since the container started"""
+
+    def __init__(self):
+        self.counts = {}
+
+    def record(self, rule, forwarded):
+        counts = self.counts.setdefault(rule, {'forwarded': 0, 'dropped': 0})
+        counts['forwarded' if forwarded else 'dropped'] += 1
+
+    def totals(self):
+        forwarded = sum(c['forwarded'] for c in self.counts.values())
+        dropped = sum(c['dropped'] for c in self.counts.values())
+        return {'forwarded': forwarded, 'dropped': dropped}
+
+
+def compile_rules(config, filter_reactions=True):
+    """reactions is None (every admin reaction is forwarded) without filter_reactions"""
+    reactions = None
+    if filter_reactions:
+        reactions = sorted(c['reaction'] for c in config['reactions'])
+
+    return {
+        'version': RULES_VERSION,
+        'admins': sorted(config['admins']),
+        'reactions': reactions,
+    }
+
+
+def main():
+    args = sys.argv[1:]
+    filter_reactions = '--all-reactions' not in args
+    args = [a for a in args if a != '--all-reactions']
+
+    if len(args) != 2:
+        print(__doc__)
+        return 1
+
+    import yaml
+
+    config_file, rules_file = args
+    with open(config_file, 'r') as f_in:
+        config = yaml.safe_load(f_in)
+
+    rules = compile_rules(config, filter_reactions)
+    with open(rules_file, 'w') as f_out:
+        json.dump(rules, f_out, indent=2)
+
+    reactions = len(rules['reactions']) if filter_reactions else 'all'
+    print(f"Wrote {rules_file}: {len(rules['admins'])} admins, {reactions} reactions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
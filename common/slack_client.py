@@ -0,0 +1,258 @@
+import os
+import time
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import logs
+from logs import logger
+from metrics import metrics
+
+
+SLACK_API_URL = os.getenv('SLACK_API_URL', 'https://slack.com/api')
+SLACK_CONNECT_TIMEOUT = float(os.getenv('SLACK_CONNECT_TIMEOUT', '3.05'))
+SLACK_READ_TIMEOUT = float(os.getenv('SLACK_READ_TIMEOUT', '10'))
+SLACK_POOL_SIZE = int(os.getenv('SLACK_POOL_SIZE', '10'))
+SLACK_MAX_RETRIES = int(os.getenv('SLACK_MAX_RETRIES', '5'))
+
+# Requests per minute, see https://api.slack.com/apis/rate-limits
+RATE_LIMIT_TIERS = {
+    'tier1': 1,
+    'tier2': 20,
+    'tier3': 50,
+    'tier4': 100,
+    # chat.postMessage: about one message per second per channel
+    'special': 60,
+}
+
+METHOD_TIERS = {
+    'chat.postMessage': 'special',
+    'chat.update': 'tier3',
+    'chat.delete': 'tier3',
+    'conversations.replies': 'tier3',
+    'admin.users.session.invalidate': 'tier2',
+}
+
+DEFAULT_TIER = 'tier3'
+
+
+class TokenBucket():
+    """
+    Thread-safe token bucket. acquire() reserves a token and sleeps until
+    it's available; pause() blocks the bucket, e.g. for a Retry-After.
+    """
+
+    def __init__(self, per_minute, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = per_minute / 60.0
+        # a minute worth of calls can go out at once, then they're spaced out
+        self.capacity = capacity or per_minute
+        self.clock = clock
+        self.sleep = sleep
+
+        self.tokens = float(self.capacity)
+        self.updated_at = clock()
+        self.lock = threading.Lock()
+
+    def refill(self, now):
+        if now > self.updated_at:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def acquire(self):
+        """Take a token, waiting if needed. Returns the seconds waited."""
+        with self.lock:
+            now = self.clock()
+            self.refill(now)
+            self.tokens -= 1
+            wait = max(0.0, self.updated_at - now) + max(0.0, -self.tokens) / self.rate
+
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Don't hand out tokens for the next `seconds`"""
+        with self.lock:
+            now = self.clock()
+            self.refill(now)
+            self.tokens = min(self.tokens, 1.0)
+            self.updated_at = max(self.updated_at, now + seconds)
+
+
+class SlackClient():
+    """
+    Slack Web API client for one token.
+
+    Keeps a requests.Session with a keep-alive connection pool, so warm
+    Lambda invocations reuse the TLS connection to slack.com instead of
+    doing a new handshake for every call. Latency is tracked per API
+    method (chat.postMessage, conversations.replies, ...).
+
+    Calls are scheduled through a token bucket per rate limit tier, and
+    HTTP 429 responses are retried after their Retry-After.
+    """
+
+    def __init__(self, token, base_url=SLACK_API_URL,
+                 timeout=(SLACK_CONNECT_TIMEOUT, SLACK_READ_TIMEOUT),
+                 pool_size=SLACK_POOL_SIZE, max_retries=SLACK_MAX_RETRIES,
+                 rate_limits=RATE_LIMIT_TIERS, clock=time.monotonic, sleep=time.sleep):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.rate_limits = rate_limits
+        self.clock = clock
+        self.sleep = sleep
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {token}',
+        })
+
+        self.latency = {}
+        # delete_with_threads calls Slack from a thread pool
+        self.latency_lock = threading.Lock()
+
+    def get_bucket(self, api_method):
+        tier = METHOD_TIERS.get(api_method, DEFAULT_TIER)
+
+        with self.buckets_lock:
+            bucket = self.buckets.get(tier)
+            if bucket is None:
+                bucket = TokenBucket(self.rate_limits[tier], clock=self.clock, sleep=self.sleep)
+                self.buckets[tier] = bucket
+
+        return bucket
+
+    def execute(self, http_method, api_method, **kwargs):
+        """
+        Send the request within the rate limit of the method, retrying
+        429s. Returns the last response and the outcome of the call.
+        """
+        url = f'{self.base_url}/{api_method}'
+        bucket = self.get_bucket(api_method)
+
+        outcome = {
+            'method': api_method,
+            'attempts': 0,
+            'rate_limited': 0,
+            'waited_seconds': 0.0,
+        }
+
+        while True:
+            waited = bucket.acquire()
+            if waited > 0:
+                outcome['waited_seconds'] += waited
+                metrics.add_time('slack.throttle', waited)
+            outcome['attempts'] += 1
+
+            t0 = time.perf_counter()
+            try:
+                response = self.session.request(http_method, url, timeout=self.timeout, **kwargs)
+            finally:
+                seconds = time.perf_counter() - t0
+                self.record_latency(api_method, seconds)
+                metrics.add_time('slack.' + api_method, seconds)
+
+            if response.status_code != 429 or outcome['rate_limited'] >= self.max_retries:
+                return response, outcome
+
+            outcome['rate_limited'] += 1
+            metrics.count('slack.rate_limited')
+            retry_after = float(response.headers.get('Retry-After', 1))
+            bucket.pause(retry_after)
+
+    def call(self, http_method, api_method, **kwargs):
+        response, _ = self.execute(http_method, api_method, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def try_call(self, http_method, api_method, **kwargs):
+        """
+        Like call, but never raises. Returns the outcome with 'ok',
+        'error', 'status' and the JSON 'response' (if any).
+        """
+        outcome = {'method': api_method, 'ok': False, 'error': None, 'status': None, 'response': None}
+
+        try:
+            response, details = self.execute(http_method, api_method, **kwargs)
+            outcome.update(details)
+            outcome['status'] = response.status_code
+            response.raise_for_status()
+
+            body = response.json()
+            outcome['response'] = body
+            outcome['ok'] = bool(body.get('ok'))
+            outcome['error'] = body.get('error')
+        except Exception as e:
+            outcome['error'] = str(e)
+
+        return outcome
+
+    def post(self, api_method, payload):
+        return self.call('POST', api_method, json=payload)
+
+    def get(self, api_method, params):
+        return self.call('GET', api_method, params=params)
+
+    def try_post(self, api_method, payload):
+        return self.try_call('POST', api_method, json=payload)
+
+    def record_latency(self, api_method, seconds):
+        with self.latency_lock:
+            stats = self.latency.get(api_method)
+            if stats is None:
+                stats = {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+                self.latency[api_method] = stats
+
+            stats['calls'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+
+    def get_latency_stats(self):
+        result = {}
+        with self.latency_lock:
+            for api_method, stats in self.latency.items():
+                result[api_method] = dict(stats)
+                result[api_method]['avg_seconds'] = stats['total_seconds'] / stats['calls']
+        return result
+
+
+# One client per token (bot token, user token), reused across warm invocations
+clients = {}
+
+
+def get_client(token):
+    client = clients.get(token)
+    if client is None:
+        client = SlackClient(token)
+        clients[token] = client
+    return client
+
+
+def get_latency_stats():
+    """Per-method latency over all clients"""
+    merged = {}
+
+    for client in list(clients.values()):
+        for api_method, stats in client.get_latency_stats().items():
+            total = merged.setdefault(api_method, {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            total['calls'] += stats['calls']
+            total['total_seconds'] += stats['total_seconds']
+            total['max_seconds'] = max(total['max_seconds'], stats['max_seconds'])
+
+    for stats in merged.values():
+        stats['avg_seconds'] = stats['total_seconds'] / stats['calls']
+
+    return merged
+
+
+def log_latency_stats():
+    """Log the per-method latency since the container started, once a call was made"""
+    if clients and logger.is_enabled(logs.INFO):
+        logger.info('slack latency', stats=get_latency_stats())
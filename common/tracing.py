@@ -0,0 +1,90 @@
+import time
+
+from logs import logger
+from metrics import metrics
+
+
+# Key of the trace context the router adds to forwarded bodies
+TRACE_KEY = 'trace'
+
+
+def milliseconds(start, end):
+    if start is None or end is None:
+        return None
+    return round(1000 * (end - start), 1)
+
+
+def get_event_time(body):
+    """When Slack created the event, in seconds (only whole seconds are sent)"""
+    event_time = body.get('event_time')
+    if event_time is None:
+        return None
+    return float(event_time)
+
+
+def start_router(body, received_at, retry_num=None):
+    """
+    Trace context of an event received by the router; its fields go to
+    every log record and the metrics of the invocation
+    """
+    context = {
+        'event_id': body.get('event_id'),
+        'event_time': get_event_time(body),
+        'received_at': received_at,
+        'retry': retry_num,
+    }
+
+    slack_ms = milliseconds(context['event_time'], received_at)
+    apply({'event_id': context['event_id'], 'slack_to_router_ms': slack_ms})
+    return context
+
+
+def stamp(body, context, forwarded_at=None):
+    """Copy of the body with the trace context, as it's forwarded to a worker"""
+    if forwarded_at is None:
+        forwarded_at = time.time()
+
+    trace = dict(context, forwarded_at=forwarded_at)
+    return dict(body, **{TRACE_KEY: trace})
+
+
+def start_worker(body, started_at=None):
+    """
+    Delays of the hops of a forwarded event, from the trace context the
+    router added:
+
+        slack_to_router_ms: Slack event_time -> router received it
+        router_ms:          router received it -> router invoked the worker
+        router_to_worker_ms: router invoked the worker -> worker started
+        end_to_end_ms:      Slack event_time -> worker started
+    """
+    if started_at is None:
+        started_at = time.time()
+
+    trace = body.get(TRACE_KEY) or {}
+    event_time = trace.get('event_time')
+    received_at = trace.get('received_at')
+    forwarded_at = trace.get('forwarded_at')
+
+    fields = {
+        'event_id': trace.get('event_id', body.get('event_id')),
+        'slack_to_router_ms': milliseconds(event_time, received_at),
+        'router_ms': milliseconds(received_at, forwarded_at),
+        'router_to_worker_ms': milliseconds(forwarded_at, started_at),
+        'end_to_end_ms': milliseconds(event_time, started_at),
+    }
+    apply(fields)
+    return fields
+
+
+def apply(fields):
+    """Add the trace fields to the log records and metrics of this invocation"""
+    logger.set_context(**{name: value for name, value in fields.items() if value is not None})
+
+    for name, value in fields.items():
+        if value is None:
+            continue
+        if name.endswith('_ms'):
+            metrics.set_value('trace.' + name[:-len('_ms')], value, 'Milliseconds')
+        else:
+            metrics.set_property(name, value)
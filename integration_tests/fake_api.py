@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Slack Web API and the Groq chat completions API,
+for integration tests and benchmarks that shouldn't touch slack.com or
+api.groq.com. Standard library only.
+
+Slack methods: conversations.replies (paginated), chat.postMessage,
+chat.update, chat.delete, admin.users.session.invalidate. Messages are
+kept in memory, so what one call posts or deletes the next one sees.
+Groq: POST /openai/v1/chat/completions, with and without stream.
+
+Every response can be delayed (latency, per method in latencies) and
+answered with a 429 (inject_429 for the next calls of a method, or
+rate_limit_probability for any call).
+
+In Python:
+
+    server = start_fake_api(latency=0.05)
+    parent_ts = server.state.add_thread('C1', replies=40)
+    slack_client.SlackClient(token, base_url=server.slack_url)
+    ...
+    server.shutdown()
+
+Or as a process, pointing the functions at it with SLACK_API_URL and
+GROQ_API_URL:
+
+    python integration_tests/fake_api.py --port 8055 --latency-ms 50 --thread-replies 40
+"""
+
+import sys
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+BOT_USER_ID = 'U_BOT'
+GROQ_PATH = '/openai/v1/chat/completions'
+# conversations.replies default and maximum page size
+DEFAULT_PAGE_SIZE = 1000
+
+
+def encode_cursor(offset):
+    return base64.b64encode(f'offset:{offset}'.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    return int(base64.b64decode(cursor).decode('utf-8').split(':')[1])
+
+
+def blocks_text(blocks):
+    return '\n'.join(b.get('text', {}).get('text', '') for b in blocks or [])
+
+
+def default_answer(model, messages):
+    prompt = messages[-1]['content'] if messages else ''
+    return f'**Answer** from `{model}` to: {prompt[:50]}'
+
+
+class FakeApiState():
+    """Messages per channel and everything the fake API was asked to do"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = {}
+        self.deleted = []
+        self.invalidated_sessions = []
+        self.calls = Counter()
+        self.counter = 0
+        # answer(model, messages) of the fake Groq
+        self.answer = default_answer
+
+    def next_ts(self):
+        self.counter += 1
+        return '%d.%06d' % (1700000000 + self.counter // 1000000, self.counter % 1000000)
+
+    def add_message(self, channel, text, user='U1', thread_ts=None, ts=None, blocks=None):
+        with self.lock:
+            if ts is None:
+                ts = self.next_ts()
+
+            message = {'type': 'message', 'ts': ts, 'user': user, 'text': text}
+            if blocks:
+                message['blocks'] = blocks
+            if thread_ts and thread_ts != ts:
+                message['thread_ts'] = thread_ts
+                parent = self.messages.get(channel, {}).get(thread_ts)
+                if parent is not None:
+                    parent['thread_ts'] = thread_ts
+                    parent['reply_count'] = parent.get('reply_count', 0) + 1
+
+            self.messages.setdefault(channel, {})[ts] = message
+            return ts
+
+    def add_thread(self, channel, replies, user='U_PARENT', text='parent'):
+        """A message with `replies` replies by different users, returns its ts"""
+        parent_ts = self.add_message(channel, text, user=user)
+        for i in range(replies):
+            self.add_message(channel, f'reply {i}', user=f'U{i}', thread_ts=parent_ts)
+        return parent_ts
+
+    def get_message(self, channel, ts):
+        return self.messages.get(channel, {}).get(ts)
+
+    def get_thread(self, channel, ts):
+        """The parent and its replies by ts, or None if there's no such message"""
+        with self.lock:
+            messages = self.messages.get(channel, {})
+            parent = messages.get(ts)
+            if parent is None:
+                return None
+
+            replies = [m for m in messages.values() if m.get('thread_ts') == ts and m['ts'] != ts]
+            replies.sort(key=lambda m: float(m['ts']))
+            return [dict(parent)] + [dict(m) for m in replies]
+
+    def update_message(self, channel, ts, text, blocks=None):
+        with self.lock:
+            message = self.get_message(channel, ts)
+            if message is None:
+                return None
+            message['text'] = text
+            if blocks:
+                message['blocks'] = blocks
+            message['edited'] = {'user': BOT_USER_ID, 'ts': self.next_ts()}
+            return dict(message)
+
+    def delete_message(self, channel, ts):
+        with self.lock:
+            message = self.messages.get(channel, {}).pop(ts, None)
+            if message is not None:
+                self.deleted.append((channel, ts))
+            return message
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+
+    server_version = 'FakeApi/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, body, status=200, headers=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length).decode('utf-8') if length else ''
+        if not raw:
+            return {}
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(raw)
+        return {key: values[0] for key, values in parse_qs(raw).items()}
+
+    def handle_request(self, http_method):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if http_method == 'POST':
+            params.update(self.read_body())
+
+        if url.path == GROQ_PATH:
+            method = 'chat.completions'
+        elif url.path.startswith('/api/'):
+            method = url.path[len('/api/'):]
+        else:
+            self.send_json({'error': 'not found'}, status=404)
+            return
+
+        server = self.server
+        with server.state.lock:
+            server.state.calls[method] += 1
+        server.wait(method)
+
+        retry_after = server.take_429(method)
+        if retry_after is not None:
+            with server.state.lock:
+                server.state.calls['429'] += 1
+            self.send_json({'ok': False, 'error': 'ratelimited'}, status=429,
+                           headers={'Retry-After': str(retry_after)})
+            return
+
+        if method == 'chat.completions':
+            self.groq_completion(params)
+            return
+
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self.send_json({'ok': False, 'error': 'not_authed'})
+            return
+
+        handler = SLACK_METHODS.get(method)
+        if handler is None:
+            self.send_json({'ok': False, 'error': 'unknown_method'})
+            return
+
+        self.send_json(handler(server.state, params))
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def groq_completion(self, request):
+        model = request.get('model', '')
+        answer = self.server.state.answer(model, request.get('messages', []))
+
+        if not request.get('stream'):
+            self.send_json({
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion',
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': answer},
+                    'finish_reason': 'stop',
+                }],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        words = answer.split(' ')
+        for i, word in enumerate(words):
+            content = word if i == len(words) - 1 else word + ' '
+            chunk = {'choices': [{'index': 0, 'delta': {'content': content}}]}
+            self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.server.stream_chunk_delay)
+        self.wfile.write(b'data: [DONE]\n\n')
+
+
+def conversations_replies(state, params):
+    thread = state.get_thread(params.get('channel'), params.get('ts'))
+    if thread is None:
+        return {'ok': False, 'error': 'thread_not_found'}
+
+    limit = min(int(params.get('limit', DEFAULT_PAGE_SIZE)), DEFAULT_PAGE_SIZE)
+    try:
+        offset = decode_cursor(params['cursor']) if params.get('cursor') else 0
+    except (ValueError, IndexError):
+        return {'ok': False, 'error': 'invalid_cursor'}
+    page = thread[offset:offset + limit]
+    has_more = offset + limit < len(thread)
+
+    return {
+        'ok': True,
+        'messages': page,
+        'has_more': has_more,
+        'response_metadata': {'next_cursor': encode_cursor(offset + limit) if has_more else ''},
+    }
+
+
+def chat_post_message(state, params):
+    channel = params.get('channel')
+    if not channel:
+        return {'ok': False, 'error': 'channel_not_found'}
+    # posting to a user id opens a DM
+    if channel.startswith('U'):
+        channel = 'D' + channel[1:]
+
+    text = params.get('text') or blocks_text(params.get('blocks'))
+    ts = state.add_message(channel, text, user=BOT_USER_ID,
+                           thread_ts=params.get('thread_ts'), blocks=params.get('blocks'))
+    return {'ok': True, 'channel': channel, 'ts': ts, 'message': state.get_message(channel, ts)}
+
+
+def chat_update(state, params):
+    text = params.get('text') or blocks_text(params.get('blocks'))
+    message = state.update_message(params.get('channel'), params.get('ts'), text, params.get('blocks'))
+    if message is None:
+        return {'ok': False, 'error': 'message_not_found'}
+    return {'ok': True, 'channel': params['channel'], 'ts': params['ts'], 'text': text, 'message': message}
+
+
+def chat_delete(state, params):
+    if state.delete_message(params.get('channel'), params.get('ts')) is None:
+        return {'ok': False, 'error': 'message_not_found'}
+    return {'ok': True, 'channel': params['channel'], 'ts': params['ts']}
+
+
+def admin_users_session_invalidate(state, params):
+    if not params.get('user_id'):
+        return {'ok': False, 'error': 'invalid_arguments'}
+    with state.lock:
+        state.invalidated_sessions.append(params['user_id'])
+    return {'ok': True}
+
+
+SLACK_METHODS = {
+    'conversations.replies': conversations_replies,
+    'chat.postMessage': chat_post_message,
+    'chat.update': chat_update,
+    'chat.delete': chat_delete,
+    'admin.users.session.invalidate': admin_users_session_invalidate,
+}
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, latencies=None, rate_limit_probability=0.0,
+                 retry_after=1, stream_chunk_delay=0.0, seed=None):
+        super().__init__(address, FakeApiHandler)
+        self.state = FakeApiState()
+        # seconds before answering; latencies overrides it per method
+        self.latency = latency
+        self.latencies = latencies or {}
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after = retry_after
+        self.stream_chunk_delay = stream_chunk_delay
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.pending_429 = Counter()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def slack_url(self):
+        return self.base_url + '/api'
+
+    @property
+    def groq_url(self):
+        return self.base_url + '/openai/v1'
+
+    def wait(self, method):
+        latency = self.latencies.get(method, self.latency)
+        if latency > 0:
+            time.sleep(latency)
+
+    def inject_429(self, method, times=1):
+        """Answer the next `times` calls of the method with a 429"""
+        with self.lock:
+            self.pending_429[method] += times
+
+    def take_429(self, method):
+        """Retry-After for this call if it's rate limited, else None"""
+        with self.lock:
+            if self.pending_429[method] > 0:
+                self.pending_429[method] -= 1
+                return self.retry_after
+            if self.rate_limit_probability and self.random.random() < self.rate_limit_probability:
+                return self.retry_after
+        return None
+
+
+def start_fake_api(host='127.0.0.1', port=0, **settings):
+    """Serve in a background thread; port 0 picks a free port"""
+    server = FakeApiServer((host, port), **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Slack and Groq APIs')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8055)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--rate-limit-probability', type=float, default=0)
+    parser.add_argument('--retry-after', type=float, default=1)
+    parser.add_argument('--channel', default='C01FABYF2RG')
+    parser.add_argument('--thread-replies', type=int, default=0,
+                        help='add a thread with this many replies to --channel')
+    args = parser.parse_args()
+
+    server = FakeApiServer(
+        (args.host, args.port),
+        latency=args.latency_ms / 1000,
+        rate_limit_probability=args.rate_limit_probability,
+        retry_after=args.retry_after,
+    )
+
+    if args.thread_replies:
+        ts = server.state.add_thread(args.channel, args.thread_replies)
+        print(f'Thread {args.channel} {ts} with {args.thread_replies} replies')
+
+    print(f'export SLACK_API_URL={server.slack_url}')
+    print(f'export GROQ_API_URL={server.groq_url}')
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,7 @@ os.environ['CONFIG_FILE'] = '../automator/config.yaml'
 
 import sys
 sys.path.append('../automator')
+sys.path.append('../common')
 
 
 import json
@@ -24,10 +24,16 @@ os.environ['USER_SLACK_TOKEN'] = 'test-user-token'
 
 # Add moderator to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'moderator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
 
 import message_tracker
 
 
+def setup_module(module):
+    # The table is no longer created on the hot path
+    message_tracker.ensure_table_exists()
+
+
 def test_basic_tracking():
     """Test basic message tracking"""
     print("Testing basic message tracking...")
@@ -142,6 +148,7 @@ def main():
     print("=" * 60)
     
     try:
+        setup_module(None)
         test_basic_tracking()
         test_threshold_detection()
         test_time_window()
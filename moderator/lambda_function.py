@@ -1,10 +1,21 @@
-import json
 import os
+import json
+import time
+import tracing
+import routing
 import message_tracker
+import rate_counter
 import slack_moderator
+import slack_client
+from botocore.exceptions import BotoCoreError, ClientError
+from logs import logger
+from metrics import metrics
 
 
 ADMIN_USER_ID = os.getenv('ADMIN_USER_ID', 'U01AXE0P5M3')
+# The admins of automator/config.yaml, compiled by package.sh into the same
+# routing_rules.json as the router's, plus the admin receiving the alerts
+ADMINS = routing.RoutingRules.from_file().admins | {ADMIN_USER_ID}
 
 
 def handle_message_event(event):
@@ -12,28 +23,93 @@ def handle_message_event(event):
     Handle incoming message events from Slack.
     Track messages and alert admin if threshold exceeded.
     """
-    event_type = event.get('type')
-    
-    # Ignore bot messages and message changes
-    if event.get('subtype') in ['bot_message', 'message_changed', 'message_deleted']:
+    # Ignore bot messages, message changes and admin messages. The router
+    # drops them too, with the same rules and admins.
+    if routing.message_drop_rule(event, ADMINS) is not None:
         return
-    
-    # Ignore admin messages
+
     user_id = event.get('user')
-    if not user_id or user_id == ADMIN_USER_ID:
-        return
-    
     channel_id = event.get('channel')
     message_ts = event.get('ts')
     message_text = event.get('text', '')
     
     # Track the message
-    result = message_tracker.track_message(user_id, channel_id, message_ts, message_text)
+    if rate_counter.RATE_COUNTER_ENABLED:
+        # Answered locally unless the user is close to the threshold
+        result = rate_counter.counter.track_message(user_id, channel_id, message_ts, message_text)
+        # other users whose buffered messages went over the threshold when written
+        for other_user_id, other_result in rate_counter.counter.pop_exceeded():
+            logger.info('User %s exceeded message threshold', other_user_id,
+                        message_count=other_result['message_count'])
+            send_or_update_alert(other_user_id, other_result['messages'])
+    else:
+        result = message_tracker.track_message(user_id, channel_id, message_ts, message_text)
     
     # If threshold exceeded, send alert to admin
     if result['exceeded']:
-        print(f"User {user_id} exceeded message threshold: {result['message_count']} messages")
-        slack_moderator.send_moderation_alert(user_id, result['messages'])
+        logger.info('User %s exceeded message threshold', user_id, message_count=result['message_count'])
+        send_or_update_alert(user_id, result['messages'])
+
+
+def send_or_update_alert(user_id, messages):
+    """
+    Post one alert per user per cooldown. Further violations within the
+    cooldown refresh the existing alert with chat.update.
+
+    The slot is claimed with a conditional write before posting, so
+    concurrent violations post a single alert. When the alerts table
+    can't be used or the alert can't be updated, a new alert is posted.
+    If posting fails, the slot is released for the next violation.
+    """
+    try:
+        if not message_tracker.claim_alert_slot(user_id):
+            alert = message_tracker.get_alert_state(user_id)
+            if not alert or 'message_ts' not in alert:
+                logger.info('Alert for user %s is being posted by another invocation', user_id)
+                return
+            if update_alert(alert, user_id, messages):
+                return
+    except (BotoCoreError, ClientError) as e:
+        logger.warning('Alert state of user %s unavailable, posting a new alert: %s', user_id, e)
+
+    try:
+        response = slack_moderator.send_moderation_alert(user_id, messages)
+    except Exception:
+        # raised again, so the retry of the invocation posts it
+        release_alert_slot(user_id)
+        raise
+
+    if not response.get('ok'):
+        logger.error('Alert for user %s not posted: %s', user_id, response.get('error'))
+        release_alert_slot(user_id)
+        return
+
+    try:
+        message_tracker.save_alert_state(user_id, response['channel'], response['ts'])
+    except (BotoCoreError, ClientError) as e:
+        logger.warning('Alert state of user %s not saved: %s', user_id, e)
+
+
+def update_alert(alert, user_id, messages):
+    """Refresh the posted alert; False if it's gone, e.g. deleted in Slack"""
+    try:
+        response = slack_moderator.update_moderation_alert(alert['channel'], alert['message_ts'], user_id, messages)
+    except Exception as e:
+        logger.warning('Alert of user %s not updated: %s', user_id, e)
+        return False
+
+    if not response.get('ok'):
+        logger.warning('Alert of user %s not updated: %s', user_id, response.get('error'))
+        return False
+    return True
+
+
+def release_alert_slot(user_id):
+    """Let the next violation try to post the alert again"""
+    try:
+        message_tracker.clear_alert_state(user_id)
+    except (BotoCoreError, ClientError) as e:
+        logger.warning('Alert slot of user %s not released: %s', user_id, e)
 
 
 def handle_interactive_action(payload):
@@ -58,6 +134,7 @@ def handle_interactive_action(payload):
             
             # Clear tracked messages
             message_tracker.clear_user_messages(user_id)
+            message_tracker.clear_alert_state(user_id)
             
             # Update the alert message
             success_count = len(result['success'])
@@ -86,6 +163,7 @@ def handle_interactive_action(payload):
             if result.get('ok'):
                 # Also clear their tracked messages
                 message_tracker.clear_user_messages(user_id)
+                message_tracker.clear_alert_state(user_id)
                 
                 slack_moderator.update_alert_message(
                     response_channel,
@@ -100,7 +178,7 @@ def handle_interactive_action(payload):
                     f"❌ Failed to deactivate user <@{user_id}>: {error}"
                 )
         except Exception as e:
-            print(f"Error deactivating user: {e}")
+            logger.exception('Error deactivating user: %s', e)
             slack_moderator.update_alert_message(
                 response_channel,
                 response_message_ts,
@@ -110,6 +188,7 @@ def handle_interactive_action(payload):
     elif action_id == 'ignore_alert':
         # Just clear the tracked messages for this user
         message_tracker.clear_user_messages(user_id)
+        message_tracker.clear_alert_state(user_id)
         
         slack_moderator.update_alert_message(
             response_channel,
@@ -118,12 +197,12 @@ def handle_interactive_action(payload):
         )
 
 
-def lambda_handler(event, context):
+def run(event):
     """
-    Main Lambda handler for message moderation.
     Handles both message events and interactive actions.
     """
-    print(json.dumps(event))
+    tracing.start_worker(event)
+    logger.payload(event)
     
     # Handle URL verification challenge
     if 'challenge' in event:
@@ -134,6 +213,7 @@ def lambda_handler(event, context):
     
     # Check if this is an interactive action (button click)
     if 'payload' in event:
+        metrics.set_handler('interactive')
         # Parse the payload (it comes as a string in the event)
         payload = json.loads(event['payload'])
         handle_interactive_action(payload)
@@ -148,9 +228,23 @@ def lambda_handler(event, context):
     event_type = event_wrapper.get('type')
     
     if event_type == 'message':
+        metrics.set_handler('message')
         handle_message_event(event_wrapper)
     
     return {
         'statusCode': 200,
         'body': json.dumps({'ok': True})
     }
+
+
+def lambda_handler(event, context):
+    """
+    Main Lambda handler for message moderation, writes the metrics of
+    the invocation at the end.
+    """
+    started_at = time.perf_counter()
+    try:
+        return run(event)
+    finally:
+        slack_client.log_latency_stats()
+        metrics.flush(time.perf_counter() - started_at)
@@ -1,15 +1,50 @@
 import os
 import time
+import random
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import boto3
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
 from botocore.exceptions import ClientError
 
+from metrics import instrument_boto3
+
 
 DYNAMODB_ENDPOINT = os.getenv('DYNAMODB_ENDPOINT', None)
 TABLE_NAME = os.getenv('MESSAGE_TRACKER_TABLE', 'slack-message-tracker')
 MESSAGE_THRESHOLD = int(os.getenv('MESSAGE_THRESHOLD', '5'))
 TIME_WINDOW_SECONDS = int(os.getenv('TIME_WINDOW_SECONDS', '180'))  # 3 minutes
 
+# 'list': one item per user with a list of messages (default)
+# 'per_message': one item per message in EVENTS_TABLE_NAME, expired by DynamoDB TTL
+STORAGE_LAYOUT = os.getenv('MESSAGE_TRACKER_LAYOUT', 'list')
+EVENTS_TABLE_NAME = os.getenv('MESSAGE_EVENTS_TABLE', 'slack-message-tracker-events')
+# Messages stay around longer than the window so the admin can still delete them
+MESSAGE_TTL_SECONDS = int(os.getenv('MESSAGE_TTL_SECONDS', '86400'))  # 1 day
+
+# Alerts posted to the admin, so repeated alerts update the existing message
+ALERTS_TABLE_NAME = os.getenv('MODERATION_ALERTS_TABLE', 'slack-message-tracker-alerts')
+ALERT_COOLDOWN_SECONDS = int(os.getenv('ALERT_COOLDOWN_SECONDS', '600'))  # 10 minutes
+# A claimed alert that isn't posted within this time can be claimed again
+ALERT_CLAIM_SECONDS = int(os.getenv('ALERT_CLAIM_SECONDS', '30'))
+
+# 'get_put': get_item + put_item (default)
+# 'update': single conditional update_item with optimistic concurrency
+TRACKING_MODE = os.getenv('MESSAGE_TRACKER_MODE', 'get_put')
+MAX_UPDATE_RETRIES = int(os.getenv('MESSAGE_TRACKER_MAX_RETRIES', '5'))
+
+# Last seen (version, messages) per user, so the first update_item
+# usually succeeds without reading the item
+KNOWN_ITEMS_SIZE = 1000
+known_items = OrderedDict()
+
+deserializer = TypeDeserializer()
+
+
+class TrackingConflictError(Exception):
+    pass
+
 
 def get_dynamodb_resource():
     """Get DynamoDB resource, supporting LocalStack for testing"""
@@ -24,47 +59,168 @@ def get_dynamodb_resource():
     return boto3.resource('dynamodb')
 
 
-def ensure_table_exists():
-    """Create the DynamoDB table if it doesn't exist"""
-    dynamodb = get_dynamodb_resource()
-    
-    try:
-        table = dynamodb.Table(TABLE_NAME)
-        table.load()
-        return table
-    except ClientError as e:
-        if e.response['Error']['Code'] == 'ResourceNotFoundException':
-            # Create table
+# Table management operations, counted in TableManager.control_plane_calls
+CONTROL_PLANE_OPERATIONS = frozenset([
+    'CreateTable', 'DeleteTable', 'DescribeTable', 'UpdateTable',
+    'DescribeTimeToLive', 'UpdateTimeToLive',
+])
+
+
+class TableManager():
+    """
+    Holds the DynamoDB resource and table handle for a warm container.
+
+    The handle is created once and reused, so the hot path (get_item,
+    put_item, ...) never touches the control plane. Creating the table
+    is an explicit step, see bootstrap(). control_plane_calls counts
+    every control plane request the resource's client makes.
+    """
+
+    def __init__(self, table_name, key_schema, attribute_definitions, ttl_attribute=None):
+        self.table_name = table_name
+        self.key_schema = key_schema
+        self.attribute_definitions = attribute_definitions
+        self.ttl_attribute = ttl_attribute
+        self.resource = None
+        self.table = None
+        self.control_plane_calls = 0
+
+    def get_resource(self):
+        if self.resource is None:
+            self.resource = get_dynamodb_resource()
+            instrument_boto3(self.resource.meta.client)
+            self.resource.meta.client.meta.events.register(
+                'provide-client-params.dynamodb', self.count_control_plane_call
+            )
+        return self.resource
+
+    def count_control_plane_call(self, event_name, **kwargs):
+        if event_name.rsplit('.', 1)[-1] in CONTROL_PLANE_OPERATIONS:
+            self.control_plane_calls += 1
+
+    def get_table(self):
+        """Return the cached table handle without any network calls"""
+        if self.table is None:
+            self.table = self.get_resource().Table(self.table_name)
+        return self.table
+
+    def bootstrap(self):
+        """Create the table if it doesn't exist (DescribeTable + CreateTable)"""
+        dynamodb = self.get_resource()
+
+        try:
+            table = dynamodb.Table(self.table_name)
+            table.load()
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise
+
             table = dynamodb.create_table(
-                TableName=TABLE_NAME,
-                KeySchema=[
-                    {'AttributeName': 'user_id', 'KeyType': 'HASH'},
-                ],
-                AttributeDefinitions=[
-                    {'AttributeName': 'user_id', 'AttributeType': 'S'},
-                ],
+                TableName=self.table_name,
+                KeySchema=self.key_schema,
+                AttributeDefinitions=self.attribute_definitions,
                 BillingMode='PAY_PER_REQUEST'
             )
             table.wait_until_exists()
-            return table
-        raise
 
+            if self.ttl_attribute:
+                dynamodb.meta.client.update_time_to_live(
+                    TableName=self.table_name,
+                    TimeToLiveSpecification={
+                        'Enabled': True,
+                        'AttributeName': self.ttl_attribute
+                    }
+                )
+
+        self.table = table
+        return table
+
+    def reset(self):
+        """Drop the cached handles, e.g. after changing the endpoint in tests"""
+        self.resource = None
+        self.table = None
+        self.control_plane_calls = 0
+
+
+table_manager = TableManager(
+    TABLE_NAME,
+    key_schema=[
+        {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+    ],
+    attribute_definitions=[
+        {'AttributeName': 'user_id', 'AttributeType': 'S'},
+    ]
+)
+
+
+events_table_manager = TableManager(
+    EVENTS_TABLE_NAME,
+    key_schema=[
+        {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+        {'AttributeName': 'message_ts', 'KeyType': 'RANGE'},
+    ],
+    attribute_definitions=[
+        {'AttributeName': 'user_id', 'AttributeType': 'S'},
+        {'AttributeName': 'message_ts', 'AttributeType': 'S'},
+    ],
+    ttl_attribute='ttl'
+)
+
+
+alerts_table_manager = TableManager(
+    ALERTS_TABLE_NAME,
+    key_schema=[
+        {'AttributeName': 'user_id', 'KeyType': 'HASH'},
+    ],
+    attribute_definitions=[
+        {'AttributeName': 'user_id', 'AttributeType': 'S'},
+    ],
+    ttl_attribute='ttl'
+)
+
+
+def get_table():
+    """Get the cached table handle. Doesn't call DescribeTable."""
+    return table_manager.get_table()
+
+
+def get_events_table():
+    """Get the cached handle of the per-message table"""
+    return events_table_manager.get_table()
+
+
+def get_alerts_table():
+    """Get the cached handle of the alert state table"""
+    return alerts_table_manager.get_table()
+
+
+def ensure_table_exists():
+    """Create the DynamoDB tables for the configured layout if they don't exist"""
+    alerts_table_manager.bootstrap()
+    if STORAGE_LAYOUT == 'per_message':
+        return events_table_manager.bootstrap()
+    return table_manager.bootstrap()
+
+
+def get_control_plane_calls():
+    """Number of DescribeTable/CreateTable calls made by this container"""
+    managers = [table_manager, events_table_manager, alerts_table_manager]
+    return sum(m.control_plane_calls for m in managers)
+
+
+def new_message(current_time, channel_id, message_ts, message_text):
+    return {
+        'timestamp': current_time,
+        'channel_id': channel_id,
+        'message_ts': message_ts,
+        'message_text': message_text[:500]  # Limit text length
+    }
+
+
+def track_message_get_put(user_id, new_messages, current_time, cutoff_time):
+    """Read the whole list with get_item and write it back with put_item"""
+    table = get_table()
 
-def track_message(user_id, channel_id, message_ts, message_text):
-    """
-    Track a new message from a user and check if they've exceeded the threshold.
-    
-    Returns:
-        dict: {
-            'exceeded': bool,
-            'message_count': int,
-            'messages': list of message details if exceeded
-        }
-    """
-    table = ensure_table_exists()
-    current_time = int(time.time())
-    cutoff_time = current_time - TIME_WINDOW_SECONDS
-    
     # Get user's message history
     try:
         response = table.get_item(Key={'user_id': user_id})
@@ -72,18 +228,10 @@ def track_message(user_id, channel_id, message_ts, message_text):
         messages = item.get('messages', [])
     except ClientError:
         messages = []
-    
-    # Filter out old messages
-    messages = [msg for msg in messages if msg['timestamp'] > cutoff_time]
-    
-    # Add new message
-    messages.append({
-        'timestamp': current_time,
-        'channel_id': channel_id,
-        'message_ts': message_ts,
-        'message_text': message_text[:500]  # Limit text length
-    })
-    
+
+    # Add new messages and filter out old ones
+    messages = [msg for msg in messages + new_messages if msg['timestamp'] > cutoff_time]
+
     # Update DynamoDB
     table.put_item(
         Item={
@@ -92,12 +240,184 @@ def track_message(user_id, channel_id, message_ts, message_text):
             'last_updated': current_time
         }
     )
-    
+
+    return messages
+
+
+def remember_item(user_id, version, messages):
+    known_items[user_id] = (version, messages)
+    known_items.move_to_end(user_id)
+
+    while len(known_items) > KNOWN_ITEMS_SIZE:
+        known_items.popitem(last=False)
+
+
+def track_message_update(user_id, new_messages, current_time, cutoff_time):
+    """
+    Append the messages and trim expired ones with a single conditional
+    UpdateItem. The item carries a version number; if another invocation
+    wrote in between, the condition fails, the current item comes back
+    with the error (ALL_OLD) and we retry on top of it. Items written by
+    get_put have no version yet (version 0 here) and get their first one.
+    """
+    table = get_table()
+    version, messages = known_items.get(user_id, (None, []))
+
+    for attempt in range(MAX_UPDATE_RETRIES):
+        values = {
+            ':messages': [msg for msg in messages + new_messages if msg['timestamp'] > cutoff_time],
+            ':next_version': (version or 0) + 1,
+            ':now': current_time,
+        }
+
+        if version is None:
+            condition = 'attribute_not_exists(user_id)'
+        elif version == 0:
+            condition = 'attribute_exists(user_id) AND attribute_not_exists(#version)'
+        else:
+            condition = '#version = :version'
+            values[':version'] = version
+
+        try:
+            response = table.update_item(
+                Key={'user_id': user_id},
+                UpdateExpression='SET messages = :messages, #version = :next_version, last_updated = :now',
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#version': 'version'},
+                ExpressionAttributeValues=values,
+                ReturnValues='ALL_NEW',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+            # Someone else updated the item, start over from their version
+            if 'Item' in e.response:
+                item = {k: deserializer.deserialize(v) for k, v in e.response['Item'].items()}
+            else:
+                item = table.get_item(Key={'user_id': user_id}, ConsistentRead=True).get('Item')
+
+            if item:
+                version = int(item.get('version', 0))
+                messages = item.get('messages', [])
+            else:
+                version, messages = None, []
+
+            time.sleep(random.uniform(0, min(0.1, 0.005 * 2 ** attempt)))
+            continue
+
+        attributes = response['Attributes']
+        messages = attributes['messages']
+        remember_item(user_id, int(attributes['version']), messages)
+        return messages
+
+    known_items.pop(user_id, None)
+    raise TrackingConflictError(
+        f"Couldn't update messages for {user_id} after {MAX_UPDATE_RETRIES} attempts"
+    )
+
+
+def query_user_messages(user_id, cutoff_time=None, count_only=False):
+    """
+    Query the per-message table. With cutoff_time only messages whose ts is
+    after it are returned; with count_only only their number.
+    """
+    table = get_events_table()
+
+    key_condition = Key('user_id').eq(user_id)
+    if cutoff_time is not None:
+        # Slack ts is "<seconds>.<micros>", so it compares as a string
+        key_condition = key_condition & Key('message_ts').gt(str(cutoff_time))
+
+    params = {
+        'KeyConditionExpression': key_condition,
+        'ConsistentRead': True,
+    }
+    if count_only:
+        params['Select'] = 'COUNT'
+
+    count = 0
+    messages = []
+
+    while True:
+        response = table.query(**params)
+        count += response['Count']
+        messages.extend(response.get('Items', []))
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    if count_only:
+        return count
+    return messages
+
+
+def track_message_per_item(user_id, new_messages, current_time, cutoff_time):
+    """Put one small item per message and count the window with a query"""
+    table = get_events_table()
+
+    items = []
+    for message in new_messages:
+        item = dict(message)
+        item['user_id'] = user_id
+        item['ttl'] = message['timestamp'] + MESSAGE_TTL_SECONDS
+        items.append(item)
+
+    if len(items) == 1:
+        table.put_item(Item=items[0])
+    else:
+        with table.batch_writer() as batch:
+            for item in items:
+                batch.put_item(Item=item)
+
+    return query_user_messages(user_id, cutoff_time, count_only=True)
+
+
+def track_message(user_id, channel_id, message_ts, message_text):
+    """
+    Track a new message from a user and check if they've exceeded the threshold.
+
+    Returns:
+        dict: {
+            'exceeded': bool,
+            'message_count': int,
+            'messages': list of message details if exceeded
+        }
+    """
+    message = new_message(int(time.time()), channel_id, message_ts, message_text)
+    return track_messages(user_id, [message])
+
+
+def track_messages(user_id, new_messages):
+    """
+    Track several messages (created with new_message) of a user with one
+    write, e.g. when flushing a local buffer. Returns the same as track_message.
+    """
+    current_time = int(time.time())
+    cutoff_time = current_time - TIME_WINDOW_SECONDS
+
+    if STORAGE_LAYOUT == 'per_message':
+        message_count = track_message_per_item(user_id, new_messages, current_time, cutoff_time)
+        exceeded = message_count >= MESSAGE_THRESHOLD
+
+        return {
+            'exceeded': exceeded,
+            'message_count': message_count,
+            'messages': query_user_messages(user_id, cutoff_time) if exceeded else []
+        }
+
+    if TRACKING_MODE == 'update':
+        messages = track_message_update(user_id, new_messages, current_time, cutoff_time)
+    else:
+        messages = track_message_get_put(user_id, new_messages, current_time, cutoff_time)
+
     # Check if threshold exceeded
     # Using >= so that exactly MESSAGE_THRESHOLD messages triggers the alert
     # e.g., if threshold is 5, then 5 or more messages will trigger
     exceeded = len(messages) >= MESSAGE_THRESHOLD
-    
+
     return {
         'exceeded': exceeded,
         'message_count': len(messages),
@@ -107,13 +427,37 @@ def track_message(user_id, channel_id, message_ts, message_text):
 
 def clear_user_messages(user_id):
     """Clear all tracked messages for a user"""
-    table = ensure_table_exists()
-    table.delete_item(Key={'user_id': user_id})
+    if STORAGE_LAYOUT == 'per_message':
+        messages = query_user_messages(user_id)
+        with get_events_table().batch_writer() as batch:
+            for msg in messages:
+                batch.delete_item(Key={'user_id': user_id, 'message_ts': msg['message_ts']})
+        return
+
+    # Emptied rather than deleted: the version keeps growing, so a writer
+    # holding the version from before the clear can never match it again
+    table = get_table()
+    known_items.pop(user_id, None)
+    try:
+        table.update_item(
+            Key={'user_id': user_id},
+            UpdateExpression='SET messages = :empty, last_updated = :now ADD #version :one',
+            ConditionExpression='attribute_exists(user_id)',
+            ExpressionAttributeNames={'#version': 'version'},
+            ExpressionAttributeValues={':empty': [], ':now': int(time.time()), ':one': 1}
+        )
+    except ClientError as e:
+        # nothing tracked for the user
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
 
 
 def get_user_messages(user_id):
     """Get all tracked messages for a user"""
-    table = ensure_table_exists()
+    if STORAGE_LAYOUT == 'per_message':
+        return query_user_messages(user_id)
+
+    table = get_table()
     
     try:
         response = table.get_item(Key={'user_id': user_id})
@@ -121,3 +465,86 @@ def get_user_messages(user_id):
         return item.get('messages', [])
     except ClientError:
         return []
+
+
+def get_alert_state(user_id):
+    """
+    Get the alert currently posted for the user, if it's still within
+    the cooldown. Returns a dict with channel, message_ts and sent_at;
+    channel and message_ts are missing while the alert is being posted.
+
+    Read consistently: it's called right after losing the claim, so it
+    has to see the item that won.
+    """
+    response = get_alerts_table().get_item(Key={'user_id': user_id}, ConsistentRead=True)
+    item = response.get('Item')
+
+    if not item:
+        return None
+
+    # TTL deletion is lazy, so check the cooldown ourselves
+    if item['sent_at'] <= int(time.time()) - ALERT_COOLDOWN_SECONDS:
+        return None
+
+    return item
+
+
+def claim_alert_slot(user_id):
+    """
+    Claim the right to post the user's alert for this cooldown, so two
+    concurrent violations don't both post one. Returns False if another
+    alert was already claimed within the cooldown.
+
+    A claim that wasn't followed by save_alert_state (the claimer crashed
+    or timed out) expires after ALERT_CLAIM_SECONDS.
+    """
+    now = int(time.time())
+
+    try:
+        get_alerts_table().put_item(
+            Item={
+                'user_id': user_id,
+                'sent_at': now,
+                'claimed_at': now,
+                'ttl': now + ALERT_COOLDOWN_SECONDS
+            },
+            ConditionExpression=(
+                'attribute_not_exists(user_id) OR sent_at <= :cutoff'
+                ' OR (attribute_not_exists(message_ts) AND claimed_at <= :claim_cutoff)'
+            ),
+            ExpressionAttributeValues={
+                ':cutoff': now - ALERT_COOLDOWN_SECONDS,
+                ':claim_cutoff': now - ALERT_CLAIM_SECONDS,
+            }
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        raise
+
+
+def save_alert_state(user_id, channel, message_ts):
+    """Remember the alert posted for the user for ALERT_COOLDOWN_SECONDS"""
+    sent_at = int(time.time())
+
+    get_alerts_table().put_item(
+        Item={
+            'user_id': user_id,
+            'channel': channel,
+            'message_ts': message_ts,
+            'sent_at': sent_at,
+            'ttl': sent_at + ALERT_COOLDOWN_SECONDS
+        }
+    )
+
+
+def clear_alert_state(user_id):
+    """Forget the alert, so the next violation posts a new one"""
+    get_alerts_table().delete_item(Key={'user_id': user_id})
+
+
+if __name__ == '__main__':
+    # Bootstrap / migration entry point: python message_tracker.py
+    table = ensure_table_exists()
+    print(f"Table {table.name} is ready")
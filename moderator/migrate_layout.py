@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Migrate the message tracker to the per-message layout and compare the
+two layouts.
+
+Usage:
+    # copy items from MESSAGE_TRACKER_TABLE to MESSAGE_EVENTS_TABLE
+    python migrate_layout.py migrate
+
+    # write cost and latency for windows of 5, 50 and 500 messages
+    DYNAMODB_ENDPOINT=http://localhost:4566 python migrate_layout.py benchmark
+"""
+
+import sys
+import math
+import time
+import argparse
+from decimal import Decimal
+
+import message_tracker
+
+
+WINDOW_SIZES = [5, 50, 500]
+
+
+def estimate_item_size(value):
+    """Approximate DynamoDB item size in bytes (names + values)"""
+    if isinstance(value, dict):
+        return sum(len(k) + estimate_item_size(v) for k, v in value.items()) + 3
+    if isinstance(value, list):
+        return sum(estimate_item_size(v) + 1 for v in value) + 3
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (int, float, Decimal)):
+        return math.ceil(len(str(value)) / 2) + 1
+    return 1
+
+
+def write_units(item):
+    """Write capacity units needed to write the item (1 WCU per 1 KB)"""
+    return max(1, math.ceil(estimate_item_size(item) / 1024))
+
+
+def migrate():
+    list_table = message_tracker.table_manager.bootstrap()
+    events_table = message_tracker.events_table_manager.bootstrap()
+
+    users = 0
+    messages = 0
+    params = {}
+
+    with events_table.batch_writer() as batch:
+        while True:
+            response = list_table.scan(**params)
+
+            for item in response.get('Items', []):
+                users += 1
+                for msg in item.get('messages', []):
+                    new_item = dict(msg)
+                    new_item['user_id'] = item['user_id']
+                    new_item['ttl'] = int(msg['timestamp']) + message_tracker.MESSAGE_TTL_SECONDS
+                    batch.put_item(Item=new_item)
+                    messages += 1
+
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"Migrated {messages} messages of {users} users")
+
+
+def benchmark_layout(layout, mode, window_size, writes):
+    message_tracker.STORAGE_LAYOUT = layout
+    message_tracker.TRACKING_MODE = mode
+    message_tracker.known_items.clear()
+
+    user_id = f'U_BENCH_{layout}_{mode}_{window_size}'
+    message_tracker.clear_user_messages(user_id)
+
+    now = int(time.time())
+    text = 'x' * 100
+
+    # fill the window, then measure the writes on top of it
+    for i in range(window_size - writes):
+        message_tracker.track_message(user_id, 'C_BENCH', f'{now}.{i:06d}', text)
+
+    timings = []
+    for i in range(window_size - writes, window_size):
+        t0 = time.perf_counter()
+        message_tracker.track_message(user_id, 'C_BENCH', f'{now}.{i:06d}', text)
+        timings.append(time.perf_counter() - t0)
+
+    if layout == 'per_message':
+        item = message_tracker.query_user_messages(user_id)[-1]
+    else:
+        item = {
+            'user_id': user_id,
+            'messages': message_tracker.get_user_messages(user_id),
+            'version': window_size,
+            'last_updated': now,
+        }
+
+    message_tracker.clear_user_messages(user_id)
+
+    timings.sort()
+    return {
+        'avg_ms': 1000 * sum(timings) / len(timings),
+        'p95_ms': 1000 * timings[int(0.95 * (len(timings) - 1))],
+        'item_bytes': estimate_item_size(item),
+        'wcu': write_units(item),
+    }
+
+
+def benchmark(writes):
+    # every message of the benchmark has to stay inside the window
+    message_tracker.TIME_WINDOW_SECONDS = 3600
+    message_tracker.MESSAGE_THRESHOLD = 10 ** 6
+
+    message_tracker.table_manager.bootstrap()
+    message_tracker.events_table_manager.bootstrap()
+
+    variants = [
+        ('list', 'get_put'),
+        ('list', 'update'),
+        ('per_message', 'get_put'),
+    ]
+
+    print(f"{'layout':<24} {'window':>6} {'avg ms':>8} {'p95 ms':>8} {'item B':>8} {'WCU':>5}")
+
+    for window_size in WINDOW_SIZES:
+        for layout, mode in variants:
+            result = benchmark_layout(layout, mode, window_size, min(writes, window_size))
+            name = layout if layout == 'per_message' else f'{layout}/{mode}'
+            print(
+                f"{name:<24} {window_size:>6} {result['avg_ms']:>8.2f} "
+                f"{result['p95_ms']:>8.2f} {result['item_bytes']:>8} {result['wcu']:>5}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['migrate', 'benchmark'])
+    parser.add_argument('--writes', type=int, default=5, help='measured writes per window size')
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        migrate()
+    else:
+        benchmark(args.writes)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,8 +8,12 @@ mkdir package
 # Install dependencies
 pip install boto3 requests -t package/
 
-# Copy moderator code
+# Copy moderator code and shared modules
 cp *.py package/
+cp ../common/*.py package/
+
+# the same admins as the router, see router/publish.sh
+python ../common/routing.py ../automator/config.yaml package/routing_rules.json || exit 1
 
 # Create zip package
 (cd package && zip -r ../package.zip *) > /dev/null
@@ -0,0 +1,168 @@
+import os
+import time
+from collections import OrderedDict, deque
+
+import logs
+import message_tracker
+from logs import logger
+
+
+RATE_COUNTER_ENABLED = os.getenv('RATE_COUNTER_ENABLED', '0') == '1'
+# Go to DynamoDB once a user has this many messages less than the threshold
+RATE_COUNTER_MARGIN = int(os.getenv('RATE_COUNTER_MARGIN', '2'))
+RATE_COUNTER_MAX_USERS = int(os.getenv('RATE_COUNTER_MAX_USERS', '10000'))
+RATE_COUNTER_FLUSH_SECONDS = int(os.getenv('RATE_COUNTER_FLUSH_SECONDS', '60'))
+# At most this many users are written by the periodic flush of one message
+RATE_COUNTER_FLUSH_BATCH = int(os.getenv('RATE_COUNTER_FLUSH_BATCH', '25'))
+
+
+class SlidingWindowCounter():
+    """
+    Process-local sliding window of message timestamps per user.
+
+    Users far from the threshold are answered locally and their messages
+    are buffered. DynamoDB is only used when a user gets within `margin`
+    of the threshold, when a user is evicted from the LRU, and on the
+    periodic flush.
+
+    Each container only sees its own share of the messages, so the local
+    count is a lower bound. A user spread over several containers is
+    caught once one of them gets close to the limit, or when an eviction
+    or a flush writes the buffered messages and DynamoDB reports the
+    threshold as exceeded. Those users are kept until the caller takes
+    them with pop_exceeded() and alerts.
+
+    The periodic flush writes at most `flush_batch` users per message,
+    oldest first, so a single invocation never pays for the whole buffer.
+
+    Memory is bounded: at most `max_users` users, each with at most
+    `threshold` timestamps and pending messages.
+    """
+
+    def __init__(self, threshold, window_seconds, margin=2, max_users=10000,
+                 flush_seconds=60, flush_batch=25, tracker=message_tracker):
+        self.threshold = threshold
+        self.window_seconds = window_seconds
+        self.margin = margin
+        self.max_users = max_users
+        self.flush_seconds = flush_seconds
+        self.flush_batch = flush_batch
+        self.tracker = tracker
+
+        self.timestamps = OrderedDict()
+        self.pending = {}
+        # user_id -> track_messages result of background writes over the threshold
+        self.exceeded = {}
+        self.last_flush = time.time()
+
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'flushes': 0,
+            'persisted': 0,
+            'evictions': 0,
+        }
+
+    def get_timestamps(self, user_id):
+        if user_id in self.timestamps:
+            self.timestamps.move_to_end(user_id)
+            return self.timestamps[user_id]
+
+        # the ring buffer never needs more than threshold entries
+        timestamps = deque(maxlen=self.threshold)
+        self.timestamps[user_id] = timestamps
+
+        while len(self.timestamps) > self.max_users:
+            evicted_user, _ = self.timestamps.popitem(last=False)
+            self.stats['evictions'] += 1
+            self.flush_in_background(evicted_user)
+
+        return timestamps
+
+    def local_count(self, user_id, now):
+        cutoff = now - self.window_seconds
+        return sum(1 for t in self.timestamps.get(user_id, ()) if t > cutoff)
+
+    def track_message(self, user_id, channel_id, message_ts, message_text):
+        """Same contract as message_tracker.track_message"""
+        now = time.time()
+
+        self.get_timestamps(user_id).append(now)
+        message = self.tracker.new_message(int(now), channel_id, message_ts, message_text)
+        self.pending.setdefault(user_id, []).append(message)
+
+        message_count = self.local_count(user_id, now)
+
+        if message_count < self.threshold - self.margin:
+            self.stats['hits'] += 1
+            self.maybe_flush(now)
+            return {
+                'exceeded': False,
+                'message_count': message_count,
+                'messages': []
+            }
+
+        self.stats['misses'] += 1
+        return self.flush_user(user_id)
+
+    def flush_user(self, user_id):
+        messages = self.pending.pop(user_id, None)
+        if not messages:
+            return None
+
+        self.stats['persisted'] += len(messages)
+        return self.tracker.track_messages(user_id, messages)
+
+    def flush_in_background(self, user_id):
+        """Write a user that is not the one being tracked, keeping the result if exceeded"""
+        result = self.flush_user(user_id)
+        if result and result['exceeded']:
+            self.exceeded[user_id] = result
+
+    def pop_exceeded(self):
+        """(user_id, result) of the users found over the threshold by evictions and flushes"""
+        exceeded = list(self.exceeded.items())
+        self.exceeded.clear()
+        return exceeded
+
+    def maybe_flush(self, now):
+        if now - self.last_flush >= self.flush_seconds:
+            self.flush(limit=self.flush_batch)
+
+    def flush(self, limit=None):
+        """
+        Persist buffered messages, oldest users first. With a limit the
+        rest stays pending and the flush carries on with the next call.
+        """
+        user_ids = list(self.pending)
+        if limit is not None:
+            user_ids = user_ids[:limit]
+
+        for user_id in user_ids:
+            self.flush_in_background(user_id)
+
+        if self.pending:
+            return
+
+        self.last_flush = time.time()
+        self.stats['flushes'] += 1
+        if logger.is_enabled(logs.INFO):
+            logger.info('rate counter stats', stats=self.get_stats())
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        total = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / total if total else 0.0
+        stats['users'] = len(self.timestamps)
+        stats['pending'] = sum(len(m) for m in self.pending.values())
+        return stats
+
+
+counter = SlidingWindowCounter(
+    threshold=message_tracker.MESSAGE_THRESHOLD,
+    window_seconds=message_tracker.TIME_WINDOW_SECONDS,
+    margin=RATE_COUNTER_MARGIN,
+    max_users=RATE_COUNTER_MAX_USERS,
+    flush_seconds=RATE_COUNTER_FLUSH_SECONDS,
+    flush_batch=RATE_COUNTER_FLUSH_BATCH
+)
@@ -1,5 +1,7 @@
 import os
-import requests
+
+import slack_client
+from logs import logger
 
 
 SLACK_TOKEN = os.getenv('SLACK_TOKEN')
@@ -7,16 +9,16 @@ USER_SLACK_TOKEN = os.getenv('USER_SLACK_TOKEN')
 ADMIN_USER_ID = os.getenv('ADMIN_USER_ID', 'U01AXE0P5M3')
 
 
-def send_moderation_alert(user_id, messages):
-    """
-    Send a moderation alert to the admin with interactive buttons.
-    
-    Args:
-        user_id: The user who exceeded the message threshold
-        messages: List of message details
-    """
-    url = 'https://slack.com/api/chat.postMessage'
-    
+def bot_client():
+    return slack_client.get_client(SLACK_TOKEN)
+
+
+def user_client():
+    return slack_client.get_client(USER_SLACK_TOKEN)
+
+
+def build_alert_blocks(user_id, messages):
+    """Block Kit blocks of the moderation alert with message previews and action buttons"""
     # Build message blocks
     blocks = [
         {
@@ -117,41 +119,47 @@ def send_moderation_alert(user_id, messages):
         ]
     })
     
+    return blocks
+
+
+def send_moderation_alert(user_id, messages):
+    """
+    Send a moderation alert to the admin with interactive buttons.
+    
+    Args:
+        user_id: The user who exceeded the message threshold
+        messages: List of message details
+    """
+    blocks = build_alert_blocks(user_id, messages)
+    
     message_request = {
         "channel": ADMIN_USER_ID,
         "blocks": blocks,
         "text": f"Message rate limit exceeded for user {user_id}"
     }
     
-    headers = {
-        'Authorization': f'Bearer {SLACK_TOKEN}',
-        'Content-Type': 'application/json'
-    }
-    
-    response = requests.post(url, json=message_request, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return bot_client().post('chat.postMessage', message_request)
 
 
 def delete_messages(messages):
     """
     Delete multiple messages.
     
+    Calls go through the rate limiter of the Slack client, so large
+    cleanups are slowed down to the allowed rate instead of failing.
+    
     Args:
         messages: List of message details with channel_id and message_ts
     
     Returns:
-        dict: Results of deletion attempts
+        dict: Results of deletion attempts, with the outcome of every call
     """
-    url = 'https://slack.com/api/chat.delete'
-    headers = {
-        'Authorization': f'Bearer {USER_SLACK_TOKEN}',
-        'Content-Type': 'application/json'
-    }
+    client = user_client()
     
     results = {
         'success': [],
-        'failed': []
+        'failed': [],
+        'outcomes': []
     }
     
     for msg in messages:
@@ -167,17 +175,13 @@ def delete_messages(messages):
             "ts": message_ts
         }
         
-        try:
-            response = requests.post(url, json=message_request, headers=headers)
-            response.raise_for_status()
-            response_json = response.json()
-            
-            if response_json.get('ok'):
-                results['success'].append(msg)
-            else:
-                results['failed'].append(msg)
-        except Exception as e:
-            print(f"Error deleting message: {e}")
+        outcome = client.try_post('chat.delete', message_request)
+        results['outcomes'].append(outcome)
+        
+        if outcome['ok']:
+            results['success'].append(msg)
+        else:
+            logger.error('Error deleting message %s %s: %s', channel_id, message_ts, outcome['error'])
             results['failed'].append(msg)
     
     return results
@@ -199,33 +203,32 @@ def deactivate_user(user_id):
     Returns:
         dict: API response
     """
-    # Use session invalidation as it's more widely available
-    url = 'https://slack.com/api/admin.users.session.invalidate'
-    
-    headers = {
-        'Authorization': f'Bearer {USER_SLACK_TOKEN}',
-        'Content-Type': 'application/json'
-    }
-    
     payload = {
         'user_id': user_id,
         'team_id': os.getenv('SLACK_TEAM_ID')  # Required for session invalidation
     }
     
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    # Use session invalidation as it's more widely available
+    return user_client().post('admin.users.session.invalidate', payload)
+
+
+def update_moderation_alert(channel, message_ts, user_id, messages):
+    """
+    Refresh an existing moderation alert with the current message count
+    and previews instead of posting a new one.
+    """
+    payload = {
+        'channel': channel,
+        'ts': message_ts,
+        'blocks': build_alert_blocks(user_id, messages),
+        'text': f"Message rate limit exceeded for user {user_id}"
+    }
+
+    return bot_client().post('chat.update', payload)
 
 
 def update_alert_message(channel, message_ts, new_text):
     """Update the alert message with results"""
-    url = 'https://slack.com/api/chat.update'
-    
-    headers = {
-        'Authorization': f'Bearer {SLACK_TOKEN}',
-        'Content-Type': 'application/json'
-    }
-    
     payload = {
         'channel': channel,
         'ts': message_ts,
@@ -241,6 +244,4 @@ def update_alert_message(channel, message_ts, new_text):
         ]
     }
     
-    response = requests.post(url, json=payload, headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return bot_client().post('chat.update', payload)
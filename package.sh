@@ -6,6 +6,16 @@ mkdir package
 uv pip install -r requirements.txt --target package/
 
 cp automator/* package
+cp common/*.py package
+
+# validated JSON snapshot of config.yaml, so cold starts don't parse YAML
+PYTHONPATH=package python automator/config_loader.py automator/config.yaml package/config.json || exit 1
+
+# BM25 index for ask-ai reactions with 'index: faq.idx'
+FAQ_DIR=${FAQ_DIR:-faq}
+if [ -d "$FAQ_DIR" ]; then
+    python automator/retrieval.py build "$FAQ_DIR" package/faq.idx
+fi
 
 (cd package && zip -r ../package.zip *) > /dev/null
 
@@ -0,0 +1,111 @@
+import os
+import time
+from collections import OrderedDict
+
+import boto3
+from botocore.exceptions import BotoCoreError, ClientError
+
+from logs import logger
+from metrics import instrument_boto3
+
+
+# Optional DynamoDB table (partition key: event_id, TTL attribute: ttl)
+# shared by all router containers. Without it only the in-memory LRU is used.
+DEDUP_TABLE_NAME = os.getenv('DEDUP_TABLE_NAME')
+# Slack retries after 1 and 5 minutes, keep event ids for longer than that
+DEDUP_TTL_SECONDS = int(os.getenv('DEDUP_TTL_SECONDS', '3600'))
+DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', '10000'))
+DYNAMODB_ENDPOINT = os.getenv('DYNAMODB_ENDPOINT', None)
+
+
+class EventDeduplicator():
+    """
+    Remembers Slack event ids so retries of an event are forwarded once.
+
+    A warm container answers repeated ids from its LRU. Ids it hasn't
+    seen are claimed in DynamoDB with a conditional put, so a retry
+    that lands on another container is caught too. If DynamoDB fails,
+    the event is forwarded: a rare duplicate is better than a lost event.
+    """
+
+    def __init__(self, table_name=DEDUP_TABLE_NAME, ttl_seconds=DEDUP_TTL_SECONDS,
+                 max_size=DEDUP_CACHE_SIZE, table=None, clock=time.time):
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.table = table
+        self.clock = clock
+
+        self.seen = OrderedDict()
+        self.stats = {
+            'new': 0,
+            'memory_hits': 0,
+            'dynamodb_hits': 0,
+            'errors': 0,
+        }
+
+    def get_table(self):
+        if self.table is None and self.table_name:
+            if DYNAMODB_ENDPOINT:
+                dynamodb = boto3.resource('dynamodb', endpoint_url=DYNAMODB_ENDPOINT)
+            else:
+                dynamodb = boto3.resource('dynamodb')
+            instrument_boto3(dynamodb.meta.client)
+            self.table = dynamodb.Table(self.table_name)
+        return self.table
+
+    def remember(self, event_id):
+        self.seen[event_id] = True
+        self.seen.move_to_end(event_id)
+        while len(self.seen) > self.max_size:
+            self.seen.popitem(last=False)
+
+    def claim(self, event_id):
+        """True if the event id is new, False if it was already seen"""
+        if event_id in self.seen:
+            self.seen.move_to_end(event_id)
+            self.stats['memory_hits'] += 1
+            return False
+
+        table = self.get_table()
+        if table is not None:
+            try:
+                table.put_item(
+                    Item={'event_id': event_id, 'ttl': int(self.clock()) + self.ttl_seconds},
+                    ConditionExpression='attribute_not_exists(event_id)'
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    self.remember(event_id)
+                    self.stats['dynamodb_hits'] += 1
+                    return False
+
+                self.stats['errors'] += 1
+                logger.error('dedup: DynamoDB error for %s, forwarding: %s', event_id, e)
+            except BotoCoreError as e:
+                # connection errors, timeouts, credentials
+                self.stats['errors'] += 1
+                logger.error('dedup: DynamoDB error for %s, forwarding: %s', event_id, e)
+
+        self.remember(event_id)
+        self.stats['new'] += 1
+        return True
+
+    def release(self, event_id):
+        """Forget a claimed id, so a retry is forwarded (e.g. after a failed invoke)"""
+        self.seen.pop(event_id, None)
+
+        table = self.get_table()
+        if table is not None:
+            try:
+                table.delete_item(Key={'event_id': event_id})
+            except (BotoCoreError, ClientError) as e:
+                logger.error('dedup: could not release %s: %s', event_id, e)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['duplicates'] = stats['memory_hits'] + stats['dynamodb_hits']
+        return stats
+
+
+deduplicator = EventDeduplicator()
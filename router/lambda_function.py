@@ -1,13 +1,21 @@
 import json
+import time
 import base64
 
 import boto3
 
+import tracing
+import routing
+from logs import logger
+from metrics import metrics
+from event_dedup import deduplicator
 
-lambda_client = boto3.client('lambda')
 
+lambda_client = boto3.client('lambda')
 
-admins = {'U01AXE0P5M3'}
+# compiled from automator/config.yaml by publish.sh
+rules = routing.RoutingRules.from_file()
+routing_stats = routing.RoutingStats()
 
 
 def extract_body(event):
@@ -42,45 +50,69 @@ def challenge(body):
     }
 
 
-def run(body):
-    print(json.dumps(body))
+def forward(function_name, body):
+    lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps(body)
+    )
+
+
+def get_retry_num(event):
+    """X-Slack-Retry-Num header, set when Slack resends an event"""
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'x-slack-retry-num':
+            return value
+    return None
+
+
+def run(body, retry_num=None, received_at=None):
+    if received_at is None:
+        received_at = time.time()
+    trace_context = tracing.start_router(body, received_at, retry_num)
+    logger.payload(body)
 
     if 'challenge' in body:
         return challenge(body)
-    
+
+    # Only invoke a worker for events that can produce work
+    function_name, rule = rules.route(body)
+
+    # Slack resends events it thinks weren't delivered; forward each event_id once
+    event_id = body.get('event_id')
+    if function_name and event_id and not deduplicator.claim(event_id):
+        function_name, rule = None, 'duplicate'
+
+    routing_stats.record(rule, forwarded=function_name is not None)
+    metrics.count('route.' + rule)
+
+    if function_name:
+        try:
+            # the worker logs how long the event took to reach it
+            with metrics.timer('lambda.invoke'):
+                forward(function_name, tracing.stamp(body, trace_context))
+        except Exception:
+            if event_id:
+                deduplicator.release(event_id)
+            raise
+
+    event = body.get('event', {})
+    logger.info(
+        'routed %s', rule,
+        event_type=event.get('type'), user=event.get('user'),
+        retry=retry_num, forwarded_to=function_name,
+        routing=routing_stats.totals(), routing_rules=routing_stats.counts,
+        dedup=deduplicator.get_stats()
+    )
+
     # Handle interactive components (button clicks)
     if 'payload' in body:
-        lambda_client.invoke(
-            FunctionName='automator-message-moderator',
-            InvocationType='Event',
-            Payload=json.dumps(body)
-        )
         return {
             'statusCode': 200,
             'body': json.dumps({'ok': True})
         }
 
-    event = body.get('event', {})
-    event_user = event.get('user')
-    event_type = event.get('type')
-
-    print(f'user: {event_user} (admin: {event_user in admins}), event_type: {event_type}')
-
-    if (event_type == 'reaction_added') and (event_user in admins):
-        lambda_client.invoke(
-            FunctionName='automator-process-reaction',
-            InvocationType='Event',
-            Payload=json.dumps(body)
-        )
-    
-    # Route message events to moderator lambda
-    if event_type == 'message':
-        lambda_client.invoke(
-            FunctionName='automator-message-moderator',
-            InvocationType='Event',
-            Payload=json.dumps(body)
-        )
-
     return {
         'statusCode': 200,
         'body': "Hello from lambda!"
@@ -88,5 +120,11 @@ def run(body):
 
 
 def lambda_handler(original_event, context):
-    body = extract_body(original_event)
-    return run(body)
\ No newline at end of file
+    received_at = time.time()
+    started_at = time.perf_counter()
+    metrics.set_handler('router')
+    try:
+        body = extract_body(original_event)
+        return run(body, get_retry_num(original_event), received_at)
+    finally:
+        metrics.flush(time.perf_counter() - started_at)
@@ -10,8 +10,28 @@ mkdir package
 # pip install -r requirements.txt -t package/
 
 cp *.py package
+cp ../common/*.py package
 rm -f package/test*.py
 
+# admins and configured reactions, so events that can't produce work are dropped here.
+# An automator that reloads its config from S3 can have reactions that aren't in
+# config.yaml, so then every admin reaction is forwarded
+AUTOMATOR_FUNCTION_NAME="automator-process-reaction"
+
+if [ -z "${CONFIG_S3_URI}" ]; then
+    CONFIG_S3_URI=$(aws lambda get-function-configuration \
+        --function-name ${AUTOMATOR_FUNCTION_NAME} \
+        --query 'Environment.Variables.CONFIG_S3_URI' \
+        --output text 2> /dev/null)
+fi
+
+if [ -n "${CONFIG_S3_URI}" ] && [ "${CONFIG_S3_URI}" != "None" ]; then
+    echo "WARNING: the automator config is loaded from ${CONFIG_S3_URI}, reactions are not filtered by the router"
+    python ../common/routing.py ../automator/config.yaml package/routing_rules.json --all-reactions || exit 1
+else
+    python ../common/routing.py ../automator/config.yaml package/routing_rules.json || exit 1
+fi
+
 (cd package && zip -r ../package.zip *) > /dev/null
 
 
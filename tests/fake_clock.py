@@ -0,0 +1,11 @@
+class FakeClock():
+    """Injectable clock: time only moves with sleep() or by setting now"""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
@@ -0,0 +1,244 @@
+import sys
+import os
+import io
+import json
+import time
+import threading
+import importlib.util
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Set environment before importing lambda_function
+os.environ['CONFIG_FILE'] = os.path.join(os.path.dirname(__file__), '..', 'automator', 'config.yaml')
+
+# Add automator directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'automator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+# moderator/ also has a lambda_function module, so load this one under its own name
+AUTOMATOR_DIR = os.path.join(os.path.dirname(__file__), '..', 'automator')
+spec = importlib.util.spec_from_file_location(
+    'automator_lambda_function', os.path.join(AUTOMATOR_DIR, 'lambda_function.py')
+)
+lambda_function = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(lambda_function)
+
+from slack import ThreadSnapshot
+from metrics import Metrics
+
+
+def reaction_event(reaction, channel='C01FABYF2RG', ts='100.1'):
+    return {
+        'type': 'reaction_added',
+        'user': 'U01AXE0P5M3',
+        'reaction': reaction,
+        'item': {'type': 'message', 'channel': channel, 'ts': ts},
+    }
+
+
+class TestDeleteWithThreads(unittest.TestCase):
+
+    @patch.object(lambda_function, 'slack')
+    def test_replies_deleted_in_parallel_before_parent(self, mock_slack):
+        """Test that replies are fanned out and the parent is deleted last"""
+        replies = [{'ts': f'{101 + i}.1', 'user': f'U{i}', 'text': 'reply'} for i in range(10)]
+        parent = {'ts': '100.1', 'user': 'U_PARENT', 'text': 'spam'}
+        mock_slack.get_thread_snapshot.return_value = ThreadSnapshot(
+            'C01FABYF2RG', '100.1', [parent] + replies + [{'ts': '200.1', 'text': 'bot reply'}]
+        )
+
+        lock = threading.Lock()
+        state = {'active': 0, 'max_active': 0}
+        deleted = []
+
+        def remove_message(channel, ts):
+            with lock:
+                state['active'] += 1
+                state['max_active'] = max(state['max_active'], state['active'])
+            time.sleep(0.02)
+            with lock:
+                state['active'] -= 1
+                deleted.append(ts)
+            if ts == '105.1':
+                return {'ok': False, 'error': 'message_not_found'}
+            return {'ok': True}
+
+        mock_slack.remove_message.side_effect = remove_message
+        reaction_config = lambda_function.provider.current.reaction_configs['delete']
+
+        with patch.object(lambda_function, 'FAKE_DELETE', False):
+            summary = lambda_function.handle_delete_with_threads(reaction_event('delete'), reaction_config)
+
+        self.assertGreater(state['max_active'], 1)
+        self.assertEqual(deleted[-1], '100.1')
+        self.assertEqual(sorted(deleted[:-1]), sorted(r['ts'] for r in replies))
+        self.assertEqual(mock_slack.send_dm.call_count, 11)
+        self.assertEqual(len(summary['success']), 9)
+        self.assertEqual([o['ts'] for o in summary['failed']], ['105.1'])
+        self.assertEqual(summary['failed'][0]['error'], 'message_not_found')
+
+    @patch.object(lambda_function, 'slack')
+    def test_reply_failure_does_not_stop_the_rest(self, mock_slack):
+        """Test that an exception for one reply is reported in the summary"""
+        replies = [{'ts': f'{101 + i}.1', 'user': f'U{i}'} for i in range(3)]
+        parent = {'ts': '100.1', 'user': 'U_PARENT', 'text': 'spam'}
+        mock_slack.get_thread_snapshot.return_value = ThreadSnapshot('C01FABYF2RG', '100.1', [parent] + replies)
+        mock_slack.remove_message.return_value = {'ok': True}
+        mock_slack.send_dm.side_effect = [Exception('boom'), {'ok': True}, {'ok': True}, {'ok': True}]
+
+        reaction_config = lambda_function.provider.current.reaction_configs['delete']
+
+        with patch.object(lambda_function, 'FAKE_DELETE', False), \
+                patch.object(lambda_function, 'DELETE_CONCURRENCY', 1):
+            summary = lambda_function.handle_delete_with_threads(reaction_event('delete'), reaction_config)
+
+        self.assertEqual(len(summary['success']), 2)
+        self.assertEqual(summary['failed'][0]['error'], 'boom')
+        mock_slack.remove_message.assert_called_with('C01FABYF2RG', '100.1')
+        mock_slack.get_thread_snapshot.assert_called_once_with('C01FABYF2RG', '100.1')
+        mock_slack.get_message_content.assert_not_called()
+
+
+class TestInvocationMetrics(unittest.TestCase):
+
+    @patch.object(lambda_function, 'slack')
+    def test_one_emf_record_per_invocation(self, mock_slack):
+        """Test that the handler writes the metrics of the invocation with its reaction type"""
+        mock_slack.get_message.return_value = ('U1', 'hi')
+        metrics = Metrics()
+        body = {'event': reaction_event('shameless-rules')}
+
+        with patch.object(lambda_function, 'metrics', metrics), \
+                patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            lambda_function.lambda_handler(body, None)
+
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        emf = [r for r in records if '_aws' in r]
+        self.assertEqual(len(emf), 1)
+        self.assertEqual(emf[0]['Handler'], 'DELETE_MESSAGE')
+        self.assertIn('Duration', emf[0])
+
+
+class TestBuildAiPrompt(unittest.TestCase):
+
+    @patch.object(lambda_function, 'retrieval')
+    def test_retrieved_passages_fill_context(self, mock_retrieval):
+        """Test that {context} gets the passages from the reaction's index"""
+        mock_retrieval.retrieve_context.return_value = '[faq.md]\nUse WSL2'
+        reaction_config = {
+            'prompt_template': 'FAQ:\n{context}\n\nQuestion: {user_message}',
+            'index': 'faq.idx',
+            'top_k': 2,
+        }
+
+        prompt = lambda_function.build_ai_prompt(
+            reaction_event('ask-ai'), reaction_config, 'docker on windows?', ['model-a']
+        )
+
+        mock_retrieval.retrieve_context.assert_called_once_with('faq.idx', 'docker on windows?', 2)
+        self.assertEqual(prompt, 'FAQ:\n[faq.md]\nUse WSL2\n\nQuestion: docker on windows?')
+
+    @patch.object(lambda_function, 'retrieval')
+    def test_no_index_no_retrieval(self, mock_retrieval):
+        """Test that reactions without an index don't retrieve"""
+        reaction_config = {'prompt_template': 'Question: {user_message}'}
+
+        prompt = lambda_function.build_ai_prompt(
+            reaction_event('ask-ai'), reaction_config, 'hi', ['model-a']
+        )
+
+        mock_retrieval.retrieve_context.assert_not_called()
+        self.assertEqual(prompt, 'Question: hi')
+
+    @patch.object(lambda_function, 'thread_context')
+    def test_prompt_over_budget_asks_for_no_thread_context(self, mock_thread_context):
+        """Test that the thread context budget is never negative"""
+        mock_thread_context.DEFAULT_TOKEN_BUDGET = 1000
+        mock_thread_context.estimate_tokens.return_value = 500
+        mock_thread_context.build_thread_context.return_value = ''
+        reaction_config = {
+            'prompt_template': 'Question: {user_message}',
+            'context': 'thread',
+            'context_token_budget': 100,
+        }
+
+        prompt = lambda_function.build_ai_prompt(
+            reaction_event('ask-ai'), reaction_config, 'hi', ['model-a']
+        )
+
+        self.assertEqual(mock_thread_context.build_thread_context.call_args[0][3], 0)
+        self.assertEqual(prompt, 'Question: hi')
+
+
+class TestAiDeadline(unittest.TestCase):
+
+    def test_deadline_within_the_invocation(self):
+        """Test that the answer deadline leaves time to post before the Lambda timeout"""
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 10000
+
+        with patch.object(lambda_function, 'invocation_context', context):
+            self.assertEqual(lambda_function.ai_deadline({'deadline': 60}), 10 - lambda_function.AI_DEADLINE_MARGIN_SECONDS)
+            self.assertEqual(lambda_function.ai_deadline({'deadline': 5}), 5)
+
+        with patch.object(lambda_function, 'invocation_context', None):
+            self.assertEqual(lambda_function.ai_deadline({'deadline': 60}), 60)
+
+
+class TestAskAiStream(unittest.TestCase):
+
+    @patch.object(lambda_function, 'groqu')
+    @patch.object(lambda_function, 'slack')
+    def test_placeholder_is_updated_with_streamed_answer(self, mock_slack, mock_groqu):
+        """Test that a placeholder is posted first and then updated in throttled steps"""
+        from slack import StreamingSlackMarkdown
+
+        mock_slack.StreamingSlackMarkdown = StreamingSlackMarkdown
+        mock_slack.post_message_thread.return_value = {'ok': True, 'channel': 'C1', 'ts': '200.1'}
+        mock_slack.get_message.return_value = ('U1', 'What is Docker?')
+        mock_groqu.resilient_ai_request_stream.return_value = iter(['**Docker** ', 'is a ', 'container ', 'runtime'])
+
+        reaction_config = dict(lambda_function.provider.current.reaction_configs['ask-ai'], stream=True)
+
+        with patch.object(lambda_function, 'STREAM_UPDATE_SECONDS', 3600):
+            lambda_function.handle_ask_ai(reaction_event('ask-ai'), reaction_config)
+
+        mock_slack.post_message_thread.assert_called_once()
+        self.assertIn('Thinking', mock_slack.post_message_thread.call_args[0][1])
+
+        # first chunk right away, then only the final answer
+        updates = mock_slack.update_message.call_args_list
+        self.assertEqual(len(updates), 2)
+        self.assertIn('*Docker* ', updates[0][0][2])
+        self.assertEqual(updates[-1][0][:2], ('C1', '200.1'))
+        self.assertIn('*Docker* is a container runtime', updates[-1][0][2])
+        self.assertIn('<@U1>', updates[-1][0][2])
+        self.assertIn('ask_ai.first_text', lambda_function.metrics.values)
+
+    @patch.object(lambda_function, 'groqu')
+    @patch.object(lambda_function, 'slack')
+    def test_placeholder_is_replaced_when_stream_fails(self, mock_slack, mock_groqu):
+        """Test that a failed stream doesn't leave the placeholder behind"""
+        from slack import StreamingSlackMarkdown
+
+        def broken_stream(prompt, models, timeout, deadline):
+            yield 'Docker '
+            raise ConnectionError('stream interrupted')
+
+        mock_slack.StreamingSlackMarkdown = StreamingSlackMarkdown
+        mock_slack.post_message_thread.return_value = {'ok': True, 'channel': 'C1', 'ts': '200.1'}
+        mock_slack.get_message.return_value = ('U1', 'What is Docker?')
+        mock_groqu.resilient_ai_request_stream.side_effect = broken_stream
+
+        reaction_config = dict(lambda_function.provider.current.reaction_configs['ask-ai'], stream=True)
+
+        lambda_function.metrics.reset()
+        lambda_function.handle_ask_ai(reaction_event('ask-ai'), reaction_config)
+
+        updates = mock_slack.update_message.call_args_list
+        self.assertEqual(updates[-1][0], ('C1', '200.1', lambda_function.STREAM_ERROR_MESSAGE))
+        self.assertEqual(lambda_function.metrics.counters['ask_ai.stream_errors'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import sys
+import os
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'automator'))
+
+from cache import TTLCache
+from fake_clock import FakeClock
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_hit_and_miss(self):
+        cache = TTLCache(max_size=10, ttl_seconds=60)
+
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+
+        stats = cache.get_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        cache = TTLCache(max_size=10, ttl_seconds=60, clock=clock)
+
+        cache.set('a', 1)
+        clock.now = 59
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 61
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get_stats()['size'], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = TTLCache(max_size=2, ttl_seconds=60)
+
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_invalidate(self):
+        cache = TTLCache(max_size=10, ttl_seconds=60)
+
+        cache.set('a', 1)
+        cache.invalidate('a')
+
+        self.assertIsNone(cache.get('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+AUTOMATOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'automator')
+COMMON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'common')
+sys.path.insert(0, AUTOMATOR_DIR)
+sys.path.insert(0, COMMON_DIR)
+
+import config_loader
+
+
+CONFIG = """admins:
+  - U1
+channels:
+  C1: "course-one"
+reactions:
+  - reaction: thread
+    type: SLACK_POST
+    message: Use threads
+  - reaction: ask-ai
+    type: ASK_AI
+    model: some-model
+    prompt_template: "{user_message}"
+    answer_template: "{ai_response}"
+"""
+
+
+class TestConfigLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config_file = os.path.join(self.tmp_dir, 'config.yaml')
+        self.snapshot_file = os.path.join(self.tmp_dir, 'config.json')
+        with open(self.config_file, 'w') as f_out:
+            f_out.write(CONFIG)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_snapshot_matches_yaml(self):
+        """Test that the snapshot gives the same config as parsing the YAML"""
+        config_loader.write_snapshot(self.config_file, self.snapshot_file)
+
+        from_snapshot = config_loader.load_config(self.config_file, self.snapshot_file)
+        from_yaml = config_loader.load_config(self.config_file, os.path.join(self.tmp_dir, 'missing.json'))
+
+        self.assertEqual(from_snapshot, from_yaml)
+        config, reaction_configs = from_snapshot
+        self.assertEqual(list(reaction_configs), ['thread', 'ask-ai'])
+        self.assertIs(reaction_configs['thread'], config['reactions'][0])
+
+    def test_stale_snapshot_is_ignored(self):
+        """Test that a snapshot of an older config.yaml is not used"""
+        config_loader.write_snapshot(self.config_file, self.snapshot_file)
+        with open(self.config_file, 'a') as f_out:
+            f_out.write("  - reaction: faq\n    type: SLACK_POST\n    message: FAQ\n")
+
+        self.assertIsNone(config_loader.read_snapshot(self.snapshot_file, self.config_file))
+        _, reaction_configs = config_loader.load_config(self.config_file, self.snapshot_file)
+        self.assertIn('faq', reaction_configs)
+
+    def test_validation_errors(self):
+        config = {
+            'admins': [],
+            'channels': {},
+            'reactions': [
+                {'reaction': 'a', 'type': 'SLACK_POST'},
+                {'reaction': 'a', 'type': 'UNKNOWN'},
+                {'reaction': 'b', 'type': 'ASK_AI', 'prompt_template': '', 'answer_template': ''},
+            ]
+        }
+
+        with self.assertRaises(config_loader.ConfigError) as context:
+            config_loader.validate_config(config)
+
+        message = str(context.exception)
+        self.assertIn('a: SLACK_POST needs message', message)
+        self.assertIn('a: defined more than once', message)
+        self.assertIn('a: unknown type UNKNOWN', message)
+        self.assertIn('b: ASK_AI needs model or models', message)
+
+    def test_repo_config_is_valid(self):
+        config_loader.validate_config(config_loader.load_yaml(os.path.join(AUTOMATOR_DIR, 'config.yaml')))
+
+    def test_cold_start_imports(self):
+        """Test that with a snapshot the handler module loads without yaml, requests or groqu"""
+        config_loader.write_snapshot(self.config_file, self.snapshot_file)
+
+        code = (
+            "import sys, json, lambda_function; "
+            "lambda_function.process_reaction({}, {'reaction': 'no-such-reaction'}); "
+            "print(json.dumps([m for m in ['yaml', 'requests', 'groqu', 'slack'] if m in sys.modules]))"
+        )
+        env = dict(
+            os.environ, CONFIG_FILE=self.config_file, CONFIG_SNAPSHOT=self.snapshot_file,
+            PYTHONPATH=COMMON_DIR
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=AUTOMATOR_DIR, env=env, capture_output=True, text=True, check=True
+        )
+
+        self.assertEqual(json.loads(result.stdout.strip().split('\n')[-1]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
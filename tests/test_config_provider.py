@@ -0,0 +1,198 @@
+import sys
+import os
+import io
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'automator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import config_provider
+from fake_clock import FakeClock
+
+
+CONFIG = """admins: []
+channels:
+  C1: "course-one"
+reactions:
+  - reaction: thread
+    type: SLACK_POST
+    message: Use threads
+"""
+
+
+def config_with_reactions(*names):
+    return {
+        'admins': [],
+        'channels': {'C1': 'course-one'},
+        'reactions': [{'reaction': name, 'type': 'SLACK_POST', 'message': f'{name} message'} for name in names],
+    }
+
+
+class FakeS3Client():
+    """Local stand-in for S3: objects in a dict, a new ETag on every put"""
+
+    def __init__(self):
+        self.objects = {}
+        self.head_calls = 0
+
+    def put_object(self, Bucket, Key, Body):
+        etag = f'"etag-{len(self.objects)}-{time.monotonic_ns()}"'
+        self.objects[(Bucket, Key)] = (Body, etag)
+
+    def head_object(self, Bucket, Key):
+        self.head_calls += 1
+        return {'ETag': self.objects[(Bucket, Key)][1]}
+
+    def get_object(self, Bucket, Key):
+        body, etag = self.objects[(Bucket, Key)]
+        return {'Body': io.BytesIO(body.encode('utf-8')), 'ETag': etag}
+
+
+class BlockingSource():
+    """Source whose check waits until released"""
+
+    def __init__(self):
+        self.released = threading.Event()
+        self.version = 'v1'
+
+    def check(self):
+        if self.version != 'v1':
+            self.released.wait(5)
+        return self.version
+
+    def load(self):
+        config = config_with_reactions(self.version)
+        return config, {c['reaction']: c for c in config['reactions']}, self.version
+
+
+class TestConfigProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+
+    def test_file_source_reloads_on_change(self):
+        """Test that a changed file is loaded and the templates compiled"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        config_file = os.path.join(tmp_dir, 'config.yaml')
+        with open(config_file, 'w') as f_out:
+            f_out.write(CONFIG)
+
+        source = config_provider.FileSource(config_file, os.path.join(tmp_dir, 'config.json'))
+        provider = config_provider.ConfigProvider(source, check_seconds=60, clock=self.clock)
+        first = provider.current
+
+        with open(config_file, 'a') as f_out:
+            f_out.write("  - reaction: faq\n    type: SLACK_POST\n    message: Check the FAQ\n")
+        stat = os.stat(config_file)
+        os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        provider.check()
+
+        self.assertIn('faq', provider.current.reaction_configs)
+        self.assertIn(('faq', 'message'), provider.current.message_templates)
+        self.assertNotEqual(provider.current.version, first.version)
+        self.assertNotIn('faq', first.reaction_configs)
+
+    def test_s3_source_reloads_on_new_etag(self):
+        client = FakeS3Client()
+        client.put_object(Bucket='configs', Key='automator/config.json', Body=json.dumps(config_with_reactions('a')))
+        source = config_provider.S3Source.from_uri('s3://configs/automator/config.json', client=client)
+        provider = config_provider.ConfigProvider(source, check_seconds=60, clock=self.clock)
+
+        provider.check()
+        self.assertEqual(list(provider.current.reaction_configs), ['a'])
+
+        client.put_object(Bucket='configs', Key='automator/config.json', Body=json.dumps(config_with_reactions('a', 'b')))
+        provider.check()
+
+        self.assertEqual(list(provider.current.reaction_configs), ['a', 'b'])
+        self.assertEqual(provider.current.version, client.objects[('configs', 'automator/config.json')][1].strip('"'))
+
+    def test_invalid_config_keeps_current(self):
+        """Test that a config that fails validation is not swapped in"""
+        client = FakeS3Client()
+        client.put_object(Bucket='b', Key='config.json', Body=json.dumps(config_with_reactions('a')))
+        provider = config_provider.ConfigProvider(
+            config_provider.S3Source('b', 'config.json', client=client), check_seconds=60, clock=self.clock
+        )
+        current = provider.current
+
+        client.put_object(Bucket='b', Key='config.json', Body=json.dumps({'reactions': [{'reaction': 'x'}]}))
+        provider.check()
+
+        self.assertIs(provider.current, current)
+
+    def test_unreadable_s3_starts_from_bundled_config(self):
+        """Test that the bundled file is used until the S3 object can be read"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        config_file = os.path.join(tmp_dir, 'config.yaml')
+        with open(config_file, 'w') as f_out:
+            f_out.write(CONFIG)
+
+        client = FakeS3Client()
+        provider = config_provider.ConfigProvider(
+            config_provider.S3Source('b', 'config.json', client=client),
+            check_seconds=60,
+            clock=self.clock,
+            fallback=config_provider.FileSource(config_file, os.path.join(tmp_dir, 'config.json'))
+        )
+        self.assertEqual(list(provider.current.reaction_configs), ['thread'])
+
+        # still missing: the bundled config stays
+        provider.check()
+        self.assertEqual(list(provider.current.reaction_configs), ['thread'])
+
+        client.put_object(Bucket='b', Key='config.json', Body=json.dumps(config_with_reactions('a')))
+        provider.check()
+        self.assertEqual(list(provider.current.reaction_configs), ['a'])
+
+    def test_checks_at_most_once_per_interval(self):
+        client = FakeS3Client()
+        client.put_object(Bucket='b', Key='config.json', Body=json.dumps(config_with_reactions('a')))
+        provider = config_provider.ConfigProvider(
+            config_provider.S3Source('b', 'config.json', client=client), check_seconds=60, clock=self.clock
+        )
+
+        for _ in range(10):
+            provider.get()
+        self.assertEqual(client.head_calls, 1)
+
+        self.clock.now += 60
+        provider.get()
+        for _ in range(50):
+            if client.head_calls == 2 and not provider.checking:
+                break
+            time.sleep(0.01)
+        self.assertEqual(client.head_calls, 2)
+
+    def test_get_does_not_wait_for_the_check(self):
+        """Test that a slow check doesn't block get() and the swap happens later"""
+        source = BlockingSource()
+        provider = config_provider.ConfigProvider(source, check_seconds=60, clock=self.clock)
+        source.version = 'v2'
+        self.clock.now += 60
+
+        t0 = time.perf_counter()
+        current = provider.get()
+        self.assertLess(time.perf_counter() - t0, 0.5)
+        self.assertEqual(current.version, 'v1')
+
+        source.released.set()
+        for _ in range(100):
+            if provider.current.version == 'v2':
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(provider.current.version, 'v2')
+        self.assertEqual(list(provider.current.reaction_configs), ['v2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import sys
+import os
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'router'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from event_dedup import EventDeduplicator
+
+
+class FakeDedupTable():
+    """Conditional put on event_id, like DynamoDB"""
+
+    def __init__(self, fail_with=None):
+        self.items = {}
+        self.put_calls = 0
+        self.fail_with = fail_with
+
+    def put_item(self, Item, ConditionExpression):
+        self.put_calls += 1
+        if self.fail_with:
+            raise ClientError({'Error': {'Code': self.fail_with}}, 'PutItem')
+        if Item['event_id'] in self.items:
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'PutItem')
+        self.items[Item['event_id']] = Item
+
+    def delete_item(self, Key):
+        self.items.pop(Key['event_id'], None)
+
+
+class TestEventDeduplicator(unittest.TestCase):
+
+    def test_memory_hit(self):
+        """Test that a retry on the same container doesn't go to DynamoDB"""
+        table = FakeDedupTable()
+        dedup = EventDeduplicator(table=table, clock=lambda: 1000)
+
+        self.assertTrue(dedup.claim('Ev1'))
+        self.assertFalse(dedup.claim('Ev1'))
+
+        self.assertEqual(table.put_calls, 1)
+        self.assertEqual(table.items['Ev1']['ttl'], 1000 + dedup.ttl_seconds)
+        self.assertEqual(dedup.get_stats()['memory_hits'], 1)
+
+    def test_dynamodb_hit(self):
+        """Test that a retry on another container is caught by the conditional put"""
+        table = FakeDedupTable()
+        first = EventDeduplicator(table=table)
+        second = EventDeduplicator(table=table)
+
+        self.assertTrue(first.claim('Ev1'))
+        self.assertFalse(second.claim('Ev1'))
+        self.assertFalse(second.claim('Ev1'))
+
+        stats = second.get_stats()
+        self.assertEqual(stats['dynamodb_hits'], 1)
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['duplicates'], 2)
+
+    def test_dynamodb_error_forwards(self):
+        """Test that the event is forwarded if DynamoDB fails"""
+        dedup = EventDeduplicator(table=FakeDedupTable(fail_with='ProvisionedThroughputExceededException'))
+
+        self.assertTrue(dedup.claim('Ev1'))
+        self.assertEqual(dedup.get_stats()['errors'], 1)
+
+    def test_unreachable_dynamodb_forwards(self):
+        """Test that connection errors fail open too, in claim and in release"""
+        class UnreachableTable():
+            def put_item(self, **kwargs):
+                raise EndpointConnectionError(endpoint_url='https://dynamodb.eu-west-1.amazonaws.com')
+
+            def delete_item(self, **kwargs):
+                raise EndpointConnectionError(endpoint_url='https://dynamodb.eu-west-1.amazonaws.com')
+
+        dedup = EventDeduplicator(table=UnreachableTable())
+
+        self.assertTrue(dedup.claim('Ev1'))
+        self.assertEqual(dedup.get_stats()['errors'], 1)
+        dedup.release('Ev1')
+        self.assertTrue(dedup.claim('Ev1'))
+
+    def test_lru_is_bounded(self):
+        dedup = EventDeduplicator(table_name=None, max_size=2)
+
+        for event_id in ['Ev1', 'Ev2', 'Ev3']:
+            dedup.claim(event_id)
+
+        self.assertEqual(list(dedup.seen), ['Ev2', 'Ev3'])
+        self.assertTrue(dedup.claim('Ev1'))
+
+    def test_release(self):
+        table = FakeDedupTable()
+        dedup = EventDeduplicator(table=table)
+
+        dedup.claim('Ev1')
+        dedup.release('Ev1')
+
+        self.assertNotIn('Ev1', table.items)
+        self.assertTrue(dedup.claim('Ev1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'automator'))
+sys.path.insert(0, os.path.join(ROOT, 'moderator'))
+sys.path.insert(0, os.path.join(ROOT, 'common'))
+sys.path.insert(0, os.path.join(ROOT, 'integration_tests'))
+
+import groqu
+import slack
+import slack_client
+import slack_moderator
+from fake_api import FakeApiState, start_fake_api
+
+NO_RATE_LIMITS = {tier: 10 ** 6 for tier in slack_client.RATE_LIMIT_TIERS}
+
+
+class TestFakeApi(unittest.TestCase):
+    """The Slack and Groq clients against the local fake API"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = start_fake_api(retry_after=0.01)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.state = FakeApiState()
+        self.state = self.server.state
+
+        slack_client.clients.clear()
+        self.addCleanup(slack_client.clients.clear)
+        for token in {slack.SLACK_TOKEN, slack.USER_SLACK_TOKEN}:
+            slack_client.clients[token] = slack_client.SlackClient(
+                token, base_url=self.server.slack_url, rate_limits=NO_RATE_LIMITS
+            )
+        slack.message_cache.clear()
+
+    def test_thread_is_read_page_by_page(self):
+        parent_ts = self.state.add_thread('C1', replies=25)
+
+        pages = list(slack.iter_thread_pages('C1', parent_ts, limit=10))
+
+        self.assertEqual([len(page) for page in pages], [10, 10, 6])
+        snapshot = slack.get_thread_snapshot('C1', parent_ts)
+        self.assertEqual(len(snapshot.replies), 25)
+        self.assertEqual(self.state.calls['conversations.replies'], 4)
+
+    def test_posted_and_deleted_messages_are_stored(self):
+        parent_ts = self.state.add_thread('C1', replies=2)
+
+        response = slack.post_message_thread({'item': {'channel': 'C1', 'ts': parent_ts}}, 'hello')
+        slack.update_message('C1', response['ts'], 'hello again')
+        slack.remove_message('C1', parent_ts)
+
+        message = self.state.get_message('C1', response['ts'])
+        self.assertEqual(message['thread_ts'], parent_ts)
+        self.assertEqual(message['text'], 'hello again')
+        self.assertEqual(self.state.deleted, [('C1', parent_ts)])
+        self.assertFalse(slack_client.get_client(slack.USER_SLACK_TOKEN).try_post(
+            'chat.delete', {'channel': 'C1', 'ts': parent_ts})['ok'])
+
+    def test_dm_goes_to_dm_channel(self):
+        response = slack.send_dm('U123', 'your message was removed')
+
+        self.assertEqual(response['channel'], 'D123')
+
+    def test_429s_are_retried(self):
+        ts = [self.state.add_message('C1', f'spam {i}', user='U_SPAM') for i in range(3)]
+        self.server.inject_429('chat.delete', times=2)
+
+        result = slack_moderator.delete_messages([{'channel_id': 'C1', 'message_ts': t} for t in ts])
+
+        self.assertEqual(len(result['success']), 3)
+        self.assertEqual(self.state.calls['429'], 2)
+        self.assertEqual(self.state.messages['C1'], {})
+
+    def test_session_invalidation(self):
+        self.assertTrue(slack_moderator.deactivate_user('U_SPAM')['ok'])
+        self.assertEqual(self.state.invalidated_sessions, ['U_SPAM'])
+
+    def test_groq_completion_and_stream(self):
+        self.state.answer = lambda model, messages: f'Use docker run, {model}'
+
+        with patch.object(groqu, 'GROQ_API_URL', self.server.groq_url):
+            answer = groqu.ai_request('How do I start a container?', 'model-a')
+            chunks = list(groqu.ai_request_stream('How do I start a container?', 'model-b'))
+
+        self.assertEqual(answer, 'Use docker run, model-a')
+        self.assertEqual(''.join(chunks), 'Use docker run, model-b')
+        self.assertGreater(len(chunks), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'automator'))
 
 import unittest
 
-from util import format_message
+from util import format_message, MessageTemplate, compile_template
 
 
 class TestFormatMessageWithPlaceholders(unittest.TestCase):
@@ -80,5 +80,83 @@ class TestFormatMessageWithPlaceholders(unittest.TestCase):
         result = format_message(template, placeholders, "any_channel")
         self.assertEqual(result, expected_result)
 
+
+LINK = {
+    "channel1": "http://channel1.com",
+    "channel2": "http://channel2.com",
+    "default": "http://default.com",
+}
+
+# (template, configured placeholders, per-event values, channel)
+EQUIVALENCE_CASES = [
+    ("Hello, {name}!", {"name": "Alice"}, None, "any_channel"),
+    ("{greeting}, {name}! Welcome to {channel}.", {"greeting": "Hello", "name": "Bob", "channel": "DataTalks"}, None, "c"),
+    ("Check out this link: {link}", {"link": LINK}, None, "channel1"),
+    ("Check out this link: {link}", {"link": LINK}, None, "channel3"),
+    ("Check out this link: {link}", {"link": {"channel1": "x"}}, None, "channel2"),
+    ("Hello, {name}! Check out {link} for {channel} info.", {"name": "Charlie", "link": LINK, "channel": "DataTalks"}, None, "channel2"),
+    ("hello, user!\n\n>{message}\n\nThank you!", {}, {"message": "This is a quote."}, "c"),
+    ("hello, user!\n\n>{message}\n\nThank you!", {}, {"message": "Line1\nLine2\nLine3"}, "c"),
+    ("hello!\n\n> {message}  \n", {}, {"message": "  Line1\nLine2\n\n"}, "c"),
+    ("hello!\n>{message}", {}, {"message": "Line1\nLine2"}, "c"),
+    (">{a}\n>{b}\n", {}, {"a": "1\n2", "b": "3"}, "c"),
+    # quoted values go through str.format in format_message
+    (">{message}\n", {}, {"message": "x = {user}\ny", "user": "U1"}, "c"),
+    (">{message}\n", {}, {"message": "{{braces}}\n}}"}, "c"),
+    ("{{literal}} {user!r} {count:>5} {user!s:.2}", {"count": 7}, {"user": "U123"}, "c"),
+    ("Hi <@{user}>!\n\nYou posted in <#{channel}>:\n\n> {user_message}\n\nThanks, see <{link}|here>",
+     {"link": LINK}, {"user": "U1", "channel": "channel2", "user_message": "a\nb\nc"}, "channel2"),
+    # the configured placeholders win over the per-event ones
+    ("{user}", {"user": "configured"}, {"user": "event"}, "c"),
+]
+
+
+class TestMessageTemplate(unittest.TestCase):
+
+    def legacy(self, template, placeholders, values, channel):
+        merged = dict(values or {})
+        merged.update(placeholders)
+        return format_message(template, merged, channel)
+
+    def test_same_output_as_format_message(self):
+        for template, placeholders, values, channel in EQUIVALENCE_CASES:
+            with self.subTest(template=template, values=values):
+                expected = self.legacy(template, placeholders, values, channel)
+                result = MessageTemplate(template, placeholders).render(channel, values)
+                self.assertEqual(result, expected)
+
+    def test_same_errors_as_format_message(self):
+        cases = [
+            ("Hello, {name}!", {}, None),
+            (">{message}\n", {}, {"message": "{oops\nx"}),
+            ("{a.b}", {}, {"a": "x"}),
+            ("unbalanced {", {}, None),
+        ]
+        for template, placeholders, values in cases:
+            with self.subTest(template=template):
+                with self.assertRaises(Exception) as expected:
+                    self.legacy(template, placeholders, values, "c")
+                with self.assertRaises(type(expected.exception)):
+                    MessageTemplate(template, placeholders).render("c", values)
+
+    def test_plan(self):
+        plan = compile_template("Hi {user}!\n\n> {user_message}\n\nBye")
+
+        self.assertEqual(plan, [
+            "Hi ", ("user", None, ""), "!\n\n",
+            ("quote", "user_message", ["> ", ("user_message", None, ""), "\n"]),
+            "\nBye",
+        ])
+        self.assertIsNone(compile_template("{a[0]}"))
+        self.assertIsNone(compile_template("}"))
+
+    def test_channel_values_resolved_once(self):
+        template = MessageTemplate("{link}", {"link": LINK})
+
+        self.assertEqual(template.render("channel1"), "http://channel1.com")
+        self.assertEqual(template.render("channel1"), "http://channel1.com")
+        self.assertEqual(template.channel_values, {"channel1": {"link": "http://channel1.com"}})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,271 @@
+import sys
+import os
+import time
+import unittest
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'automator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import requests
+from botocore.exceptions import ClientError
+
+import groqu
+
+
+def http_error(status, headers=None):
+    response = MagicMock()
+    response.status_code = status
+    response.headers = headers or {}
+    return requests.HTTPError(f'{status} error', response=response)
+
+
+class TestCachedAiRequest(unittest.TestCase):
+
+    def setUp(self):
+        groqu.response_cache.clear()
+        for key in groqu.cache_stats:
+            groqu.cache_stats[key] = 0
+
+    def test_cache_key_normalizes_prompt(self):
+        """Test that case and whitespace don't change the key, but the model does"""
+        key = groqu.cache_key('How do I  install\nDocker?', 'model-a')
+
+        self.assertEqual(key, groqu.cache_key('how do i install docker?', 'model-a'))
+        self.assertNotEqual(key, groqu.cache_key('how do i install docker?', 'model-b'))
+
+    @patch('groqu.ai_request')
+    def test_memory_cache(self, mock_ai_request):
+        """Test that the same question is answered from memory the second time"""
+        mock_ai_request.return_value = 'Use apt.'
+
+        first = groqu.cached_ai_request('How to install Docker?', 'model-a')
+        second = groqu.cached_ai_request('how to install docker? ', 'model-a')
+
+        self.assertEqual(first, 'Use apt.')
+        self.assertEqual(second, 'Use apt.')
+        mock_ai_request.assert_called_once()
+
+        stats = groqu.get_cache_stats()
+        self.assertEqual(stats['memory_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertGreaterEqual(stats['saved_seconds'], 0)
+
+    @patch('groqu.ai_request')
+    @patch('groqu.get_cache_table')
+    def test_dynamodb_cache(self, mock_get_cache_table, mock_ai_request):
+        """Test that a response stored by another container is reused"""
+        key = groqu.cache_key('question', 'model-a')
+        mock_get_cache_table.return_value.get_item.return_value = {
+            # boto3 returns numbers as Decimal
+            'Item': {
+                'cache_key': key, 'response': 'answer',
+                'latency': Decimal('2.5'), 'ttl': Decimal(int(time.time()) + 60)
+            }
+        }
+
+        with patch.object(groqu, 'AI_CACHE_TABLE', 'ai-cache'):
+            result = groqu.cached_ai_request('question', 'model-a')
+
+        self.assertEqual(result, 'answer')
+        mock_ai_request.assert_not_called()
+        self.assertEqual(groqu.cache_stats['dynamodb_hits'], 1)
+        self.assertEqual(groqu.cache_stats['saved_seconds'], 2.5)
+
+    @patch('groqu.ai_request')
+    @patch('groqu.get_cache_table')
+    def test_miss_is_stored_in_dynamodb_with_ttl(self, mock_get_cache_table, mock_ai_request):
+        """Test that a new response is written to DynamoDB with the reaction's TTL"""
+        mock_get_cache_table.return_value.get_item.return_value = {}
+        mock_ai_request.return_value = 'answer'
+
+        with patch.object(groqu, 'AI_CACHE_TABLE', 'ai-cache'):
+            groqu.cached_ai_request('question', 'model-a', ttl=3600)
+
+        item = mock_get_cache_table.return_value.put_item.call_args[1]['Item']
+        self.assertEqual(item['cache_key'], groqu.cache_key('question', 'model-a'))
+        self.assertEqual(item['response'], 'answer')
+        self.assertAlmostEqual(item['ttl'], int(time.time()) + 3600, delta=2)
+
+
+    @patch('groqu.ai_request')
+    @patch('groqu.get_cache_table')
+    def test_dynamodb_errors_fail_open(self, mock_get_cache_table, mock_ai_request):
+        """Test that the model is still asked when the cache table can't be read or written"""
+        error = ClientError({'Error': {'Code': 'ResourceNotFoundException'}}, 'GetItem')
+        mock_get_cache_table.return_value.get_item.side_effect = error
+        mock_get_cache_table.return_value.put_item.side_effect = error
+        mock_ai_request.return_value = 'answer'
+
+        with patch.object(groqu, 'AI_CACHE_TABLE', 'ai-cache'):
+            result = groqu.cached_ai_request('question', 'model-a')
+
+        self.assertEqual(result, 'answer')
+        self.assertEqual(groqu.cache_stats['misses'], 1)
+
+
+class TestAiRequestStream(unittest.TestCase):
+
+    @patch('groqu.requests.post')
+    def test_stream_yields_content_deltas(self, mock_post):
+        """Test that the SSE stream is parsed into content pieces"""
+        lines = [
+            'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+            '',
+            'data: {"choices": [{"delta": {"content": "Hello"}}]}',
+            ': keep-alive',
+            'data: {"choices": [{"delta": {"content": " world"}}]}',
+            'data: [DONE]',
+            'data: {"choices": [{"delta": {"content": "ignored"}}]}',
+        ]
+        response = mock_post.return_value.__enter__.return_value
+        response.iter_lines.return_value = iter(lines)
+
+        chunks = list(groqu.ai_request_stream('question', 'model-a'))
+
+        self.assertEqual(chunks, ['Hello', ' world'])
+        self.assertTrue(mock_post.call_args[1]['json']['stream'])
+        self.assertTrue(mock_post.call_args[1]['stream'])
+        self.assertEqual(mock_post.call_args[1]['timeout'], groqu.AI_TIMEOUT)
+
+    @patch('groqu.ai_request_stream')
+    def test_stream_falls_back_to_next_model(self, mock_stream):
+        """Test that the next model streams the answer when the first one fails to start"""
+        def stream(prompt, model, timeout):
+            if model == 'model-a':
+                raise requests.ConnectionError('connection refused')
+            yield 'Hello'
+            yield ' world'
+
+        mock_stream.side_effect = stream
+
+        chunks = list(groqu.resilient_ai_request_stream('question', ['model-a', 'model-b'], 5))
+
+        self.assertEqual(chunks, ['Hello', ' world'])
+        self.assertEqual([c[0][1] for c in mock_stream.call_args_list], ['model-a', 'model-b'])
+
+    @patch('groqu.ai_request_stream')
+    def test_stream_error_after_first_chunk_is_raised(self, mock_stream):
+        """Test that a stream that already showed text is not restarted on another model"""
+        def stream(prompt, model, timeout):
+            yield 'Hello'
+            raise requests.ConnectionError('connection reset')
+
+        mock_stream.side_effect = stream
+
+        chunks = []
+        with self.assertRaises(requests.ConnectionError):
+            for chunk in groqu.resilient_ai_request_stream('question', ['model-a', 'model-b'], 5):
+                chunks.append(chunk)
+
+        self.assertEqual(chunks, ['Hello'])
+        mock_stream.assert_called_once()
+
+    @patch('groqu.ai_request_stream')
+    def test_stream_all_models_failing(self, mock_stream):
+        """Test that AiRequestError is raised when no model starts streaming"""
+        mock_stream.side_effect = requests.HTTPError('503')
+
+        with self.assertRaises(groqu.AiRequestError):
+            list(groqu.resilient_ai_request_stream('question', ['model-a', 'model-b'], 5))
+
+
+class TestResilientAiRequest(unittest.TestCase):
+
+    def setUp(self):
+        groqu.latency_history.clear()
+        patcher = patch('groqu.time.sleep')
+        self.mock_sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('groqu.ai_request')
+    def test_retries_429_and_5xx(self, mock_ai_request):
+        """Test that rate limits and server errors are retried, honoring Retry-After"""
+        mock_ai_request.side_effect = [http_error(429, {'Retry-After': '2'}), http_error(503), 'answer']
+
+        answer, info = groqu.resilient_ai_request('q', ['model-a'], max_retries=2)
+
+        self.assertEqual(answer, 'answer')
+        self.assertEqual(info['model'], 'model-a')
+        self.assertEqual(mock_ai_request.call_count, 3)
+        self.assertGreaterEqual(self.mock_sleep.call_args_list[0][0][0], 2)
+
+    @patch('groqu.ai_request')
+    def test_client_errors_are_not_retried(self, mock_ai_request):
+        """Test that a 400 goes straight to the next model"""
+        mock_ai_request.side_effect = [http_error(400), 'fallback answer']
+
+        answer, info = groqu.resilient_ai_request('q', ['model-a', 'model-b'], max_retries=2)
+
+        self.assertEqual(answer, 'fallback answer')
+        self.assertEqual(info['model'], 'model-b')
+        self.assertEqual(len(info['errors']), 1)
+        self.assertEqual([c[0][1] for c in mock_ai_request.call_args_list], ['model-a', 'model-b'])
+
+    @patch('groqu.ai_request')
+    def test_all_models_fail(self, mock_ai_request):
+        """Test that an error is raised when no model answers, timeouts going to the next model"""
+        mock_ai_request.side_effect = requests.Timeout('too slow')
+
+        with self.assertRaises(groqu.AiRequestError):
+            groqu.resilient_ai_request('q', ['model-a', 'model-b'], max_retries=1)
+
+        self.assertEqual([c[0][1] for c in mock_ai_request.call_args_list], ['model-a', 'model-b'])
+
+    @patch('groqu.time.perf_counter')
+    @patch('groqu.ai_request')
+    def test_deadline_caps_the_chain(self, mock_ai_request, mock_perf_counter):
+        """Test that requests are cut to the time left and no model is asked after the deadline"""
+        clock = {'now': 100.0}
+        mock_perf_counter.side_effect = lambda: clock['now']
+
+        def request(prompt, model, timeout):
+            clock['now'] += 8
+            raise http_error(503)
+
+        mock_ai_request.side_effect = request
+
+        with self.assertRaises(groqu.AiRequestError) as raised:
+            groqu.resilient_ai_request('q', ['model-a', 'model-b'], timeout=20, max_retries=2, deadline=20)
+
+        timeouts = [c[0][2] for c in mock_ai_request.call_args_list]
+        self.assertEqual(timeouts, [20, 12, 4])
+        self.assertIn('model-b: deadline exceeded', str(raised.exception))
+
+    @patch('groqu.ai_request')
+    def test_hedged_request_uses_faster_fallback(self, mock_ai_request):
+        """Test that the fallback is asked when the primary is slower than its percentile"""
+        import threading
+        release = threading.Event()
+
+        def request(prompt, model, timeout):
+            if model == 'slow':
+                release.wait(5)
+                return 'slow answer'
+            return 'fast answer'
+
+        mock_ai_request.side_effect = request
+        groqu.latency_history['slow'] = groqu.deque([0.01] * 10)
+
+        try:
+            answer, info = groqu.resilient_ai_request('q', ['slow', 'fast'], hedge_percentile=90)
+        finally:
+            release.set()
+
+        self.assertEqual(answer, 'fast answer')
+        self.assertEqual(info['model'], 'fast')
+        self.assertTrue(info['hedged'])
+
+    def test_hedge_delay_percentile(self):
+        """Test that the hedge delay comes from the latency history"""
+        self.assertEqual(groqu.hedge_delay('new-model', 90), groqu.AI_HEDGE_DEFAULT_SECONDS)
+
+        groqu.latency_history['model-a'] = groqu.deque([i / 10 for i in range(1, 11)])
+        self.assertEqual(groqu.hedge_delay('model-a', 90), 1.0)
+        self.assertEqual(groqu.hedge_delay('model-a', 50), 0.6)
+
+
+if __name__ == '__main__':
+    unittest.main()
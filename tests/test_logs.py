@@ -0,0 +1,117 @@
+import sys
+import os
+import io
+import json
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import logs
+from logs import Logger
+
+
+def capture(fn):
+    """Records logged by fn, parsed"""
+    with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+        fn()
+    return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+
+class Unformattable():
+
+    def __str__(self):
+        raise AssertionError('formatted a disabled log record')
+
+
+class TestLogger(unittest.TestCase):
+
+    def test_one_json_line_per_record(self):
+        logger = Logger(level='INFO')
+
+        records = capture(lambda: logger.info('reply %s\nfailed', 'a', channel='C1'))
+
+        self.assertEqual(records, [{'level': 'info', 'message': 'reply a\nfailed', 'channel': 'C1'}])
+
+    def test_disabled_levels_are_not_formatted(self):
+        logger = Logger(level='WARNING')
+
+        records = capture(lambda: (
+            logger.debug('value %s', Unformattable()),
+            logger.info('value %s', Unformattable()),
+            logger.error('error %s', 'x'),
+        ))
+
+        self.assertEqual([r['level'] for r in records], ['error'])
+        self.assertFalse(logger.is_enabled(logs.INFO))
+
+    def test_exception_has_traceback(self):
+        logger = Logger(level='INFO')
+
+        def fail():
+            try:
+                raise ValueError('boom')
+            except ValueError as e:
+                logger.exception('failed: %s', e)
+
+        records = capture(fail)
+
+        self.assertEqual(records[0]['message'], 'failed: boom')
+        self.assertIn('ValueError: boom', records[0]['traceback'])
+
+
+class TestPayload(unittest.TestCase):
+
+    def body(self, event_type):
+        return {
+            'event_id': 'Ev1',
+            'event': {'type': event_type, 'user': 'U1', 'text': 'my secret question'},
+        }
+
+    def test_sampled_per_event_type(self):
+        logger = Logger(level='INFO', sampling='reaction_added=1,message=0.5,default=0')
+
+        logger.random = lambda: 0.7
+        records = capture(lambda: [
+            logger.payload(self.body('reaction_added')),
+            logger.payload(self.body('message')),
+            logger.payload(self.body('app_mention')),
+        ])
+        self.assertEqual([r['event_type'] for r in records], ['reaction_added'])
+
+        logger.random = lambda: 0.3
+        records = capture(lambda: logger.payload(self.body('message')))
+        self.assertEqual([r['event_type'] for r in records], ['message'])
+
+    def test_debug_logs_every_payload(self):
+        logger = Logger(level='DEBUG', sampling='default=0')
+
+        records = capture(lambda: logger.payload(self.body('message')))
+
+        self.assertEqual(len(records), 1)
+
+    def test_message_text_is_redacted(self):
+        logger = Logger(level='INFO', sampling='default=1')
+        interactive = {'payload': json.dumps({'message': {'text': 'alert', 'blocks': [{'type': 'section'}]}})}
+
+        records = capture(lambda: [
+            logger.payload(self.body('message')),
+            logger.payload(interactive),
+        ])
+
+        event = records[0]['payload']['event']
+        self.assertEqual(event['text'], '<redacted 18 chars>')
+        self.assertEqual(event['user'], 'U1')
+        self.assertEqual(records[1]['event_type'], 'interactive')
+        self.assertEqual(records[1]['payload']['payload']['message'], {'text': '<redacted 5 chars>', 'blocks': '<redacted>'})
+
+    def test_redaction_can_be_turned_off(self):
+        logger = Logger(level='INFO', sampling='default=1', redact_payloads=False)
+
+        records = capture(lambda: logger.payload(self.body('message')))
+
+        self.assertEqual(records[0]['payload']['event']['text'], 'my secret question')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,14 @@ import os
 import unittest
 from unittest.mock import patch, MagicMock
 import time
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Add moderator directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'moderator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
 
 import message_tracker
 
@@ -20,14 +25,14 @@ class TestMessageTracker(unittest.TestCase):
         os.environ['MESSAGE_THRESHOLD'] = '5'
         os.environ['TIME_WINDOW_SECONDS'] = '180'
     
-    @patch('message_tracker.ensure_table_exists')
+    @patch('message_tracker.get_table')
     @patch('message_tracker.get_dynamodb_resource')
-    def test_track_message_below_threshold(self, mock_get_resource, mock_ensure_table):
+    def test_track_message_below_threshold(self, mock_get_resource, mock_get_table):
         """Test tracking a message that doesn't exceed threshold"""
         # Mock DynamoDB table
         mock_table = MagicMock()
         mock_table.get_item.return_value = {'Item': {'messages': []}}
-        mock_ensure_table.return_value = mock_table
+        mock_get_table.return_value = mock_table
         
         result = message_tracker.track_message(
             'U123456',
@@ -40,9 +45,9 @@ class TestMessageTracker(unittest.TestCase):
         self.assertEqual(result['message_count'], 1)
         self.assertEqual(result['messages'], [])
     
-    @patch('message_tracker.ensure_table_exists')
+    @patch('message_tracker.get_table')
     @patch('message_tracker.get_dynamodb_resource')
-    def test_track_message_exceeds_threshold(self, mock_get_resource, mock_ensure_table):
+    def test_track_message_exceeds_threshold(self, mock_get_resource, mock_get_table):
         """Test tracking messages that exceed threshold"""
         # Mock DynamoDB table with existing messages
         current_time = int(time.time())
@@ -75,7 +80,7 @@ class TestMessageTracker(unittest.TestCase):
         
         mock_table = MagicMock()
         mock_table.get_item.return_value = {'Item': {'messages': existing_messages}}
-        mock_ensure_table.return_value = mock_table
+        mock_get_table.return_value = mock_table
         
         result = message_tracker.track_message(
             'U123456',
@@ -88,9 +93,9 @@ class TestMessageTracker(unittest.TestCase):
         self.assertEqual(result['message_count'], 5)
         self.assertEqual(len(result['messages']), 5)
     
-    @patch('message_tracker.ensure_table_exists')
+    @patch('message_tracker.get_table')
     @patch('message_tracker.get_dynamodb_resource')
-    def test_old_messages_filtered_out(self, mock_get_resource, mock_ensure_table):
+    def test_old_messages_filtered_out(self, mock_get_resource, mock_get_table):
         """Test that messages older than time window are filtered out"""
         current_time = int(time.time())
         
@@ -112,7 +117,7 @@ class TestMessageTracker(unittest.TestCase):
         
         mock_table = MagicMock()
         mock_table.get_item.return_value = {'Item': {'messages': existing_messages}}
-        mock_ensure_table.return_value = mock_table
+        mock_get_table.return_value = mock_table
         
         result = message_tracker.track_message(
             'U123456',
@@ -125,20 +130,24 @@ class TestMessageTracker(unittest.TestCase):
         self.assertEqual(result['message_count'], 2)
         self.assertFalse(result['exceeded'])
     
-    @patch('message_tracker.ensure_table_exists')
+    @patch('message_tracker.get_table')
     @patch('message_tracker.get_dynamodb_resource')
-    def test_clear_user_messages(self, mock_get_resource, mock_ensure_table):
+    def test_clear_user_messages(self, mock_get_resource, mock_get_table):
         """Test clearing all messages for a user"""
         mock_table = MagicMock()
-        mock_ensure_table.return_value = mock_table
+        mock_get_table.return_value = mock_table
         
         message_tracker.clear_user_messages('U123456')
         
-        mock_table.delete_item.assert_called_once_with(Key={'user_id': 'U123456'})
+        kwargs = mock_table.update_item.call_args[1]
+        self.assertEqual(kwargs['Key'], {'user_id': 'U123456'})
+        self.assertEqual(kwargs['ExpressionAttributeValues'][':empty'], [])
+        self.assertIn('ADD #version :one', kwargs['UpdateExpression'])
+        mock_table.delete_item.assert_not_called()
     
-    @patch('message_tracker.ensure_table_exists')
+    @patch('message_tracker.get_table')
     @patch('message_tracker.get_dynamodb_resource')
-    def test_get_user_messages(self, mock_get_resource, mock_ensure_table):
+    def test_get_user_messages(self, mock_get_resource, mock_get_table):
         """Test retrieving messages for a user"""
         messages = [
             {
@@ -151,12 +160,481 @@ class TestMessageTracker(unittest.TestCase):
         
         mock_table = MagicMock()
         mock_table.get_item.return_value = {'Item': {'messages': messages}}
-        mock_ensure_table.return_value = mock_table
+        mock_get_table.return_value = mock_table
         
         result = message_tracker.get_user_messages('U123456')
         
         self.assertEqual(result, messages)
 
 
+def stubbed_resource():
+    """A real boto3 resource whose client is answered by a Stubber"""
+    import boto3
+    from botocore.stub import Stubber
+
+    resource = boto3.resource(
+        'dynamodb', region_name='us-east-1', aws_access_key_id='test', aws_secret_access_key='test'
+    )
+    stubber = Stubber(resource.meta.client)
+    stubber.activate()
+    return resource, stubber
+
+
+TABLE_DESCRIPTION = {
+    'Table': {
+        'TableName': 'test-table',
+        'TableStatus': 'ACTIVE',
+        'KeySchema': [{'AttributeName': 'user_id', 'KeyType': 'HASH'}],
+    }
+}
+
+
+class TestTableManager(unittest.TestCase):
+
+    def test_hot_path_makes_no_control_plane_calls(self):
+        """Test that the hot path reuses one table handle without DescribeTable"""
+        resource, stubber = stubbed_resource()
+        stubber.add_response('put_item', {})
+        stubber.add_response('get_item', {'Item': {'user_id': {'S': 'U1'}}})
+
+        manager = message_tracker.TableManager('test-table', [], [])
+        with patch('message_tracker.get_dynamodb_resource', return_value=resource) as mock_get_resource:
+            table = manager.get_table()
+            self.assertIs(manager.get_table(), table)
+
+            table.put_item(Item={'user_id': 'U1'})
+            table.get_item(Key={'user_id': 'U1'})
+
+        mock_get_resource.assert_called_once()
+        stubber.assert_no_pending_responses()
+        self.assertEqual(manager.control_plane_calls, 0)
+
+    def test_control_plane_calls_are_counted_from_the_client(self):
+        """Test that a DescribeTable anywhere, e.g. a table.load(), shows up in the counter"""
+        resource, stubber = stubbed_resource()
+        stubber.add_response('describe_table', TABLE_DESCRIPTION)
+
+        manager = message_tracker.TableManager('test-table', [], [])
+        with patch('message_tracker.get_dynamodb_resource', return_value=resource):
+            manager.get_table().load()
+
+        self.assertEqual(manager.control_plane_calls, 1)
+
+    def test_bootstrap_creates_missing_table(self):
+        """Test that bootstrap creates the table when it doesn't exist"""
+        resource, stubber = stubbed_resource()
+        stubber.add_client_error('describe_table', 'ResourceNotFoundException')
+        stubber.add_response('create_table', {'TableDescription': TABLE_DESCRIPTION['Table']})
+        stubber.add_response('describe_table', TABLE_DESCRIPTION)
+        stubber.add_response('update_time_to_live', {})
+
+        manager = message_tracker.TableManager(
+            'test-table',
+            key_schema=[{'AttributeName': 'user_id', 'KeyType': 'HASH'}],
+            attribute_definitions=[{'AttributeName': 'user_id', 'AttributeType': 'S'}],
+            ttl_attribute='ttl'
+        )
+        with patch('message_tracker.get_dynamodb_resource', return_value=resource):
+            table = manager.bootstrap()
+
+        stubber.assert_no_pending_responses()
+        self.assertIs(manager.get_table(), table)
+        # DescribeTable, CreateTable, DescribeTable of the waiter, UpdateTimeToLive
+        self.assertEqual(manager.control_plane_calls, 4)
+
+
+class FakeTable():
+    """
+    In-memory stand-in for a DynamoDB table. Understands the
+    update_item call made by track_message_update.
+    """
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+        self.conflicts = 0
+
+    def get_item(self, Key, ConsistentRead=False):
+        with self.lock:
+            item = self.items.get(Key['user_id'])
+            return {'Item': copy.deepcopy(item)} if item else {}
+
+    def delete_item(self, Key):
+        with self.lock:
+            self.items.pop(Key['user_id'], None)
+
+    def update_item(self, Key, ExpressionAttributeValues, ConditionExpression, **kwargs):
+        from boto3.dynamodb.types import TypeSerializer
+        from botocore.exceptions import ClientError
+
+        values = ExpressionAttributeValues
+
+        with self.lock:
+            item = self.items.get(Key['user_id'])
+
+            # clear_user_messages
+            if ':empty' in values:
+                if item is None:
+                    raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+                item['messages'] = []
+                item['version'] = item.get('version', 0) + values[':one']
+                item['last_updated'] = values[':now']
+                return {}
+
+            if ConditionExpression == 'attribute_not_exists(user_id)':
+                ok = item is None
+            elif ConditionExpression == 'attribute_exists(user_id) AND attribute_not_exists(#version)':
+                ok = item is not None and 'version' not in item
+            else:
+                ok = item is not None and item['version'] == values[':version']
+
+            if not ok:
+                self.conflicts += 1
+                error = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+                if item is not None:
+                    serializer = TypeSerializer()
+                    error['Item'] = {k: serializer.serialize(v) for k, v in item.items()}
+                raise ClientError(error, 'UpdateItem')
+
+            item = {
+                'user_id': Key['user_id'],
+                'messages': copy.deepcopy(values[':messages']),
+                'version': values[':next_version'],
+                'last_updated': values[':now'],
+            }
+            self.items[Key['user_id']] = item
+            return {'Attributes': copy.deepcopy(item)}
+
+
+class ContainerKnownItems(threading.local):
+    """known_items with a separate cache per thread, like separate containers"""
+
+    def __init__(self):
+        self.items = OrderedDict()
+
+    def get(self, key, default=None):
+        return self.items.get(key, default)
+
+    def pop(self, key, default=None):
+        return self.items.pop(key, default)
+
+    def __setitem__(self, key, value):
+        self.items[key] = value
+
+    def __len__(self):
+        return len(self.items)
+
+    def move_to_end(self, key):
+        self.items.move_to_end(key)
+
+    def popitem(self, last=True):
+        return self.items.popitem(last=last)
+
+
+class TestTrackMessageUpdate(unittest.TestCase):
+
+    def setUp(self):
+        message_tracker.known_items.clear()
+        self.table = FakeTable()
+
+        patchers = [
+            patch('message_tracker.get_table', return_value=self.table),
+            patch.object(message_tracker, 'TRACKING_MODE', 'update'),
+            patch.object(message_tracker, 'MAX_UPDATE_RETRIES', 100),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_update_uses_single_request(self):
+        """Test that a message is tracked with one update_item and no reads"""
+        self.table.get_item = MagicMock(side_effect=AssertionError('no reads expected'))
+
+        for i in range(5):
+            result = message_tracker.track_message('U1', 'C1', f'{i}.1', f'Msg {i}')
+
+        self.assertTrue(result['exceeded'])
+        self.assertEqual(result['message_count'], 5)
+        self.assertEqual(self.table.conflicts, 0)
+
+    def test_update_trims_expired_messages(self):
+        """Test that expired messages are dropped in the same update"""
+        current_time = int(time.time())
+        self.table.items['U1'] = {
+            'user_id': 'U1',
+            'version': 3,
+            'messages': [
+                {'timestamp': current_time - 200, 'channel_id': 'C1', 'message_ts': '1.1', 'message_text': 'old'},
+                {'timestamp': current_time - 60, 'channel_id': 'C1', 'message_ts': '2.1', 'message_text': 'recent'},
+            ],
+        }
+
+        result = message_tracker.track_message('U1', 'C1', '3.1', 'new')
+
+        self.assertEqual(result['message_count'], 2)
+        stored = self.table.items['U1']
+        self.assertEqual([m['message_ts'] for m in stored['messages']], ['2.1', '3.1'])
+        self.assertEqual(stored['version'], 4)
+
+    def test_item_written_by_get_put(self):
+        """Test that switching to update mode works for items without a version"""
+        current_time = int(time.time())
+        self.table.items['U1'] = {
+            'user_id': 'U1',
+            'messages': [
+                {'timestamp': current_time - 60, 'channel_id': 'C1', 'message_ts': '1.1', 'message_text': 'old'},
+            ],
+            'last_updated': current_time - 60,
+        }
+
+        result = message_tracker.track_message('U1', 'C1', '2.1', 'new')
+
+        self.assertEqual(result['message_count'], 2)
+        self.assertEqual(self.table.items['U1']['version'], 1)
+        self.assertEqual(self.table.conflicts, 1)
+
+    def test_no_lost_updates_with_parallel_writers(self):
+        """Test that concurrent writers for the same user don't overwrite each other"""
+        writers = 8
+        per_writer = 25
+
+        def write(writer):
+            for i in range(per_writer):
+                # every writer is a separate container with its own cache
+                message_tracker.known_items.pop('U1', None)
+                message_tracker.track_message('U1', 'C1', f'{writer}.{i}', 'spam')
+
+        with ThreadPoolExecutor(max_workers=writers) as executor:
+            list(executor.map(write, range(writers)))
+
+        stored = self.table.items['U1']
+        self.assertEqual(len(stored['messages']), writers * per_writer)
+        self.assertEqual(stored['version'], writers * per_writer)
+        self.assertEqual(len({m['message_ts'] for m in stored['messages']}), writers * per_writer)
+
+    def test_stale_version_after_clear(self):
+        """Test that a writer with a version from before a clear doesn't bring the messages back"""
+        for i in range(3):
+            message_tracker.track_message('U1', 'C1', f'old.{i}', 'spam')
+        stale = message_tracker.known_items['U1']
+
+        message_tracker.clear_user_messages('U1')
+
+        # another container writes as many times as there were writes before the clear
+        for i in range(3):
+            message_tracker.known_items.pop('U1', None)
+            message_tracker.track_message('U1', 'C1', f'new.{i}', 'spam')
+
+        message_tracker.known_items['U1'] = stale
+        message_tracker.track_message('U1', 'C1', 'new.3', 'spam')
+
+        stored = [m['message_ts'] for m in self.table.items['U1']['messages']]
+        self.assertEqual(stored, ['new.0', 'new.1', 'new.2', 'new.3'])
+
+    def test_no_lost_updates_with_parallel_writers_and_clear(self):
+        """Test that writers with their own caches never restore messages cleared in between"""
+        writers = 4
+        per_phase = 10
+        barrier = threading.Barrier(writers + 1)
+
+        def write(writer):
+            for phase in ('before', 'after'):
+                for i in range(per_phase):
+                    message_tracker.track_message('U1', 'C1', f'{phase}.{writer}.{i}', 'spam')
+                barrier.wait()
+                barrier.wait()
+
+        with patch.object(message_tracker, 'known_items', ContainerKnownItems()):
+            with ThreadPoolExecutor(max_workers=writers) as executor:
+                futures = [executor.submit(write, writer) for writer in range(writers)]
+
+                barrier.wait()
+                message_tracker.clear_user_messages('U1')
+                barrier.wait()
+
+                barrier.wait()
+                barrier.wait()
+                for future in futures:
+                    future.result()
+
+        stored = [m['message_ts'] for m in self.table.items['U1']['messages']]
+        self.assertEqual(len(stored), writers * per_phase)
+        self.assertTrue(all(ts.startswith('after.') for ts in stored))
+
+    def test_gives_up_after_max_retries(self):
+        """Test that a permanent conflict raises TrackingConflictError"""
+        self.table.items['U1'] = {'user_id': 'U1', 'version': 1, 'messages': []}
+
+        def always_conflict(**kwargs):
+            from botocore.exceptions import ClientError
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+
+        self.table.update_item = always_conflict
+
+        with patch.object(message_tracker, 'MAX_UPDATE_RETRIES', 3):
+            with self.assertRaises(message_tracker.TrackingConflictError):
+                message_tracker.track_message('U1', 'C1', '1.1', 'msg')
+
+
+class FakeEventsTable():
+    """In-memory stand-in for the per-message table"""
+
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, Item):
+        self.items[(Item['user_id'], Item['message_ts'])] = dict(Item)
+
+    def matches(self, condition, item):
+        expression = condition.get_expression()
+        operator = expression['operator']
+        values = expression['values']
+
+        if operator == 'AND':
+            return all(self.matches(c, item) for c in values)
+
+        key, value = values
+        if operator == '=':
+            return item[key.name] == value
+        if operator == '>':
+            return item[key.name] > value
+        raise NotImplementedError(operator)
+
+    def query(self, KeyConditionExpression, Select=None, **kwargs):
+        items = [
+            dict(item) for _, item in sorted(self.items.items())
+            if self.matches(KeyConditionExpression, item)
+        ]
+        if Select == 'COUNT':
+            return {'Count': len(items)}
+        return {'Count': len(items), 'Items': items}
+
+    def batch_writer(self):
+        table = self
+
+        class Batch():
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def delete_item(self, Key):
+                table.items.pop((Key['user_id'], Key['message_ts']), None)
+
+        return Batch()
+
+
+class TestPerMessageLayout(unittest.TestCase):
+
+    def setUp(self):
+        self.table = FakeEventsTable()
+
+        patchers = [
+            patch('message_tracker.get_events_table', return_value=self.table),
+            patch.object(message_tracker, 'STORAGE_LAYOUT', 'per_message'),
+        ]
+        for p in patchers:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_one_item_per_message_with_ttl(self):
+        """Test that each message is stored as its own item with a ttl"""
+        now = int(time.time())
+
+        result = message_tracker.track_message('U1', 'C1', f'{now}.000100', 'hello')
+
+        self.assertFalse(result['exceeded'])
+        self.assertEqual(result['message_count'], 1)
+        item = self.table.items[('U1', f'{now}.000100')]
+        self.assertEqual(item['message_text'], 'hello')
+        self.assertEqual(item['ttl'], item['timestamp'] + message_tracker.MESSAGE_TTL_SECONDS)
+
+    def test_count_only_within_window(self):
+        """Test that messages with ts before the window are not counted"""
+        now = int(time.time())
+        message_tracker.track_message('U1', 'C1', f'{now - 600}.000100', 'old')
+        message_tracker.track_message('U2', 'C1', f'{now - 10}.000100', 'other user')
+
+        for i in range(4):
+            result = message_tracker.track_message('U1', 'C1', f'{now - 5 + i}.000100', f'Msg {i}')
+
+        self.assertFalse(result['exceeded'])
+        self.assertEqual(result['message_count'], 4)
+
+        result = message_tracker.track_message('U1', 'C1', f'{now}.000200', 'Msg 5')
+
+        self.assertTrue(result['exceeded'])
+        self.assertEqual(result['message_count'], 5)
+        self.assertEqual(len(result['messages']), 5)
+
+    def test_get_and_clear_user_messages(self):
+        """Test retrieving and clearing all messages of a user"""
+        now = int(time.time())
+        for i in range(3):
+            message_tracker.track_message('U1', 'C1', f'{now + i}.000100', f'Msg {i}')
+        message_tracker.track_message('U2', 'C1', f'{now}.000100', 'other user')
+
+        self.assertEqual(len(message_tracker.get_user_messages('U1')), 3)
+
+        message_tracker.clear_user_messages('U1')
+
+        self.assertEqual(message_tracker.get_user_messages('U1'), [])
+        self.assertEqual(len(message_tracker.get_user_messages('U2')), 1)
+
+
+class TestAlertState(unittest.TestCase):
+
+    @patch('message_tracker.get_alerts_table')
+    def test_alert_within_cooldown_is_returned(self, mock_get_alerts_table):
+        """Test that a recent alert is found"""
+        item = {'user_id': 'U1', 'channel': 'D1', 'message_ts': '1.1', 'sent_at': int(time.time()) - 10}
+        mock_get_alerts_table.return_value.get_item.return_value = {'Item': item}
+
+        self.assertEqual(message_tracker.get_alert_state('U1'), item)
+        mock_get_alerts_table.return_value.get_item.assert_called_once_with(
+            Key={'user_id': 'U1'}, ConsistentRead=True
+        )
+
+    @patch('message_tracker.get_alerts_table')
+    def test_alert_after_cooldown_is_ignored(self, mock_get_alerts_table):
+        """Test that an alert older than the cooldown is not reused"""
+        sent_at = int(time.time()) - message_tracker.ALERT_COOLDOWN_SECONDS - 1
+        item = {'user_id': 'U1', 'channel': 'D1', 'message_ts': '1.1', 'sent_at': sent_at}
+        mock_get_alerts_table.return_value.get_item.return_value = {'Item': item}
+
+        self.assertIsNone(message_tracker.get_alert_state('U1'))
+
+    @patch('message_tracker.get_alerts_table')
+    def test_save_alert_state_sets_ttl(self, mock_get_alerts_table):
+        """Test that the alert state expires with the cooldown"""
+        message_tracker.save_alert_state('U1', 'D1', '1.1')
+
+        item = mock_get_alerts_table.return_value.put_item.call_args[1]['Item']
+        self.assertEqual(item['channel'], 'D1')
+        self.assertEqual(item['message_ts'], '1.1')
+        self.assertEqual(item['ttl'], item['sent_at'] + message_tracker.ALERT_COOLDOWN_SECONDS)
+
+    @patch('message_tracker.get_alerts_table')
+    def test_alert_slot_is_claimed_once_per_cooldown(self, mock_get_alerts_table):
+        """Test that the slot is claimed with a conditional write and a lost race returns False"""
+        from botocore.exceptions import ClientError
+
+        put_item = mock_get_alerts_table.return_value.put_item
+
+        self.assertTrue(message_tracker.claim_alert_slot('U1'))
+        kwargs = put_item.call_args[1]
+        self.assertIn('attribute_not_exists(user_id) OR sent_at <= :cutoff', kwargs['ConditionExpression'])
+        self.assertIn('attribute_not_exists(message_ts) AND claimed_at <= :claim_cutoff', kwargs['ConditionExpression'])
+        values = kwargs['ExpressionAttributeValues']
+        self.assertEqual(values[':cutoff'], kwargs['Item']['sent_at'] - message_tracker.ALERT_COOLDOWN_SECONDS)
+        self.assertEqual(values[':claim_cutoff'], kwargs['Item']['claimed_at'] - message_tracker.ALERT_CLAIM_SECONDS)
+
+        put_item.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'taken'}}, 'PutItem'
+        )
+        self.assertFalse(message_tracker.claim_alert_slot('U1'))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,123 @@
+import sys
+import os
+import io
+import json
+import threading
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import boto3
+from botocore.stub import Stubber
+
+import metrics as metrics_module
+from metrics import Metrics, instrument_boto3
+from fake_clock import FakeClock
+
+
+def metric_names(record):
+    return [m['Name'] for m in record['_aws']['CloudWatchMetrics'][0]['Metrics']]
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_timers_and_counters_in_one_emf_record(self):
+        clock = FakeClock()
+        metrics = Metrics(namespace='Test', clock=clock)
+        metrics.set_handler('ASK_AI')
+
+        for seconds in [0.25, 0.5]:
+            with metrics.timer('slack.conversations.replies'):
+                clock.now += seconds
+        metrics.count('ai_cache.misses')
+
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            metrics.flush(duration=1.0)
+
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        record = json.loads(lines[0])
+
+        directive = record['_aws']['CloudWatchMetrics'][0]
+        self.assertEqual(directive['Namespace'], 'Test')
+        self.assertEqual(directive['Dimensions'], [['Function', 'Handler']])
+        self.assertEqual(record['Handler'], 'ASK_AI')
+        self.assertEqual(record['ColdStart'], 1)
+        self.assertEqual(record['Duration'], 1000.0)
+        self.assertEqual(record['slack.conversations.replies.time'], 750.0)
+        self.assertEqual(record['slack.conversations.replies.calls'], 2)
+        self.assertEqual(record['ai_cache.misses'], 1)
+        # every value has a metric definition
+        for name in metric_names(record):
+            self.assertIn(name, record)
+
+    def test_flush_starts_a_new_invocation(self):
+        metrics = Metrics(enabled=False)
+        metrics.set_handler('message')
+        metrics.count('route.reaction')
+
+        first = metrics.flush()
+        second = metrics.flush()
+
+        self.assertEqual(first['ColdStart'], 1)
+        self.assertEqual(second['ColdStart'], 0)
+        self.assertEqual(second['Handler'], 'none')
+        self.assertNotIn('route.reaction', second)
+
+    def test_errors_are_counted(self):
+        metrics = Metrics(enabled=False)
+
+        with self.assertRaises(ValueError):
+            with metrics.timer('groq'):
+                raise ValueError('timeout')
+
+        record = metrics.flush()
+        self.assertEqual(record['groq.calls'], 1)
+        self.assertEqual(record['groq.errors'], 1)
+
+    def test_concurrent_timers(self):
+        metrics = Metrics(enabled=False)
+
+        def delete_replies():
+            for _ in range(1000):
+                metrics.add_time('slack.chat.delete', 0.001)
+
+        threads = [threading.Thread(target=delete_replies) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(metrics.flush()['slack.chat.delete.calls'], 8000)
+
+
+class TestInstrumentBoto3(unittest.TestCase):
+
+    def test_dynamodb_calls_are_timed_per_operation(self):
+        client = boto3.client(
+            'dynamodb', region_name='us-east-1',
+            aws_access_key_id='test', aws_secret_access_key='test'
+        )
+        metrics = Metrics(enabled=False)
+
+        with patch.object(metrics_module, 'metrics', metrics):
+            instrument_boto3(client)
+
+            with Stubber(client) as stubber:
+                stubber.add_response('get_item', {}, {'TableName': 't', 'Key': {'user_id': {'S': 'U1'}}})
+                stubber.add_client_error('put_item', 'ProvisionedThroughputExceededException')
+
+                client.get_item(TableName='t', Key={'user_id': {'S': 'U1'}})
+                with self.assertRaises(Exception):
+                    client.put_item(TableName='t', Item={'user_id': {'S': 'U1'}})
+
+        record = metrics.flush()
+        self.assertEqual(record['dynamodb.GetItem.calls'], 1)
+        self.assertEqual(record['dynamodb.PutItem.calls'], 1)
+        self.assertEqual(record['dynamodb.PutItem.errors'], 1)
+        self.assertNotIn('dynamodb.GetItem.errors', record)
+
+
+if __name__ == '__main__':
+    unittest.main()
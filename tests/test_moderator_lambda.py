@@ -9,6 +9,7 @@ os.environ['ADMIN_USER_ID'] = 'U_ADMIN'
 
 # Add moderator directory to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'moderator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
 
 import lambda_function
 
@@ -69,6 +70,12 @@ class TestModeratorLambda(unittest.TestCase):
             'message_count': 5,
             'messages': messages
         }
+        mock_tracker.get_alert_state.return_value = None
+        mock_slack.send_moderation_alert.return_value = {
+            'ok': True,
+            'channel': 'D_ADMIN',
+            'ts': '9999999999.000001'
+        }
         
         event = {
             'event': {
@@ -85,7 +92,197 @@ class TestModeratorLambda(unittest.TestCase):
         self.assertEqual(result['statusCode'], 200)
         mock_tracker.track_message.assert_called_once()
         mock_slack.send_moderation_alert.assert_called_once_with('U123456', messages)
+        mock_tracker.save_alert_state.assert_called_once_with('U123456', 'D_ADMIN', '9999999999.000001')
     
+    @patch('lambda_function.message_tracker')
+    @patch('lambda_function.slack_moderator')
+    def test_repeated_alert_updates_existing_message(self, mock_slack, mock_tracker):
+        """Test that an alert within the cooldown is updated instead of posted again"""
+        messages = [
+            {'timestamp': 120 + i, 'channel_id': 'C123456', 'message_ts': f'{120 + i}.1', 'message_text': f'Msg {i}'}
+            for i in range(6)
+        ]
+
+        mock_tracker.track_message.return_value = {
+            'exceeded': True,
+            'message_count': 6,
+            'messages': messages
+        }
+        mock_tracker.claim_alert_slot.return_value = False
+        mock_tracker.get_alert_state.return_value = {
+            'channel': 'D_ADMIN',
+            'message_ts': '9999999999.000001',
+            'sent_at': 100
+        }
+        mock_slack.update_moderation_alert.return_value = {'ok': True}
+
+        event = {
+            'event': {
+                'type': 'message',
+                'user': 'U123456',
+                'channel': 'C123456',
+                'ts': '1234567890.123456',
+                'text': 'Test message 6'
+            }
+        }
+
+        lambda_function.lambda_handler(event, None)
+
+        mock_slack.send_moderation_alert.assert_not_called()
+        mock_slack.update_moderation_alert.assert_called_once_with(
+            'D_ADMIN', '9999999999.000001', 'U123456', messages
+        )
+        mock_tracker.save_alert_state.assert_not_called()
+
+    def exceeded_event(self, mock_tracker):
+        messages = [{'timestamp': 123, 'channel_id': 'C123456', 'message_ts': '123.1', 'message_text': 'Msg'}]
+        mock_tracker.track_message.return_value = {
+            'exceeded': True,
+            'message_count': 5,
+            'messages': messages
+        }
+        event = {
+            'event': {
+                'type': 'message',
+                'user': 'U123456',
+                'channel': 'C123456',
+                'ts': '1234567890.123456',
+                'text': 'Test message'
+            }
+        }
+        return event, messages
+
+    @patch('lambda_function.message_tracker')
+    @patch('lambda_function.slack_moderator')
+    def test_concurrent_violation_does_not_post_again(self, mock_slack, mock_tracker):
+        """Test that a lost claim on an alert still being posted posts nothing"""
+        event, _ = self.exceeded_event(mock_tracker)
+        mock_tracker.claim_alert_slot.return_value = False
+        mock_tracker.get_alert_state.return_value = {'user_id': 'U123456', 'sent_at': 100}
+
+        lambda_function.lambda_handler(event, None)
+
+        mock_slack.send_moderation_alert.assert_not_called()
+        mock_slack.update_moderation_alert.assert_not_called()
+
+        # the claim is lost but the winner's state can't be seen
+        mock_tracker.get_alert_state.return_value = None
+        lambda_function.lambda_handler(event, None)
+
+        mock_slack.send_moderation_alert.assert_not_called()
+
+    @patch('lambda_function.message_tracker')
+    @patch('lambda_function.slack_moderator')
+    def test_failed_post_releases_the_slot(self, mock_slack, mock_tracker):
+        """Test that an exception from Slack releases the claim and is raised for the retry"""
+        import requests
+
+        event, _ = self.exceeded_event(mock_tracker)
+        mock_tracker.claim_alert_slot.return_value = True
+        mock_slack.send_moderation_alert.side_effect = requests.ConnectionError('connection reset')
+
+        with self.assertRaises(requests.ConnectionError):
+            lambda_function.lambda_handler(event, None)
+
+        mock_tracker.clear_alert_state.assert_called_once_with('U123456')
+        mock_tracker.save_alert_state.assert_not_called()
+
+    @patch('lambda_function.message_tracker')
+    @patch('lambda_function.slack_moderator')
+    def test_alert_is_posted_when_alert_state_fails(self, mock_slack, mock_tracker):
+        """Test that a missing alerts table doesn't stop the alert"""
+        from botocore.exceptions import ClientError
+
+        event, messages = self.exceeded_event(mock_tracker)
+        error = ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': 'no table'}}, 'PutItem')
+        mock_tracker.claim_alert_slot.side_effect = error
+        mock_tracker.save_alert_state.side_effect = error
+        mock_slack.send_moderation_alert.return_value = {'ok': True, 'channel': 'D_ADMIN', 'ts': '1.2'}
+
+        result = lambda_function.lambda_handler(event, None)
+
+        self.assertEqual(result['statusCode'], 200)
+        mock_slack.send_moderation_alert.assert_called_once_with('U123456', messages)
+
+    @patch('lambda_function.message_tracker')
+    @patch('lambda_function.slack_moderator')
+    def test_alert_is_posted_when_update_fails(self, mock_slack, mock_tracker):
+        """Test that an alert deleted in Slack is posted again"""
+        event, messages = self.exceeded_event(mock_tracker)
+        mock_tracker.claim_alert_slot.return_value = False
+        mock_tracker.get_alert_state.return_value = {'channel': 'D_ADMIN', 'message_ts': '1.1', 'sent_at': 100}
+        mock_slack.update_moderation_alert.return_value = {'ok': False, 'error': 'message_not_found'}
+        mock_slack.send_moderation_alert.return_value = {'ok': True, 'channel': 'D_ADMIN', 'ts': '1.2'}
+
+        lambda_function.lambda_handler(event, None)
+
+        mock_slack.send_moderation_alert.assert_called_once_with('U123456', messages)
+        mock_tracker.save_alert_state.assert_called_once_with('U123456', 'D_ADMIN', '1.2')
+
+    @patch('lambda_function.rate_counter')
+    @patch('lambda_function.message_tracker')
+    @patch('lambda_function.slack_moderator')
+    def test_message_event_with_rate_counter(self, mock_slack, mock_tracker, mock_counter):
+        """Test that the local rate counter is used when enabled"""
+        mock_counter.RATE_COUNTER_ENABLED = True
+        mock_counter.counter.track_message.return_value = {
+            'exceeded': False,
+            'message_count': 1,
+            'messages': []
+        }
+        mock_counter.counter.pop_exceeded.return_value = []
+
+        event = {
+            'event': {
+                'type': 'message',
+                'user': 'U123456',
+                'channel': 'C123456',
+                'ts': '1234567890.123456',
+                'text': 'Test message'
+            }
+        }
+
+        result = lambda_function.lambda_handler(event, None)
+
+        self.assertEqual(result['statusCode'], 200)
+        mock_counter.counter.track_message.assert_called_once_with(
+            'U123456', 'C123456', '1234567890.123456', 'Test message'
+        )
+        mock_tracker.track_message.assert_not_called()
+        mock_slack.send_moderation_alert.assert_not_called()
+
+    @patch('lambda_function.rate_counter')
+    @patch('lambda_function.message_tracker')
+    @patch('lambda_function.slack_moderator')
+    def test_rate_counter_alerts_users_exceeded_by_flush(self, mock_slack, mock_tracker, mock_counter):
+        """Test that users found over the threshold by a flush are alerted too"""
+        mock_counter.RATE_COUNTER_ENABLED = True
+        mock_counter.counter.track_message.return_value = {
+            'exceeded': False,
+            'message_count': 1,
+            'messages': []
+        }
+        messages = [{'channel_id': 'C1', 'message_ts': '1.1', 'text': 'spam'}]
+        mock_counter.counter.pop_exceeded.return_value = [
+            ('U999', {'exceeded': True, 'message_count': 5, 'messages': messages})
+        ]
+        mock_tracker.get_alert_state.return_value = None
+        mock_slack.send_moderation_alert.return_value = {'ok': True, 'channel': 'D_ADMIN', 'ts': '1.2'}
+
+        event = {
+            'event': {
+                'type': 'message',
+                'user': 'U123456',
+                'channel': 'C123456',
+                'ts': '1234567890.123456',
+                'text': 'Test message'
+            }
+        }
+
+        lambda_function.lambda_handler(event, None)
+
+        mock_slack.send_moderation_alert.assert_called_once_with('U999', messages)
+
     @patch('lambda_function.message_tracker')
     @patch('lambda_function.slack_moderator')
     def test_ignore_bot_messages(self, mock_slack, mock_tracker):
@@ -124,6 +321,26 @@ class TestModeratorLambda(unittest.TestCase):
         
         self.assertEqual(result['statusCode'], 200)
         mock_tracker.track_message.assert_not_called()
+
+    @patch('lambda_function.message_tracker')
+    @patch('lambda_function.slack_moderator')
+    def test_ignore_messages_of_admins_from_the_rules(self, mock_slack, mock_tracker):
+        """Test that every admin the router knows is ignored, not only ADMIN_USER_ID"""
+        self.assertIn('U_ADMIN', lambda_function.ADMINS)
+        event = {
+            'event': {
+                'type': 'message',
+                'user': 'U_OTHER_ADMIN',
+                'channel': 'C123456',
+                'ts': '1234567890.123456',
+                'text': 'Admin message'
+            }
+        }
+
+        with patch.object(lambda_function, 'ADMINS', frozenset({'U_ADMIN', 'U_OTHER_ADMIN'})):
+            lambda_function.lambda_handler(event, None)
+
+        mock_tracker.track_message.assert_not_called()
     
     @patch('lambda_function.message_tracker')
     @patch('lambda_function.slack_moderator')
@@ -159,6 +376,7 @@ class TestModeratorLambda(unittest.TestCase):
         mock_tracker.get_user_messages.assert_called_once_with('U123456')
         mock_slack.delete_messages.assert_called_once_with(messages)
         mock_tracker.clear_user_messages.assert_called_once_with('U123456')
+        mock_tracker.clear_alert_state.assert_called_once_with('U123456')
         mock_slack.update_alert_message.assert_called_once()
     
     @patch('lambda_function.message_tracker')
@@ -182,6 +400,7 @@ class TestModeratorLambda(unittest.TestCase):
         
         self.assertEqual(result['statusCode'], 200)
         mock_tracker.clear_user_messages.assert_called_once_with('U123456')
+        mock_tracker.clear_alert_state.assert_called_once_with('U123456')
         mock_slack.update_alert_message.assert_called_once()
 
 
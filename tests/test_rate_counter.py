@@ -0,0 +1,174 @@
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Add moderator directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'moderator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import message_tracker
+import rate_counter
+
+
+class TestSlidingWindowCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = MagicMock()
+        self.tracker.new_message.side_effect = message_tracker.new_message
+        self.tracker.track_messages.side_effect = lambda user_id, messages: {
+            'exceeded': len(messages) >= 5,
+            'message_count': len(messages),
+            'messages': messages if len(messages) >= 5 else []
+        }
+
+    def make_counter(self, **kwargs):
+        params = dict(threshold=5, window_seconds=180, margin=2, max_users=100,
+                      flush_seconds=3600, tracker=self.tracker)
+        params.update(kwargs)
+        return rate_counter.SlidingWindowCounter(**params)
+
+    def test_far_from_threshold_is_answered_locally(self):
+        """Test that no DynamoDB calls are made while a user is far from the limit"""
+        counter = self.make_counter()
+
+        for i in range(2):
+            result = counter.track_message('U1', 'C1', f'{i}.1', 'hi')
+
+        self.assertFalse(result['exceeded'])
+        self.assertEqual(result['message_count'], 2)
+        self.tracker.track_messages.assert_not_called()
+        self.assertEqual(counter.get_stats()['hits'], 2)
+        self.assertEqual(counter.get_stats()['pending'], 2)
+
+    def test_near_threshold_persists_buffered_messages(self):
+        """Test that buffered messages are written once the user gets close"""
+        counter = self.make_counter()
+
+        for i in range(3):
+            result = counter.track_message('U1', 'C1', f'{i}.1', 'hi')
+
+        self.tracker.track_messages.assert_called_once()
+        user_id, messages = self.tracker.track_messages.call_args[0]
+        self.assertEqual(user_id, 'U1')
+        self.assertEqual([m['message_ts'] for m in messages], ['0.1', '1.1', '2.1'])
+        self.assertEqual(counter.get_stats()['misses'], 1)
+        self.assertEqual(counter.get_stats()['pending'], 0)
+
+        for i in range(3, 5):
+            result = counter.track_message('U1', 'C1', f'{i}.1', 'hi')
+
+        # after the first write every message goes to DynamoDB
+        self.assertEqual(self.tracker.track_messages.call_count, 3)
+
+    def test_old_timestamps_leave_the_window(self):
+        """Test that timestamps outside the window are not counted"""
+        counter = self.make_counter()
+
+        with patch('rate_counter.time.time', return_value=1000):
+            counter.track_message('U1', 'C1', '1.1', 'hi')
+            counter.track_message('U1', 'C1', '2.1', 'hi')
+
+        with patch('rate_counter.time.time', return_value=1200):
+            result = counter.track_message('U1', 'C1', '3.1', 'hi')
+
+        self.assertEqual(result['message_count'], 1)
+        self.tracker.track_messages.assert_not_called()
+
+    def test_memory_is_bounded(self):
+        """Test that the LRU evicts users and flushes their buffered messages"""
+        counter = self.make_counter(max_users=3)
+
+        for i in range(5):
+            counter.track_message(f'U{i}', 'C1', f'{i}.1', 'hi')
+
+        stats = counter.get_stats()
+        self.assertEqual(stats['users'], 3)
+        self.assertEqual(stats['evictions'], 2)
+        self.assertEqual(stats['pending'], 3)
+        flushed = [c[0][0] for c in self.tracker.track_messages.call_args_list]
+        self.assertEqual(flushed, ['U0', 'U1'])
+
+        for _ in range(20):
+            counter.track_message('U4', 'C1', '9.1', 'hi')
+        self.assertEqual(len(counter.timestamps['U4']), 5)
+
+    def test_periodic_flush(self):
+        """Test that pending messages are written after the flush interval"""
+        counter = self.make_counter(flush_seconds=60)
+
+        with patch('rate_counter.time.time', return_value=counter.last_flush + 1):
+            counter.track_message('U1', 'C1', '1.1', 'hi')
+        self.tracker.track_messages.assert_not_called()
+
+        with patch('rate_counter.time.time', return_value=counter.last_flush + 61):
+            counter.track_message('U2', 'C1', '2.1', 'hi')
+
+        flushed = sorted(c[0][0] for c in self.tracker.track_messages.call_args_list)
+        self.assertEqual(flushed, ['U1', 'U2'])
+        self.assertEqual(counter.get_stats()['flushes'], 1)
+        self.assertEqual(counter.get_stats()['pending'], 0)
+
+    def test_exceeded_on_eviction_is_reported(self):
+        """Test that an evicted user over the threshold is kept for alerting"""
+        self.tracker.track_messages.side_effect = lambda user_id, messages: {
+            'exceeded': user_id == 'U0',
+            'message_count': 5,
+            'messages': messages
+        }
+        counter = self.make_counter(max_users=2)
+
+        for i in range(3):
+            counter.track_message(f'U{i}', 'C1', f'{i}.1', 'hi')
+
+        exceeded = counter.pop_exceeded()
+        self.assertEqual([user_id for user_id, _ in exceeded], ['U0'])
+        self.assertEqual(exceeded[0][1]['messages'][0]['message_ts'], '0.1')
+        self.assertEqual(counter.pop_exceeded(), [])
+
+    def test_exceeded_on_flush_is_reported(self):
+        """Test that the periodic flush reports the users DynamoDB finds over the threshold"""
+        self.tracker.track_messages.side_effect = lambda user_id, messages: {
+            'exceeded': user_id == 'U1',
+            'message_count': 5,
+            'messages': messages
+        }
+        counter = self.make_counter(flush_seconds=60)
+
+        with patch('rate_counter.time.time', return_value=counter.last_flush + 1):
+            counter.track_message('U1', 'C1', '1.1', 'hi')
+        with patch('rate_counter.time.time', return_value=counter.last_flush + 61):
+            counter.track_message('U2', 'C1', '2.1', 'hi')
+
+        self.assertEqual([user_id for user_id, _ in counter.pop_exceeded()], ['U1'])
+
+    def test_flush_is_bounded_per_message(self):
+        """Test that one message flushes at most flush_batch users, oldest first"""
+        counter = self.make_counter(flush_seconds=60, flush_batch=2)
+        start = counter.last_flush
+
+        with patch('rate_counter.time.time', return_value=start + 1):
+            for i in range(4):
+                counter.track_message(f'U{i}', 'C1', f'{i}.1', 'hi')
+        self.tracker.track_messages.assert_not_called()
+
+        with patch('rate_counter.time.time', return_value=start + 61):
+            counter.track_message('U4', 'C1', '4.1', 'hi')
+            flushed = [c[0][0] for c in self.tracker.track_messages.call_args_list]
+            self.assertEqual(flushed, ['U0', 'U1'])
+            self.assertEqual(counter.get_stats()['flushes'], 0)
+
+            counter.track_message('U5', 'C1', '5.1', 'hi')
+            counter.track_message('U6', 'C1', '6.1', 'hi')
+            self.assertEqual(counter.get_stats()['pending'], 1)
+
+            counter.track_message('U6', 'C1', '6.2', 'hi')
+
+        flushed = [c[0][0] for c in self.tracker.track_messages.call_args_list]
+        self.assertEqual(flushed, ['U0', 'U1', 'U2', 'U3', 'U4', 'U5', 'U6'])
+        self.assertEqual(counter.get_stats()['flushes'], 1)
+        self.assertEqual(counter.get_stats()['pending'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
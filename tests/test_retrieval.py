@@ -0,0 +1,113 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'automator'))
+
+import retrieval
+
+
+FAQ = """# Module 1
+
+## How do I install Docker on Windows?
+
+Use Docker Desktop with the WSL2 backend.
+
+## Kafka producer fails with a timeout
+
+Check that the broker is running and the port is exposed.
+
+## Ünicode question
+
+Ünicode answers are stored as utf-8.
+"""
+
+HOMEWORK = """## Where do I submit the homework?
+
+Submit the homework with the form linked in the course page.
+"""
+
+
+class TestRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        docs_dir = os.path.join(self.tmp_dir, 'docs')
+        os.makedirs(os.path.join(docs_dir, 'course'))
+
+        with open(os.path.join(docs_dir, 'course', 'faq.md'), 'w', encoding='utf-8') as f_out:
+            f_out.write(FAQ)
+        with open(os.path.join(docs_dir, 'homework.md'), 'w', encoding='utf-8') as f_out:
+            f_out.write(HOMEWORK)
+
+        self.index_file = os.path.join(self.tmp_dir, 'faq.idx')
+        self.stats = retrieval.build_index(retrieval.read_passages(docs_dir), self.index_file)
+        self.index = retrieval.Bm25Index(self.index_file)
+
+    def tearDown(self):
+        self.index.close()
+        retrieval.indexes.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_split_passages(self):
+        """Test that Markdown is split at headings"""
+        passages = retrieval.split_passages(FAQ)
+
+        self.assertEqual(len(passages), 4)
+        self.assertEqual(passages[0], '# Module 1')
+        self.assertTrue(passages[1].startswith('## How do I install Docker'))
+
+    def test_build_and_load(self):
+        """Test that the loaded index matches what was written"""
+        n_docs, n_terms = self.stats
+
+        self.assertEqual(n_docs, 5)
+        self.assertEqual(self.index.n_docs, 5)
+        self.assertEqual(self.index.n_terms, n_terms)
+        self.assertEqual(self.index.get_source(0), 'homework.md')
+        self.assertEqual(self.index.get_text(0), HOMEWORK.strip())
+
+    def test_find_term(self):
+        """Test the binary search over the vocabulary"""
+        self.assertGreaterEqual(self.index.find_term('docker'), 0)
+        self.assertGreaterEqual(self.index.find_term('ünicode'), 0)
+        self.assertEqual(self.index.find_term('spark'), -1)
+        self.assertEqual(self.index.find_term('zzzz'), -1)
+
+    def test_search_ranks_relevant_passage_first(self):
+        """Test that the passage matching the query is ranked first"""
+        results = self.index.search('kafka producer timeout', k=2)
+
+        self.assertEqual(len(results), 1)
+        self.assertIn('Kafka producer', self.index.get_text(results[0][1]))
+
+        results = self.index.search('how to submit homework', k=3)
+        self.assertIn('submit the homework', self.index.get_text(results[0][1]))
+
+    def test_search_without_matches(self):
+        """Test that stopwords and unknown words return nothing"""
+        self.assertEqual(self.index.search('how do I'), [])
+        self.assertEqual(self.index.search('spark'), [])
+
+    def test_retrieve_context(self):
+        """Test the formatted context and that the index is loaded once"""
+        context = retrieval.retrieve_context(self.index_file, 'docker windows', k=1)
+
+        self.assertTrue(context.startswith(f"[{os.path.join('course', 'faq.md')}]\n## How do I install Docker"))
+        self.assertIs(retrieval.get_index(self.index_file), retrieval.get_index(self.index_file))
+        retrieval.indexes[self.index_file].close()
+
+    def test_not_an_index(self):
+        """Test that other files are rejected"""
+        path = os.path.join(self.tmp_dir, 'other.idx')
+        with open(path, 'wb') as f_out:
+            f_out.write(b'not an index at all')
+
+        with self.assertRaises(ValueError):
+            retrieval.Bm25Index(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,181 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import importlib.util
+import unittest
+from unittest.mock import patch
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-west-1')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'router'))
+
+import routing
+from event_dedup import EventDeduplicator
+
+# automator/ and moderator/ also have a lambda_function module
+ROUTER_DIR = os.path.join(os.path.dirname(__file__), '..', 'router')
+spec = importlib.util.spec_from_file_location(
+    'router_lambda_function', os.path.join(ROUTER_DIR, 'lambda_function.py')
+)
+router = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(router)
+
+
+def message(**fields):
+    return {'event': dict({'type': 'message', 'user': 'U1', 'text': 'hi'}, **fields)}
+
+
+def reaction(reaction, user='U_ADMIN'):
+    return {'event': {'type': 'reaction_added', 'user': user, 'reaction': reaction}}
+
+
+class TestRoutingRules(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = routing.RoutingRules(['U_ADMIN'], ['delete', 'ask-ai'])
+
+    def test_routes(self):
+        cases = [
+            (message(), routing.MODERATOR_FUNCTION, 'message'),
+            (message(subtype='bot_message'), None, 'message_ignored_subtype'),
+            (message(subtype='message_changed'), None, 'message_ignored_subtype'),
+            (message(user=None), None, 'message_no_user'),
+            (message(user='U_ADMIN'), None, 'message_from_admin'),
+            (reaction('delete'), routing.AUTOMATOR_FUNCTION, 'reaction'),
+            (reaction('thumbsup'), None, 'reaction_not_configured'),
+            (reaction('delete', user='U1'), None, 'reaction_not_admin'),
+            ({'payload': '{}'}, routing.MODERATOR_FUNCTION, 'interactive'),
+            ({'event': {'type': 'app_mention'}}, None, 'other_event'),
+        ]
+        for body, function_name, rule in cases:
+            with self.subTest(rule=rule, body=body):
+                self.assertEqual(self.rules.route(body), (function_name, rule))
+
+    def test_without_reactions_every_admin_reaction_is_forwarded(self):
+        rules = routing.RoutingRules(['U_ADMIN'])
+        self.assertEqual(rules.route(reaction('anything')), (routing.AUTOMATOR_FUNCTION, 'reaction'))
+
+    def test_rules_file(self):
+        """Test that rules compiled from the config are loaded back"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'routing_rules.json')
+
+        config = {'admins': ['U_ADMIN'], 'reactions': [{'reaction': 'faq'}, {'reaction': 'delete'}]}
+        with open(path, 'w') as f_out:
+            json.dump(routing.compile_rules(config), f_out)
+
+        rules = routing.RoutingRules.from_file(path)
+
+        self.assertEqual(rules.admins, {'U_ADMIN'})
+        self.assertEqual(rules.reactions, {'faq', 'delete'})
+
+    def test_rules_file_without_reaction_filter(self):
+        """Test that rules compiled for an S3-configured automator forward every admin reaction"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'routing_rules.json')
+
+        config = {'admins': ['U_ADMIN'], 'reactions': [{'reaction': 'faq'}]}
+        with open(path, 'w') as f_out:
+            json.dump(routing.compile_rules(config, filter_reactions=False), f_out)
+
+        rules = routing.RoutingRules.from_file(path)
+
+        self.assertIsNone(rules.reactions)
+        self.assertEqual(rules.route(reaction('added-in-s3')), (routing.AUTOMATOR_FUNCTION, 'reaction'))
+
+    def test_stats(self):
+        stats = routing.RoutingStats()
+        stats.record('message', forwarded=True)
+        stats.record('message_from_admin', forwarded=False)
+        stats.record('message_from_admin', forwarded=False)
+
+        self.assertEqual(stats.counts['message_from_admin'], {'forwarded': 0, 'dropped': 2})
+        self.assertEqual(stats.totals(), {'forwarded': 1, 'dropped': 2})
+
+
+class TestRouter(unittest.TestCase):
+
+    def setUp(self):
+        for name, value in [
+            ('rules', routing.RoutingRules(['U_ADMIN'], ['delete'])),
+            ('deduplicator', EventDeduplicator(table_name=None)),
+        ]:
+            patcher = patch.object(router, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @patch.object(router, 'lambda_client')
+    def test_drops_events_without_work(self, mock_lambda_client):
+        """Test that bot, admin and unconfigured events don't invoke a worker"""
+        router.run(message(subtype='bot_message'))
+        router.run(message(user='U_ADMIN'))
+        router.run(reaction('thumbsup'))
+
+        mock_lambda_client.invoke.assert_not_called()
+
+    @patch.object(router, 'lambda_client')
+    def test_forwards_actionable_events(self, mock_lambda_client):
+        body = reaction('delete')
+        router.run(body)
+        router.run(message())
+
+        calls = mock_lambda_client.invoke.call_args_list
+        self.assertEqual(calls[0][1]['FunctionName'], routing.AUTOMATOR_FUNCTION)
+        payload = json.loads(calls[0][1]['Payload'])
+        self.assertIn('forwarded_at', payload.pop('trace'))
+        self.assertEqual(payload, body)
+        self.assertEqual(calls[1][1]['FunctionName'], routing.MODERATOR_FUNCTION)
+
+    @patch.object(router, 'lambda_client')
+    def test_slack_retries_forwarded_once(self, mock_lambda_client):
+        """Test that a retried event_id doesn't invoke the worker again"""
+        body = dict(reaction('delete'), event_id='Ev1')
+
+        router.lambda_handler({'body': json.dumps(body)}, None)
+        router.lambda_handler({'body': json.dumps(body), 'headers': {'x-slack-retry-num': '1'}}, None)
+
+        self.assertEqual(mock_lambda_client.invoke.call_count, 1)
+        self.assertEqual(router.deduplicator.get_stats()['duplicates'], 1)
+        self.assertEqual(router.routing_stats.counts['duplicate']['dropped'], 1)
+
+    @patch.object(router, 'lambda_client')
+    def test_failed_invoke_is_not_deduplicated(self, mock_lambda_client):
+        """Test that the retry of an event that failed to forward goes through"""
+        body = dict(reaction('delete'), event_id='Ev2')
+        mock_lambda_client.invoke.side_effect = [RuntimeError('throttled'), None]
+
+        with self.assertRaises(RuntimeError):
+            router.run(body)
+        router.run(body, retry_num='1')
+
+        self.assertEqual(mock_lambda_client.invoke.call_count, 2)
+
+    @patch.object(router, 'lambda_client')
+    def test_forwarded_body_has_trace_context(self, mock_lambda_client):
+        """Test that the worker gets the event id and when the router received the event"""
+        body = dict(reaction('delete'), event_id='Ev3', event_time=1700000000)
+
+        router.run(body, retry_num='2', received_at=1700000001.5)
+
+        trace = json.loads(mock_lambda_client.invoke.call_args[1]['Payload'])['trace']
+        self.assertEqual(trace['event_id'], 'Ev3')
+        self.assertEqual(trace['event_time'], 1700000000)
+        self.assertEqual(trace['received_at'], 1700000001.5)
+        self.assertEqual(trace['retry'], '2')
+        self.assertGreaterEqual(trace['forwarded_at'], trace['received_at'])
+
+    @patch.object(router, 'lambda_client')
+    def test_interactive_payload(self, mock_lambda_client):
+        result = router.run({'payload': '{"type": "block_actions"}'})
+
+        self.assertEqual(json.loads(result['body']), {'ok': True})
+        self.assertEqual(mock_lambda_client.invoke.call_args[1]['FunctionName'], routing.MODERATOR_FUNCTION)
+
+
+if __name__ == '__main__':
+    unittest.main()
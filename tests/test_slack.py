@@ -0,0 +1,126 @@
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'automator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import slack
+
+
+class TestThreadSnapshot(unittest.TestCase):
+
+    @patch('slack.bot_client')
+    def test_snapshot_follows_cursor(self, mock_bot_client):
+        """Test that all pages of conversations.replies are fetched once"""
+        mock_bot_client.return_value.get.side_effect = [
+            {
+                'ok': True,
+                'messages': [{'ts': '1.1', 'user': 'U1'}, {'ts': '2.1', 'user': 'U2'}],
+                'has_more': True,
+                'response_metadata': {'next_cursor': 'page2'}
+            },
+            {
+                'ok': True,
+                'messages': [{'ts': '3.1', 'user': 'U1'}, {'ts': '4.1'}],
+                'response_metadata': {'next_cursor': ''}
+            },
+        ]
+
+        thread = slack.get_thread_snapshot('C1', '1.1')
+
+        self.assertEqual(thread.parent, {'ts': '1.1', 'user': 'U1'})
+        self.assertEqual([r['ts'] for r in thread.replies], ['2.1', '3.1', '4.1'])
+        self.assertEqual(thread.authors, ['U1', 'U2'])
+
+        calls = mock_bot_client.return_value.get.call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertNotIn('cursor', calls[0][0][1])
+        self.assertEqual(calls[1][0][1]['cursor'], 'page2')
+
+    @patch('slack.bot_client')
+    def test_pages_can_be_streamed(self, mock_bot_client):
+        """Test that pages are fetched lazily when iterating"""
+        mock_bot_client.return_value.get.side_effect = [
+            {'messages': [{'ts': '1.1'}], 'response_metadata': {'next_cursor': 'page2'}},
+            {'messages': [{'ts': '2.1'}]},
+        ]
+
+        pages = slack.iter_thread_pages('C1', '1.1')
+
+        self.assertEqual(next(pages), [{'ts': '1.1'}])
+        self.assertEqual(mock_bot_client.return_value.get.call_count, 1)
+        self.assertEqual(list(pages), [[{'ts': '2.1'}]])
+
+
+class TestMessageCache(unittest.TestCase):
+
+    def setUp(self):
+        slack.message_cache.clear()
+
+    @patch('slack.user_client')
+    @patch('slack.bot_client')
+    def test_message_fetched_once_until_deleted(self, mock_bot_client, mock_user_client):
+        """Test that repeated reads are served from the cache and deletes invalidate it"""
+        mock_bot_client.return_value.get.return_value = {
+            'ok': True,
+            'messages': [{'ts': '1.1', 'user': 'U1', 'text': 'question'}]
+        }
+        event = {'item': {'channel': 'C1', 'ts': '1.1'}}
+
+        self.assertEqual(slack.get_message(event), ('U1', 'question'))
+        self.assertEqual(slack.get_user_and_message(event), ('U1', 'question'))
+        self.assertEqual(slack.get_message_content('C1', '1.1')['text'], 'question')
+        self.assertEqual(mock_bot_client.return_value.get.call_count, 1)
+
+        slack.remove_message('C1', '1.1')
+        slack.get_message_content('C1', '1.1')
+
+        self.assertEqual(mock_bot_client.return_value.get.call_count, 2)
+        stats = slack.message_cache.get_stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+
+
+class TestStreamingSlackMarkdown(unittest.TestCase):
+
+    def test_same_result_as_converting_everything(self):
+        """Test that converting chunk by chunk matches converting the full text"""
+        text = "# Title\nSome **bold** text and a [link](http://x.com).\n## Next\nDone"
+        converter = slack.StreamingSlackMarkdown()
+
+        for i in range(0, len(text), 3):
+            converter.feed(text[i:i + 3])
+            self.assertTrue(slack.github_to_slack_markdown(text).startswith(converter.converted))
+
+        self.assertEqual(converter.text(), slack.github_to_slack_markdown(text))
+
+    def test_code_block_across_chunks(self):
+        """Test that a code block split over chunks is not converted"""
+        text = "Run:\n```python\nx = '**a**'\n```\n**done**"
+        converter = slack.StreamingSlackMarkdown()
+
+        for i in range(0, len(text), 4):
+            converter.feed(text[i:i + 4])
+
+        self.assertEqual(converter.text(), "Run:\n```\nx = '**a**'\n```\n*done*")
+
+
+class TestSectionBlocks(unittest.TestCase):
+
+    def test_long_message_split_into_sections(self):
+        """Test that messages longer than a section are posted as several blocks"""
+        message = '\n\n'.join('x' * 1000 for _ in range(5))
+
+        blocks = slack.section_blocks(message)
+
+        self.assertGreater(len(blocks), 1)
+        for block in blocks:
+            self.assertEqual(block['type'], 'section')
+            self.assertLessEqual(len(block['text']['text']), slack.slack_markdown.SECTION_TEXT_LIMIT)
+        self.assertEqual(slack.section_blocks('hi'), [{'type': 'section', 'text': {'type': 'mrkdwn', 'text': 'hi'}}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+import sys
+import os
+import unittest
+import threading
+from unittest.mock import patch, MagicMock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import slack_client
+from metrics import Metrics
+from fake_clock import FakeClock
+
+
+def fake_response(body, status_code=200, headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.headers = headers or {}
+    response.json.return_value = body
+    return response
+
+
+class TestSlackClient(unittest.TestCase):
+
+    def setUp(self):
+        slack_client.clients.clear()
+
+    def test_one_client_per_token(self):
+        """Test that clients and their sessions are reused per token"""
+        bot = slack_client.get_client('xoxb-bot')
+        user = slack_client.get_client('xoxp-user')
+
+        self.assertIs(slack_client.get_client('xoxb-bot'), bot)
+        self.assertIsNot(bot, user)
+        self.assertEqual(bot.session.headers['Authorization'], 'Bearer xoxb-bot')
+        self.assertEqual(user.session.headers['Authorization'], 'Bearer xoxp-user')
+
+    def test_post_uses_session_with_timeout(self):
+        """Test that calls go through the pooled session with the configured timeout"""
+        client = slack_client.SlackClient('xoxb-bot', base_url='http://localhost:9999/api/', timeout=(1, 2))
+
+        with patch.object(client.session, 'request', return_value=fake_response({'ok': True})) as mock_request:
+            result = client.post('chat.postMessage', {'channel': 'C1', 'text': 'hi'})
+
+        self.assertEqual(result, {'ok': True})
+        mock_request.assert_called_once_with(
+            'POST',
+            'http://localhost:9999/api/chat.postMessage',
+            timeout=(1, 2),
+            json={'channel': 'C1', 'text': 'hi'}
+        )
+
+    def test_latency_is_tracked_per_method(self):
+        """Test that latency stats are kept per API method, also for failed calls"""
+        client = slack_client.get_client('xoxb-bot')
+
+        with patch.object(client.session, 'request', return_value=fake_response({'ok': True})):
+            client.post('chat.postMessage', {})
+            client.post('chat.postMessage', {})
+            client.get('conversations.replies', {'channel': 'C1', 'ts': '1.1'})
+
+        with patch.object(client.session, 'request', side_effect=ConnectionError()):
+            with self.assertRaises(ConnectionError):
+                client.post('chat.delete', {})
+
+        stats = slack_client.get_latency_stats()
+        self.assertEqual(stats['chat.postMessage']['calls'], 2)
+        self.assertEqual(stats['conversations.replies']['calls'], 1)
+        self.assertEqual(stats['chat.delete']['calls'], 1)
+        self.assertGreaterEqual(stats['chat.postMessage']['avg_seconds'], 0)
+
+        with patch.object(slack_client, 'logger') as mock_logger:
+            slack_client.log_latency_stats()
+        self.assertEqual(mock_logger.info.call_args[1]['stats'], stats)
+
+    def test_latency_from_threads(self):
+        """Test that calls made from several threads are all counted"""
+        client = slack_client.SlackClient('xoxb-bot')
+
+        def record():
+            for _ in range(1000):
+                client.record_latency('chat.delete', 0.001)
+
+        threads = [threading.Thread(target=record) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = client.get_latency_stats()['chat.delete']
+        self.assertEqual(stats['calls'], 8000)
+        self.assertAlmostEqual(stats['total_seconds'], 8.0)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        """Test that the bucket allows a burst and then spaces out calls"""
+        clock = FakeClock()
+        bucket = slack_client.TokenBucket(60, capacity=3, clock=clock, sleep=clock.sleep)
+
+        waits = [bucket.acquire() for _ in range(6)]
+
+        self.assertEqual(waits[:3], [0, 0, 0])
+        self.assertEqual(clock.now, 3.0)
+
+    def test_pause_blocks_tokens(self):
+        """Test that no tokens are handed out during a pause"""
+        clock = FakeClock()
+        bucket = slack_client.TokenBucket(60, capacity=10, clock=clock, sleep=clock.sleep)
+
+        bucket.pause(30)
+        bucket.acquire()
+
+        self.assertEqual(clock.now, 30.0)
+
+
+class TestRateLimitedCalls(unittest.TestCase):
+
+    def make_client(self, clock):
+        return slack_client.SlackClient('xoxp-user', clock=clock, sleep=clock.sleep, max_retries=3)
+
+    def test_429_is_retried_after_retry_after(self):
+        """Test that a 429 response is retried once Retry-After has passed"""
+        clock = FakeClock()
+        client = self.make_client(clock)
+
+        responses = [
+            fake_response({'ok': False}, status_code=429, headers={'Retry-After': '7'}),
+            fake_response({'ok': True}),
+        ]
+
+        with patch.object(client.session, 'request', side_effect=responses):
+            outcome = client.try_post('chat.delete', {'channel': 'C1', 'ts': '1.1'})
+
+        self.assertTrue(outcome['ok'])
+        self.assertEqual(outcome['attempts'], 2)
+        self.assertEqual(outcome['rate_limited'], 1)
+        self.assertGreaterEqual(clock.now, 7)
+
+    def test_calls_and_429s_are_in_the_invocation_metrics(self):
+        """Test that every attempt is timed per method and 429s are counted"""
+        clock = FakeClock()
+        client = self.make_client(clock)
+        metrics = Metrics(enabled=False)
+
+        responses = [
+            fake_response({'ok': False}, status_code=429, headers={'Retry-After': '1'}),
+            fake_response({'ok': True}),
+        ]
+
+        with patch.object(slack_client, 'metrics', metrics), \
+                patch.object(client.session, 'request', side_effect=responses):
+            client.try_post('chat.delete', {'channel': 'C1', 'ts': '1.1'})
+
+        record = metrics.flush()
+        self.assertEqual(record['slack.chat.delete.calls'], 2)
+        self.assertEqual(record['slack.rate_limited'], 1)
+        self.assertIn('slack.throttle.time', record)
+
+    def test_gives_up_after_max_retries(self):
+        """Test that the outcome reports the failure when Slack keeps rate limiting"""
+        clock = FakeClock()
+        client = self.make_client(clock)
+        limited = fake_response({'ok': False}, status_code=429, headers={'Retry-After': '1'})
+        limited.raise_for_status.side_effect = Exception('429 Too Many Requests')
+
+        with patch.object(client.session, 'request', return_value=limited):
+            outcome = client.try_post('chat.delete', {'channel': 'C1', 'ts': '1.1'})
+
+        self.assertFalse(outcome['ok'])
+        self.assertEqual(outcome['status'], 429)
+        self.assertEqual(outcome['attempts'], 4)
+        self.assertIn('429', outcome['error'])
+
+    def test_200_deletions_complete_at_allowed_rate(self):
+        """Test that a large cleanup finishes despite 429s and stays within the tier"""
+        clock = FakeClock()
+        client = self.make_client(clock)
+        calls = []
+
+        def request(method, url, **kwargs):
+            calls.append(clock.now)
+            # Slack throttles every 40th request
+            if len(calls) % 40 == 0:
+                return fake_response({'ok': False}, status_code=429, headers={'Retry-After': '2'})
+            return fake_response({'ok': True})
+
+        with patch.object(client.session, 'request', side_effect=request):
+            outcomes = [client.try_post('chat.delete', {'channel': 'C1', 'ts': f'{i}.1'}) for i in range(200)]
+
+        self.assertTrue(all(o['ok'] for o in outcomes))
+        self.assertEqual(sum(o['rate_limited'] for o in outcomes), 5)
+
+        # tier 3 is 50 per minute: never more than the burst + rate in any minute
+        per_minute = slack_client.RATE_LIMIT_TIERS['tier3']
+        burst = per_minute
+        for start in calls:
+            in_window = [t for t in calls if start <= t < start + 60]
+            self.assertLessEqual(len(in_window), per_minute + burst)
+
+        # as fast as the tier allows, plus the Retry-After pauses, which
+        # may also drain what's left of the initial burst
+        expected = (len(calls) - burst) * 60 / per_minute
+        self.assertGreaterEqual(clock.now, expected)
+        self.assertLessEqual(clock.now, expected + 5 * 2 + burst * 60 / per_minute)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import sys
+import os
+import glob
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'automator'))
+
+import slack_markdown
+
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), 'markdown_golden')
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f_in:
+        return f_in.read()
+
+
+class TestGoldenOutput(unittest.TestCase):
+
+    def test_golden_corpus(self):
+        """Test every markdown_golden/<name>.md against <name>.slack"""
+        paths = sorted(glob.glob(os.path.join(GOLDEN_DIR, '*.md')))
+        self.assertTrue(paths)
+
+        for path in paths:
+            with self.subTest(path=os.path.basename(path)):
+                expected = read(path[:-len('.md')] + '.slack')
+                self.assertEqual(slack_markdown.to_slack_markdown(read(path)), expected)
+
+    def test_fed_line_by_line(self):
+        """Test that the converter keeps the code block state between lines"""
+        text = read(os.path.join(GOLDEN_DIR, 'code.md'))
+        converter = slack_markdown.SlackMarkdownConverter()
+
+        lines = [converter.convert(line) for line in text.split('\n')]
+
+        self.assertEqual('\n'.join(lines), read(os.path.join(GOLDEN_DIR, 'code.slack')))
+
+
+class TestSplitSections(unittest.TestCase):
+
+    def test_short_text_is_one_section(self):
+        self.assertEqual(slack_markdown.split_sections('hello\n\nworld'), ['hello\n\nworld'])
+
+    def test_splits_at_paragraphs(self):
+        """Test that long text is split at blank lines, within the limit"""
+        paragraphs = [f'paragraph {i} ' + 'x' * 30 for i in range(10)]
+        text = '\n\n'.join(paragraphs)
+
+        sections = slack_markdown.split_sections(text, limit=100)
+
+        self.assertTrue(all(len(section) <= 100 for section in sections))
+        self.assertEqual([s for section in sections for s in section.split('\n\n')], paragraphs)
+
+    def test_code_block_is_closed_and_reopened(self):
+        """Test that every section of a split code block renders as code"""
+        code = '\n'.join(f'line {i}' for i in range(40))
+        text = f'Intro\n```\n{code}\n```\nDone'
+
+        sections = slack_markdown.split_sections(text, limit=80)
+
+        self.assertGreater(len(sections), 2)
+        for section in sections:
+            self.assertLessEqual(len(section), 80)
+            self.assertEqual(section.count('```') % 2, 0)
+
+        lines = [line for section in sections for line in section.split('\n') if line != '```']
+        self.assertEqual(lines, ['Intro'] + code.split('\n') + ['Done'])
+
+    def test_long_line_is_split(self):
+        sections = slack_markdown.split_sections('y' * 250, limit=100)
+
+        self.assertTrue(all(len(section) <= 100 for section in sections))
+        self.assertEqual(''.join(sections), 'y' * 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import sys
+import os
+import unittest
+from unittest.mock import patch, MagicMock
+
+# Add moderator directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'moderator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import slack_moderator
+
+
+class TestDeleteMessages(unittest.TestCase):
+
+    @patch('slack_moderator.user_client')
+    def test_delete_messages_returns_outcomes(self, mock_user_client):
+        """Test that every deletion reports its outcome"""
+        mock_user_client.return_value.try_post.side_effect = [
+            {'method': 'chat.delete', 'ok': True, 'error': None, 'rate_limited': 1},
+            {'method': 'chat.delete', 'ok': False, 'error': 'message_not_found', 'rate_limited': 0},
+        ]
+
+        messages = [
+            {'channel_id': 'C1', 'message_ts': '1.1'},
+            {'channel_id': 'C1', 'message_ts': '2.1'},
+            {'channel_id': 'C1'},
+        ]
+
+        result = slack_moderator.delete_messages(messages)
+
+        self.assertEqual(result['success'], messages[:1])
+        self.assertEqual(result['failed'], messages[1:])
+        self.assertEqual([o['ok'] for o in result['outcomes']], [True, False])
+        mock_user_client.return_value.try_post.assert_any_call('chat.delete', {'channel': 'C1', 'ts': '1.1'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import sys
+import os
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'automator'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import thread_context
+from slack import ThreadSnapshot
+
+
+def make_thread(count, text='x' * 200):
+    return [{'ts': f'{100 + i}.1', 'user': f'U{i % 3}', 'text': f'{i}: {text}'} for i in range(count)]
+
+
+class TestThreadContext(unittest.TestCase):
+
+    def setUp(self):
+        thread_context.summary_cache.clear()
+
+    def test_take_recent_respects_budget(self):
+        """Test that the newest lines that fit are kept, in order"""
+        lines = ['a' * 40, 'b' * 40, 'c' * 40]
+
+        self.assertEqual(thread_context.take_recent(lines, 25), ['b' * 40, 'c' * 40])
+        self.assertEqual(thread_context.take_recent(lines, 5), [])
+
+    def test_truncate_to_budget(self):
+        """Test that the end of the text is kept and nothing is kept without a budget"""
+        self.assertEqual(thread_context.truncate_to_budget('abcdefgh', 1), 'efgh')
+        self.assertEqual(thread_context.truncate_to_budget('abcdefgh', 5), 'abcdefgh')
+        self.assertEqual(thread_context.truncate_to_budget('abcdefgh', 0), '')
+        self.assertEqual(thread_context.truncate_to_budget('abcdefgh', -3), '')
+
+    @patch('thread_context.groqu')
+    @patch('thread_context.slack')
+    def test_no_budget_no_context(self, mock_slack, mock_groqu):
+        """Test that a prompt already over the budget gets no thread context"""
+        context = thread_context.build_thread_context('C1', '102.1', ['model-a'], 0)
+
+        self.assertEqual(context, '')
+        mock_slack.get_thread_snapshot.assert_not_called()
+        mock_groqu.resilient_ai_request.assert_not_called()
+
+    @patch('thread_context.groqu')
+    @patch('thread_context.slack')
+    def test_short_thread_is_not_summarized(self, mock_slack, mock_groqu):
+        """Test that a thread within the budget is passed as it is"""
+        messages = make_thread(3, text='short')
+        mock_slack.get_message_content.return_value = {'ts': '102.1', 'thread_ts': '100.1'}
+        mock_slack.get_thread_snapshot.return_value = ThreadSnapshot('C1', '100.1', messages)
+
+        context = thread_context.build_thread_context('C1', '102.1', ['model-a'], 1000)
+
+        mock_slack.get_thread_snapshot.assert_called_once_with('C1', '100.1')
+        mock_groqu.resilient_ai_request.assert_not_called()
+        self.assertIn('<@U0>: 0: short', context)
+        self.assertIn('<@U1>: 1: short', context)
+        self.assertNotIn('2: short', context)
+
+    @patch('thread_context.groqu')
+    @patch('thread_context.slack')
+    def test_summary_is_cached_and_updated_incrementally(self, mock_slack, mock_groqu):
+        """Test that only replies after the last summarized one are sent to the model"""
+        messages = make_thread(30)
+        mock_slack.get_message_content.return_value = {'ts': '200.1', 'thread_ts': '100.1'}
+        mock_slack.get_thread_snapshot.return_value = ThreadSnapshot('C1', '100.1', messages)
+        mock_groqu.resilient_ai_request.return_value = ('summary v1', {'model': 'model-a', 'seconds': 0.1})
+
+        budget = 1000
+        context = thread_context.build_thread_context('C1', '200.1', ['model-a'], budget)
+
+        self.assertIn('summary v1', context)
+        self.assertLessEqual(thread_context.estimate_tokens(context), budget)
+        first_prompt = mock_groqu.resilient_ai_request.call_args[0][0]
+        self.assertIn('0: ', first_prompt)
+
+        # same thread again: nothing new to summarize
+        thread_context.build_thread_context('C1', '200.1', ['model-a'], budget)
+        self.assertEqual(mock_groqu.resilient_ai_request.call_count, 1)
+
+        # more replies: only the newly older ones go to the model, with the old summary
+        messages += make_thread(40)[30:]
+        mock_slack.get_thread_snapshot.return_value = ThreadSnapshot('C1', '100.1', messages)
+        mock_groqu.resilient_ai_request.return_value = ('summary v2', {'model': 'model-a', 'seconds': 0.1})
+
+        context = thread_context.build_thread_context('C1', '200.1', ['model-a'], budget)
+
+        self.assertIn('summary v2', context)
+        second_prompt = mock_groqu.resilient_ai_request.call_args[0][0]
+        self.assertIn('summary v1', second_prompt)
+        self.assertNotIn('\n<@U0>: 0: ', second_prompt)
+        self.assertLessEqual(thread_context.estimate_tokens(second_prompt), budget // 2 + 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import sys
+import os
+import io
+import json
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'common'))
+
+import tracing
+from logs import Logger
+from metrics import Metrics
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = Logger(level='INFO')
+        self.metrics = Metrics(enabled=False)
+        for name, value in [('logger', self.logger), ('metrics', self.metrics)]:
+            patcher = patch.object(tracing, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def forwarded_body(self):
+        body = {'event_id': 'Ev1', 'event_time': 1000, 'event': {'type': 'reaction_added'}}
+        context = tracing.start_router(body, received_at=1000.5)
+        return tracing.stamp(body, context, forwarded_at=1000.75)
+
+    def test_router_stamps_a_copy(self):
+        body = {'event_id': 'Ev1', 'event_time': 1000}
+        context = tracing.start_router(body, received_at=1000.5, retry_num='1')
+
+        stamped = tracing.stamp(body, context, forwarded_at=1000.75)
+
+        self.assertNotIn('trace', body)
+        self.assertEqual(stamped['trace'], {
+            'event_id': 'Ev1', 'event_time': 1000.0, 'received_at': 1000.5,
+            'retry': '1', 'forwarded_at': 1000.75,
+        })
+        self.assertEqual(self.metrics.values['trace.slack_to_router'], (500.0, 'Milliseconds'))
+
+    def test_worker_computes_delays_per_hop(self):
+        fields = tracing.start_worker(self.forwarded_body(), started_at=1001.0)
+
+        self.assertEqual(fields, {
+            'event_id': 'Ev1',
+            'slack_to_router_ms': 500.0,
+            'router_ms': 250.0,
+            'router_to_worker_ms': 250.0,
+            'end_to_end_ms': 1000.0,
+        })
+
+        record = self.metrics.flush()
+        self.assertEqual(record['event_id'], 'Ev1')
+        self.assertEqual(record['trace.end_to_end'], 1000.0)
+        self.assertEqual(record['trace.router_to_worker'], 250.0)
+
+    def test_every_log_record_has_the_trace(self):
+        tracing.start_worker(self.forwarded_body(), started_at=1001.0)
+
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            self.logger.info('reaction %s', 'delete')
+            self.logger.error('failed')
+
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        for record in records:
+            self.assertEqual(record['event_id'], 'Ev1')
+            self.assertEqual(record['end_to_end_ms'], 1000.0)
+
+    def test_body_without_trace(self):
+        """Test that a direct invocation only has the event id"""
+        fields = tracing.start_worker({'event_id': 'Ev2'}, started_at=1001.0)
+
+        self.assertEqual(fields['event_id'], 'Ev2')
+        self.assertIsNone(fields['end_to_end_ms'])
+        self.assertEqual(self.logger.context, {'event_id': 'Ev2'})
+        self.assertEqual(self.metrics.values, {})
+
+
+if __name__ == '__main__':
+    unittest.main()